@@ -10,9 +10,11 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-from typing import List, Dict
+import math
+from typing import List, Dict, Optional
 
-from sqlalchemy import nullslast
+from sqlalchemy import Float, cast, func, nullslast
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session, Query
 
 from core.api import utils
@@ -20,42 +22,220 @@ from core.RingObjects.Ring import Ring
 from core.Analysis.QueryArguments import QueryArguments
 from core.Analysis.AnalysisPlan import AnalysisPlan
 from core.Analysis.QueryBuilderSQR import QueryBuilderSQR
+from core.Analysis.QueryRewriterSQR import QueryRewriterSQR
 from core.Analysis.OperationOntology import OperationOntology
 from core.Planning.AnalysisPlanParser import AnalysisPlanParser
 from core.Analysis.SQRField import SQRField
 from core.Operations.ArgType import ArgType
+from core.Operations.Operation import Operation
 
 class AnalysisEngine:
     def __init__(self,
-                 ring: Ring = None):
+                 ring: Ring = None,
+                 ontology: OperationOntology = None):
         self.query_builder_sqr = QueryBuilderSQR()
+        self.query_rewriter_sqr = QueryRewriterSQR()
         self.ring = ring
-        self.ontology = OperationOntology()
+        self.ontology = ontology or OperationOntology.get_instance()
         self.plan_parser = AnalysisPlanParser(self.ontology)
 
+    @classmethod
+    def for_ring(cls,
+                 ring: Ring) -> 'AnalysisEngine':
+        """
+        Gets the analysis engine kept on the ring, creating it the first time. The engine holds no per-request state so
+        it's shared by every request (and thread) working with the ring.
+        :param ring: The ring to analyze.
+        :type ring: Ring
+        :return: The ring's analysis engine.
+        :rtype: AnalysisEngine
+        """
+        if ring.analysis_engine is None:
+            ring.analysis_engine = cls(ring)
+        return ring.analysis_engine
+
+    # The z-score of the confidence level of the error bounds of approximate results
+    ERROR_BOUND_CONFIDENCE = 0.95
+    ERROR_BOUND_Z = 1.96
+
     def sqr_single_ring_analysis(self,
                                  analysis_plan: AnalysisPlan,
                                  ring: Ring,
-                                 sess: Session) -> dict:
+                                 sess: Session,
+                                 approximate: bool = False,
+                                 sample_fraction: float = None,
+                                 sample_rows: int = None) -> dict:
+        """
+        Runs the analysis plan against the ring's database.
+        :param analysis_plan: The parsed SQR plan.
+        :type analysis_plan: AnalysisPlan
+        :param ring: The ring to run the plan against.
+        :type ring: Ring
+        :param sess: The database session.
+        :type sess: Session
+        :param approximate: Whether to read samples of the base tables rather than the full tables.
+        :type approximate: bool
+        :param sample_fraction: The fraction of the base tables to sample (if approximate).
+        :type sample_fraction: float
+        :param sample_rows: The approximate number of rows to sample from the base tables (if approximate and no fraction is given).
+        :type sample_rows: int
+        :return: The results of the plan (with the sampling details and error bounds if approximate).
+        :rtype: dict
+        """
 
         new_query_args = self.query_builder_sqr.build_query_arguments_from_sqr_plan(analysis_plan, self.ontology)
 
-        query = self.complex_query(new_query_args, ring, sess)
+        # Flatten trivial subqueries, push filters down and read materialized aggregations before any SQL gets built
+        new_query_args = self.query_rewriter_sqr.rewrite(new_query_args, self.ontology, ring.materializer)
+
+        outermost_query = max(map(lambda alias: alias.partition('_')[2], new_query_args.keys()))
+        outermost_args = new_query_args[f'alias_{outermost_query}']
+        # Run the outermost query in memory if the database can't run one of its operations
+        in_memory = bool(self.get_in_memory_operations(outermost_args, ring))
+        if approximate:
+            self.add_table_samples(new_query_args, ring, sample_fraction, sample_rows)
+            outermost_args.estimate_error_bounds = outermost_args.sample is not None and not in_memory
+
+        try:
+            if in_memory:
+                raw_results = self.in_memory_complex_query(new_query_args, ring, sess)
+            else:
+                query = self.complex_query(new_query_args, ring, sess)
+                # Run the query (splitting off any columns used for estimating the error bounds)
+                raw_results = [list(q) for q in query.all()]
+        except SQLAlchemyError:
+            # Another process may have dropped a precomputed sample (after collecting the statistics) since it was
+            # picked, in which case the plan is run again on a rebuilt sample
+            if not approximate or not ring.sampler.forget_missing_sample_tables():
+                raise
+            sess.rollback()
+            return self.sqr_single_ring_analysis(analysis_plan, ring, sess, approximate, sample_fraction, sample_rows)
 
         units = self.get_units(new_query_args, ring)
 
-        # Run the query
-        raw_results = [list(q) for q in query.all()]
-        outermost_query = max(map(lambda alias: alias.partition('_')[2], new_query_args.keys()))
+        error_bound_rows = [row[len(outermost_args.select):] for row in raw_results]
+        raw_results = [row[:len(outermost_args.select)] for row in raw_results]
         results = {
             "length": len(raw_results),
             "results": raw_results,
-            "fieldNames": list(new_query_args[f'alias_{outermost_query}'].select),
+            "fieldNames": list(outermost_args.select),
             "units": {"results": units}
         }
 
+        if approximate:
+            results["approximate"] = {
+                "samples": {alias: {"table": alias_args.sample.table_name, "sampleFraction": alias_args.sample.fraction}
+                            for alias, alias_args in new_query_args.items() if alias_args.sample},
+                "confidence": self.ERROR_BOUND_CONFIDENCE,
+                "errorBounds": [self.get_error_bounds(outermost_args, row) for row in error_bound_rows] if outermost_args.estimate_error_bounds else None
+            }
+
         return results
 
+    def add_table_samples(self,
+                          query_args: Dict[str, QueryArguments],
+                          ring: Ring,
+                          sample_fraction: float = None,
+                          sample_rows: int = None) -> None:
+        """
+        Has each query that reads entity tables (rather than subqueries) read a sample of the primary table of its first
+        entity instead.
+        :param query_args: The QueryArguments for each subplan alias (updated in place).
+        :type query_args: Dict[str, QueryArguments]
+        :param ring: The ring being queried.
+        :type ring: Ring
+        :param sample_fraction: The fraction of the table to sample.
+        :type sample_fraction: float
+        :param sample_rows: The approximate number of rows to sample (if no fraction is given).
+        :type sample_rows: int
+        :return: None
+        :rtype: None
+        """
+        entity_names = [entity.name for entity in ring.entities]
+        for alias_args in query_args.values():
+            alias_entities = [from_ for from_ in alias_args.froms if from_ in entity_names]
+            if not alias_entities:
+                continue
+            table_name = ring.get_entity_by_name(alias_entities[0]).primary_table
+            fraction = ring.sampler.get_sample_fraction(table_name, sample_fraction, sample_rows)
+            alias_args.sample = ring.sampler.sample_table(table_name, fraction)
+
+    def add_error_bound_columns(self,
+                                query: Query,
+                                alias_args: QueryArguments,
+                                subqueries: Dict[str, Query],
+                                ring: Ring) -> Query:
+        """
+        Adds the columns needed to estimate the error bounds of the counts, sums and averages selected by a query over
+        a sample (the number of sampled values along with their sum and sum of squares).
+        :param query: The query reading from the sample.
+        :type query: Query
+        :param alias_args: The QueryArguments of the query (the added columns are recorded in error_bound_columns).
+        :type alias_args: QueryArguments
+        :param subqueries: The subqueries the query reads from.
+        :type subqueries: Dict[str, Query]
+        :param ring: The ring being queried.
+        :type ring: Ring
+        :return: The query with the added columns.
+        :rtype: Query
+        """
+        aux_columns = []
+        for field_name in alias_args.select:
+            sqrfield = alias_args.sqrfields[field_name]
+            if type(sqrfield.field) != dict or sqrfield.field['type'] not in ['count', 'sum', 'average']:
+                alias_args.error_bound_columns.append(None)
+                continue
+
+            arg = sqrfield.field['arguments'][0]
+            if type(arg) == SQRField and arg.entity_name:
+                arg_field = ring.db_interface.get_sqlalchemy_field(ring, arg, sample=alias_args.sample)
+            elif type(arg) == SQRField and type(arg.field) == dict and self.ontology.is_arithmetic_operation(arg.field['type']):
+                arg_field, _ = ring.db_interface.get_field_label_and_joins_for_operation(ring, arg, self.ontology, subqueries, alias_args.sample)
+            else:
+                alias_args.error_bound_columns.append(None)
+                continue
+
+            alias_args.error_bound_columns.append((sqrfield.field['type'], len(aux_columns)))
+            aux_columns.append(func.count(arg_field))
+            if sqrfield.field['type'] != 'count':
+                aux_columns.append(func.sum(cast(arg_field, Float)))
+                aux_columns.append(func.sum(cast(arg_field, Float) * cast(arg_field, Float)))
+
+        return query.add_columns(*aux_columns) if aux_columns else query
+
+    def get_error_bounds(self,
+                         alias_args: QueryArguments,
+                         aux_values: list) -> List[Optional[float]]:
+        """
+        Estimates the error bounds of the values in a row of results computed over a (Bernoulli) sample.
+        :param alias_args: The QueryArguments of the query, including which columns were added for the estimates.
+        :type alias_args: QueryArguments
+        :param aux_values: The values of the added columns for the row.
+        :type aux_values: list
+        :return: The half-width of the confidence interval for each selected field (None if it can't be estimated).
+        :rtype: List[Optional[float]]
+        """
+        fraction = alias_args.sample.fraction
+        bounds = []
+        for error_bound_column in alias_args.error_bound_columns:
+            if not error_bound_column:
+                bounds.append(None)
+                continue
+            op_name, idx = error_bound_column
+            n = aux_values[idx] or 0
+            if op_name == 'count':
+                bounds.append(self.ERROR_BOUND_Z * math.sqrt(n * (1 - fraction)) / fraction)
+            elif op_name == 'sum':
+                sum_sq = aux_values[idx + 2] or 0
+                bounds.append(self.ERROR_BOUND_Z * math.sqrt((1 - fraction) * sum_sq) / fraction)
+            elif n > 1:
+                total, sum_sq = aux_values[idx + 1], aux_values[idx + 2]
+                variance = max(sum_sq - total * total / n, 0) / (n - 1)
+                bounds.append(self.ERROR_BOUND_Z * math.sqrt(variance / n))
+            else:
+                bounds.append(None)
+        return bounds
+
     def complex_query(self,
                       query_args: Dict[str, QueryArguments],
                       ring: Ring,
@@ -63,11 +243,177 @@ class AnalysisEngine:
         queries = {}
         # for alias in map(lambda alias_num: f'alias_{alias_num}', range(len(query_args))):
         for alias in query_args.keys():
-            subqueries = {from_ : queries[from_].subquery(from_) for from_ in query_args[alias].froms if from_ in queries}
-            queries[alias] = self.simple_query(query_args[alias], subqueries, ring, sess)
+            queries[alias] = self.simple_query(query_args[alias], self.get_subqueries(query_args[alias], queries, ring), ring, sess)
         # return queries[f'alias_{len(queries) - 1}']
         return list(queries.values())[-1]
 
+    def get_subqueries(self,
+                       alias_args: QueryArguments,
+                       queries: Dict[str, Query],
+                       ring: Ring) -> Dict:
+        subqueries = {from_ : queries[from_].subquery(from_) for from_ in alias_args.froms if from_ in queries}
+        # Summary tables of materialized derived attributes are read just like subqueries
+        materialized_tables = {summary.name: summary.table for summary in ring.materializer.summaries.values()} if ring.materializer else {}
+        subqueries.update({from_: materialized_tables[from_] for from_ in alias_args.froms if materialized_tables.get(from_) is not None})
+        return subqueries
+
+    def get_in_memory_operations(self,
+                                 alias_args: QueryArguments,
+                                 ring: Ring) -> List[Operation]:
+        """
+        Finds the operations of a subplan that can't be pushed down to the ring's database.
+        :param alias_args: The QueryArguments of the subplan.
+        :type alias_args: QueryArguments
+        :param ring: The ring being queried.
+        :type ring: Ring
+        :return: The operations that have to be run in memory.
+        :rtype: List[Operation]
+        """
+        dialect = ring.get_dialect()
+        operations = []
+
+        def add_operations(sqrfield):
+            if type(sqrfield) != SQRField or type(sqrfield.field) != dict:
+                return
+            operation = self.ontology.operations.get(sqrfield.field['type'])
+            if operation and not operation.supports_sql(dialect) and operation not in operations:
+                operations.append(operation)
+            for arg in sqrfield.field['arguments']:
+                add_operations(arg)
+
+        for sqrfield in alias_args.sqrfields.values():
+            add_operations(sqrfield)
+        for condition in [alias_args.filter, alias_args.having]:
+            if condition:
+                add_operations(condition)
+        return operations
+
+    def in_memory_complex_query(self,
+                                query_args: Dict[str, QueryArguments],
+                                ring: Ring,
+                                sess: Session) -> List[list]:
+        """
+        Runs the subqueries in the database and the outermost query in memory.
+        :param query_args: The QueryArguments for each subplan alias.
+        :type query_args: Dict[str, QueryArguments]
+        :param ring: The ring being queried.
+        :type ring: Ring
+        :param sess: The database session.
+        :type sess: Session
+        :return: The rows of results.
+        :rtype: List[list]
+        """
+        queries = {}
+        aliases = list(query_args.keys())
+        for alias in aliases[:-1]:
+            queries[alias] = self.simple_query(query_args[alias], self.get_subqueries(query_args[alias], queries, ring), ring, sess)
+        outermost_args = query_args[aliases[-1]]
+        return self.in_memory_query(outermost_args, self.get_subqueries(outermost_args, queries, ring), ring, sess)
+
+    def in_memory_query(self,
+                        alias_args: QueryArguments,
+                        subqueries: Dict,
+                        ring: Ring,
+                        session: Session) -> List[list]:
+        """
+        Runs a query whose aggregations can't all be run in the database. The database only filters the rows and reads
+        the group by fields and the arguments of the aggregations, which are then grouped and aggregated with pandas.
+        :param alias_args: The QueryArguments of the query.
+        :type alias_args: QueryArguments
+        :param subqueries: The subqueries the query reads from.
+        :type subqueries: Dict
+        :param ring: The ring being queried.
+        :type ring: Ring
+        :param session: The database session.
+        :type session: Session
+        :return: The rows of results.
+        :rtype: List[list]
+        """
+        import pandas as pd
+
+        db_type = ring.get_db_type()
+        if alias_args.having:
+            raise ValueError(f"Filtering on aggregations that the {db_type} database can't run isn't supported")
+
+        # Gather the fields to read from the database and the aggregations to run over them (including the ones that are
+        # only sorted by, which get dropped from the results)
+        raw_sqrfields = {name: alias_args.sqrfields[name] for name in alias_args.group_bys}
+        aggregations = {}
+        for name in dict.fromkeys(list(alias_args.select) + [sort['attribute'] for sort in alias_args.sort_attributes]):
+            if name in alias_args.group_bys:
+                continue
+            sqrfield = alias_args.sqrfields[name]
+            if type(sqrfield.field) != dict or not self.ontology.is_analysis_operation(sqrfield.field['type']):
+                raise ValueError(f"Can't {'select' if name in alias_args.select else 'sort by'} {name} in memory, it isn't grouped by or aggregated")
+            operation = self.ontology.resolve_operation(sqrfield.field['type'])
+            if not operation.vectorized:
+                raise ValueError(f"The {operation.name} operation can't be run by the {db_type} database or in memory")
+            for arg in sqrfield.field['arguments']:
+                if type(arg) != SQRField or (type(arg.field) == dict and self.ontology.is_analysis_operation(arg.field['type'])):
+                    raise ValueError(f"Can't run {name} in memory, only aggregations of fields are supported")
+                raw_sqrfields[arg.column_name] = arg
+            aggregations[name] = (operation, [arg.column_name for arg in sqrfield.field['arguments']])
+
+        raw_args = QueryArguments(query_fields=[],
+                                  tables=set(),
+                                  sqrfields=raw_sqrfields,
+                                  joins_todo=set(),
+                                  select=list(raw_sqrfields),
+                                  group_bys=[],
+                                  sort_attributes=[],
+                                  filter=alias_args.filter,
+                                  froms=alias_args.froms)
+        raw_args.sample = alias_args.sample
+        frame = pd.DataFrame([list(row) for row in self.simple_query(raw_args, subqueries, ring, session).all()], columns=raw_args.select)
+
+        if alias_args.group_bys:
+            groups = [(key if type(key) == tuple else (key,), group) for key, group in frame.groupby(list(alias_args.group_bys), dropna=False, sort=False)]
+        else:
+            groups = [((), frame)]
+        rows = []
+        for key, group in groups:
+            row = dict(zip(alias_args.group_bys, key))
+            for name, (operation, arg_names) in aggregations.items():
+                row[name] = self.get_in_memory_value(operation.pandas_op([group[arg_name] for arg_name in arg_names]), operation, alias_args.sample)
+            rows.append(row)
+
+        # Sort the rows (with nulls last) one attribute at a time, starting from the last, then apply the limit
+        for sort in reversed(alias_args.sort_attributes):
+            attribute = sort['attribute']
+            rows = sorted([row for row in rows if row[attribute] is not None], key=lambda row: row[attribute], reverse=sort['direction'] == 'desc')\
+                + [row for row in rows if row[attribute] is None]
+        if alias_args.limit is not None:
+            rows = rows[:int(alias_args.limit)]
+
+        return [[row[name] for name in alias_args.select] for row in rows]
+
+    def get_in_memory_value(self,
+                            value,
+                            operation: Operation,
+                            sample: 'SampledTable' = None):
+        """
+        Converts the result of an aggregation run in memory to what the database would have returned.
+        :param value: The result of the operation's pandas_op.
+        :type value: Any
+        :param operation: The aggregation operation.
+        :type operation: Operation
+        :param sample: The sample the rows were read from, if any (counts and sums get scaled up to the full table).
+        :type sample: SampledTable
+        :return: The value.
+        :rtype: Any
+        """
+        # Numpy scalars to Python values and NaN to null
+        value = value.item() if hasattr(value, 'item') else value
+        if value is None or value != value:
+            return None
+        if sample and operation.name == 'count':
+            value = round(value / sample.fraction)
+        elif sample and operation.name == 'sum':
+            value = value / sample.fraction
+        if operation.name in ['average', 'stddev']:
+            value = round(value, 2)
+        return value
+
     def same_fields(self, field, field_name):
         return field.name == field_name
 
@@ -201,6 +547,10 @@ class AnalysisEngine:
         :rtype:
         """
 
+        in_memory_operations = self.get_in_memory_operations(alias_args, ring)
+        if in_memory_operations:
+            raise ValueError(f"The {ring.get_db_type()} database can't run the {', '.join(operation.name for operation in in_memory_operations)} operation in a subquery or filter")
+
         # Build the basic query (including fields to select, filters, joins, multi-table entity joins)
         self.query_builder_sqr.update_query_arguments(alias_args, subqueries, ring, self.ontology)
 
@@ -212,7 +562,10 @@ class AnalysisEngine:
             remaining_fields = remaining_fields[1:]
             query = query.add_columns(first_field)
 
-        alias_args.tables.add(query.selectable.froms[0].name)
+        base_table = query.selectable.froms[0].name
+        if alias_args.sample and base_table == alias_args.sample.name:
+            base_table = alias_args.sample.table_name
+        alias_args.tables.add(base_table)
         if len(query.selectable.froms) > 1:
             print("WARNING: this case is not handled")
 
@@ -224,12 +577,16 @@ class AnalysisEngine:
 
         # Add filters
         if alias_args.filter:
-            filter_field, _ = ring.db_interface.get_field_label_and_joins_for_operation(ring, alias_args.filter, self.ontology, subqueries)
+            filter_field, _ = ring.db_interface.get_field_label_and_joins_for_operation(ring, alias_args.filter, self.ontology, subqueries, alias_args.sample)
             query = query.filter(filter_field)
         if alias_args.having:
-            filter_field, _ = ring.db_interface.get_field_label_and_joins_for_operation(ring, alias_args.having, self.ontology, subqueries)
+            filter_field, _ = ring.db_interface.get_field_label_and_joins_for_operation(ring, alias_args.having, self.ontology, subqueries, alias_args.sample)
             query = query.having(filter_field)
 
+        # Add the columns for estimating the error bounds of an approximate result
+        if alias_args.estimate_error_bounds:
+            query = self.add_error_bound_columns(query, alias_args, subqueries, ring)
+
         # Add groupby to SQLAlchemy query
         query = query.group_by(*self.convert_groupby_strings_to_fields(alias_args))
 
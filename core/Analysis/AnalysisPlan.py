@@ -11,17 +11,16 @@ If not, see <https://www.gnu.org/licenses/>.
 '''
 
 import json
-import networkx as nx
-import matplotlib.pyplot as plt
 from typing import Dict, List
 
+from core.Analysis.PlanGraph import PlanGraph
 from core.Analysis.AnalysisStep import AnalysisStep
 from core.Analysis.AnalysisSubplan import AnalysisSubplan
 
 class AnalysisPlan:
     def __init__(self,
                  plan_steps: Dict[str, AnalysisStep],
-                 plan_graph: nx.DiGraph,
+                 plan_graph: PlanGraph,
                  subplans: Dict[str, AnalysisSubplan]):
         self.plan_steps = plan_steps
         self.plan_graph = plan_graph
@@ -29,15 +28,20 @@ class AnalysisPlan:
 
 
     def display_graph(self) -> None:
-        for layer, nodes in enumerate(nx.topological_generations(self.plan_graph)):
+        # Only needed for debugging, so these aren't imported unless a plan is drawn
+        import networkx as nx
+        import matplotlib.pyplot as plt
+
+        graph = self.plan_graph.to_networkx()
+        for layer, nodes in enumerate(self.plan_graph.topological_generations()):
             # `multipartite_layout` expects the layer as a node attribute, so add the
             # numeric layer value as a node attribute
             for node in nodes:
-                self.plan_graph.nodes[node]["layer"] = layer
+                graph.nodes[node]["layer"] = layer
 
         # Compute the multipartite_layout using the "layer" node attribute
-        pos = nx.multipartite_layout(self.plan_graph, subset_key="layer")
-        nx.draw_networkx(self.plan_graph, pos=pos, node_size=500, node_color='red', font_color='white')
+        pos = nx.multipartite_layout(graph, subset_key="layer")
+        nx.draw_networkx(graph, pos=pos, node_size=500, node_color='red', font_color='white')
         plt.show()
         return None
 
@@ -56,4 +60,4 @@ class AnalysisPlan:
         :return: A list of step references (e.g. ['|7|']).
         :rtype: list of str
         """
-        return [node for node in self.plan_graph.nodes if self.plan_graph.out_degree(node) == 0]
+        return self.plan_graph.get_leaves()
@@ -13,19 +13,61 @@ If not, see <https://www.gnu.org/licenses/>.
 from typing import List
 
 class AnalysisStep():
+    """
+    A single step of an SQR plan (e.g. "|3|": "(retrieve_attribute |1| name)").
+    Steps are immutable (their args are stored as a tuple) so they can be shared between plans and used as cache keys.
+    Use replace() to get a modified copy.
+    """
+
+    __slots__ = ['ref', 'operation', 'args', '_repr']
+
     def __init__(self,
                  ref: str,
                  operation: str,
                  args: List[str]):
-        self.ref = ref
-        self.operation = operation
-        self.args = args
+        object.__setattr__(self, 'ref', ref)
+        object.__setattr__(self, 'operation', operation)
+        object.__setattr__(self, 'args', tuple(args))
+        object.__setattr__(self, '_repr', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"AnalysisStep is immutable, use replace() to change '{name}'")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"AnalysisStep is immutable, can't delete '{name}'")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (AnalysisStep, (self.ref, self.operation, self.args))
+
+    def replace(self,
+                ref: str = None,
+                operation: str = None,
+                args: List[str] = None) -> 'AnalysisStep':
+        """
+        Gets a copy of this step with the given properties changed.
+        :return: The new step.
+        :rtype: AnalysisStep
+        """
+        return AnalysisStep(self.ref if ref is None else ref,
+                            self.operation if operation is None else operation,
+                            self.args if args is None else args)
 
     def __repr__(self):
-        return f"({self.operation} {' '.join(str(arg) for arg in self.args)})"
+        if self._repr is None:
+            object.__setattr__(self, '_repr', f"({self.operation} {' '.join(str(arg) for arg in self.args)})")
+        return self._repr
 
     def __str__(self):
         return self.__repr__()
 
     def __eq__(self, other):
         return self.__repr__() == other.__repr__()
+
+    def __hash__(self):
+        return hash(self.__repr__())
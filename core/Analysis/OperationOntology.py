@@ -10,9 +10,15 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
+import threading
+from types import MappingProxyType
 from typing import Dict
 
 from core.Operations.Operation import Operation
+from core.Operations.OperationRegistry import OperationRegistry
+from core.Operations.AggregationOperation import AggregationOperation
+from core.Operations.ArithmeticOperation import ArithmeticOperation
+from core.Operations.BooleanOperation import BooleanOperation
 
 from core.Operations.Standard.Sort import Sort
 from core.Operations.Standard.Limit import Limit
@@ -55,6 +61,17 @@ from core.Operations.Math.Duration import Duration
 from core.Operations.Math.Percentage import Percentage
 
 class OperationOntology:
+    """
+    The operations available in SQR plans, grouped by category. The ontology is read-only once built, so a single
+    instance (see get_instance) is shared by every ring, request and thread.
+    """
+
+    # The order operation names are resolved in (the first category with the name wins)
+    CATEGORIES = ["analysis", "retrieval", "aggregation", "boolean", "collect", "return", "sort", "limit", "arithmetic", "rownum"]
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
     def __init__(self):
         self.retrieval_operations = self.load_retrieval_operations()
         self.aggregation_operations = self.load_aggregation_operations()
@@ -66,6 +83,40 @@ class OperationOntology:
         self.rownum_operations = self.load_rownum_operations()
         self.analysis_operations = self.load_analysis_operations()
         self.arithmetic_operations = self.load_arithmetic_operations()
+        for operation in self.load_plugin_operations().values():
+            self.add_plugin_operation(operation)
+
+        # Index every operation (and its category) by name so resolving one is a single lookup
+        operations = {}
+        categories = {}
+        for category in self.CATEGORIES:
+            category_operations = MappingProxyType(getattr(self, f"{category}_operations"))
+            setattr(self, f"{category}_operations", category_operations)
+            for operation_name, operation in category_operations.items():
+                if operation_name not in operations:
+                    operations[operation_name] = operation
+                    categories[operation_name] = category
+        self.operations = MappingProxyType(operations)
+        self.categories = MappingProxyType(categories)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("The operation ontology is read-only")
+        super().__setattr__(name, value)
+
+    @classmethod
+    def get_instance(cls) -> 'OperationOntology':
+        """
+        Gets the ontology shared by the whole process, building it the first time it's needed.
+        :return: The shared ontology.
+        :rtype: OperationOntology
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
 
     def load_retrieval_operations(self) -> Dict[str, Operation]:
         ret_ent = RetrieveEntity()
@@ -83,12 +134,12 @@ class OperationOntology:
 
     def load_boolean_operations(self) -> Dict[str, Operation]:
         boolean_ops = [Exact, Contains, LessThan, GreaterThan, LessThanEq, GreaterThanEq, And, Or, Not]
-        return {op().name: op() for op in boolean_ops}
+        return {operation.name: operation for operation in (op() for op in boolean_ops)}
 
     def load_arithmetic_operations(self) -> Dict[str, Operation]:
         arithmetic_ops = [Add, Subtract, Multiply, Divide, Sqrt, Abs, PercentChange, Duration, Percentage]
         # also load and, or, and not operations here
-        return {op().name: op() for op in arithmetic_ops}
+        return {operation.name: operation for operation in (op() for op in arithmetic_ops)}
 
     def load_collect_operations(self) -> Dict[str, Operation]:
         collect_op = Collect()
@@ -125,13 +176,33 @@ class OperationOntology:
         analysis_ops = [Average, Count, CountUnique, Max, Median, Min, Sum, StdDev, StringAgg, GetOne, Correlation]
 
         # Create the dictionary with the analysis operations instantiated
-        analysis_ops_dict = {op().name: op() for op in analysis_ops}
+        analysis_ops_dict = {operation.name: operation for operation in (op() for op in analysis_ops)}
 
         return analysis_ops_dict
 
     def load_plugin_operations(self) -> Dict[str, Operation]:
-        plugin_ops = [Duration, Percentage]
-        return {op().name: op() for op in plugin_ops}
+        plugin_ops = OperationRegistry.get_operation_classes()
+        return {operation.name: operation for operation in (op() for op in plugin_ops)}
+
+    def add_plugin_operation(self,
+                             operation: Operation) -> None:
+        """
+        Adds a plugin operation to the category matching its base class.
+        :param operation: The plugin operation.
+        :type operation: Operation
+        :return: None
+        :rtype: None
+        """
+        if any(operation.name in getattr(self, f"{category}_operations") for category in self.CATEGORIES):
+            raise ValueError(f"The plugin operation '{operation.name}' has the same name as another operation")
+        if isinstance(operation, AggregationOperation):
+            self.analysis_operations[operation.name] = operation
+        elif isinstance(operation, BooleanOperation):
+            self.boolean_operations[operation.name] = operation
+        elif isinstance(operation, ArithmeticOperation):
+            self.arithmetic_operations[operation.name] = operation
+        else:
+            raise ValueError(f"The plugin operation '{operation.name}' must be an aggregation, arithmetic or boolean operation")
 
     def is_retrieval_operation(self,
                                operation_name: str) -> bool:
@@ -175,25 +246,7 @@ class OperationOntology:
 
     def resolve_operation(self,
                           operation_name: str) -> Operation:
-        if operation_name in self.analysis_operations:
-            return self.analysis_operations[operation_name]
-        elif operation_name in self.retrieval_operations:
-            return self.retrieval_operations[operation_name]
-        elif operation_name in self.aggregation_operations:
-            return self.aggregation_operations[operation_name]
-        elif operation_name in self.boolean_operations:
-            return self.boolean_operations[operation_name]
-        elif operation_name in self.collect_operations:
-            return self.collect_operations[operation_name]
-        elif operation_name in self.return_operations:
-            return self.return_operations[operation_name]
-        elif operation_name in self.sort_operations:
-            return self.sort_operations[operation_name]
-        elif operation_name in self.limit_operations:
-            return self.limit_operations[operation_name]
-        elif operation_name in self.arithmetic_operations:
-            return self.arithmetic_operations[operation_name]
-        elif operation_name in self.rownum_operations:
-            return self.rownum_operations[operation_name]
-        else:
+        try:
+            return self.operations[operation_name]
+        except KeyError:
             raise ValueError("Unable to resolve the operation name to operation object.")
@@ -0,0 +1,187 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+from typing import Iterator, List, Optional, Set, Tuple
+
+
+class PlanGraph:
+    """
+    The dependency graph of the steps of an SQR plan (with an edge from each step to the steps that use its result).
+    A small DAG that keeps the adjacency of each step in insertion order, which is all the request path needs, so
+    networkx only gets imported to draw a plan.
+    """
+
+    def __init__(self):
+        self.parents = {}
+        self.children = {}
+        self._topological_generations = None
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self.children)
+
+    def __contains__(self,
+                     node: str) -> bool:
+        return node in self.children
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.children)
+
+    def __len__(self) -> int:
+        return len(self.children)
+
+    def add_node(self,
+                 node: str) -> None:
+        if node not in self.children:
+            self.children[node] = []
+            self.parents[node] = []
+            self._topological_generations = None
+
+    def add_edge(self,
+                 parent: str,
+                 child: str) -> None:
+        self.add_node(parent)
+        self.add_node(child)
+        if child not in self.children[parent]:
+            self.children[parent].append(child)
+            self.parents[child].append(parent)
+            self._topological_generations = None
+
+    def in_degree(self,
+                  node: str) -> int:
+        return len(self.parents[node])
+
+    def out_degree(self,
+                   node: str) -> int:
+        return len(self.children[node])
+
+    def successors(self,
+                   node: str) -> List[str]:
+        return list(self.children[node])
+
+    def predecessors(self,
+                     node: str) -> List[str]:
+        return list(self.parents[node])
+
+    def get_leaves(self) -> List[str]:
+        """
+        Gets the steps whose results aren't used by any other step.
+        :return: A list of step references (e.g. ['|7|']).
+        :rtype: list of str
+        """
+        return [node for node, children in self.children.items() if not children]
+
+    def find_cycle(self) -> Optional[List[str]]:
+        """
+        Finds steps that depend on each other in a cycle (which a plan can't have).
+        :return: The step references around the cycle, each used by the next one (and the last one by the first), or
+        None if there's no cycle.
+        :rtype: List[str]
+        """
+        visited = set()
+        for start in self.children:
+            if start in visited:
+                continue
+            # Depth first, keeping the path of steps (and the iterator over each one's children) being walked
+            path = [start]
+            on_path = {start}
+            iterators = [iter(self.children[start])]
+            visited.add(start)
+            while iterators:
+                child = next(iterators[-1], None)
+                if child is None:
+                    on_path.discard(path.pop())
+                    iterators.pop()
+                elif child in on_path:
+                    return path[path.index(child):]
+                elif child not in visited:
+                    visited.add(child)
+                    path.append(child)
+                    on_path.add(child)
+                    iterators.append(iter(self.children[child]))
+        return None
+
+    def topological_generations(self) -> List[List[str]]:
+        """
+        Groups the steps so that each step comes in a later group than all of the steps it uses (computed once).
+        The order matches networkx's topological_generations.
+        :return: The groups of step references.
+        :rtype: List[List[str]]
+        """
+        if self._topological_generations is None:
+            in_degrees = {node: len(parents) for node, parents in self.parents.items() if parents}
+            generation = [node for node, parents in self.parents.items() if not parents]
+            generations = []
+            while generation:
+                next_generation = []
+                for node in generation:
+                    for child in self.children[node]:
+                        in_degrees[child] -= 1
+                        if in_degrees[child] == 0:
+                            next_generation.append(child)
+                            del in_degrees[child]
+                generations.append(generation)
+                generation = next_generation
+            if in_degrees:
+                raise ValueError("The plan graph contains a cycle")
+            self._topological_generations = generations
+        return self._topological_generations
+
+    def topological_order(self) -> List[str]:
+        return [node for generation in self.topological_generations() for node in generation]
+
+    def ancestors(self,
+                  node: str) -> Set[str]:
+        """
+        Gets all of the steps the given step depends on, directly or indirectly.
+        :param node: The step reference.
+        :type node: str
+        :return: The step references of the ancestors.
+        :rtype: Set[str]
+        """
+        ancestors = set()
+        stack = list(self.parents[node])
+        while stack:
+            parent = stack.pop()
+            if parent not in ancestors:
+                ancestors.add(parent)
+                stack.extend(self.parents[parent])
+        return ancestors
+
+    def bfs_successors(self,
+                       source: str) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Walks the steps that depend on the source step breadth first (like networkx's bfs_successors).
+        :param source: The step reference to start from.
+        :type source: str
+        :return: Each step along with the steps first reached from it.
+        :rtype: Iterator[Tuple[str, List[str]]]
+        """
+        visited = {source}
+        queue = [source]
+        parent, parent_children = source, []
+        for node in queue:
+            children = [child for child in self.children[node] if child not in visited]
+            visited.update(children)
+            queue.extend(children)
+            if children:
+                if parent_children:
+                    yield parent, parent_children
+                parent, parent_children = node, children
+        yield parent, parent_children
+
+    def to_networkx(self):
+        import networkx as nx
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.children)
+        graph.add_edges_from((parent, child) for parent, children in self.children.items() for child in children)
+        return graph
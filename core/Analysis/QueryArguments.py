@@ -15,6 +15,13 @@ from sqlalchemy.sql.expression import Label
 from sqlalchemy.sql.elements import BinaryExpression
 
 class QueryArguments:
+    """
+    The pieces of the SQL query for one subplan of an SQR plan, filled in while the query is built.
+    """
+
+    __slots__ = ['query_fields', 'tables', 'sqrfields', 'joins_todo', 'select', 'filter', 'having', 'group_bys',
+                 'sort_attributes', 'limit', 'froms', 'sample', 'estimate_error_bounds', 'error_bound_columns']
+
     def __init__(self,
                  query_fields: List[Label],
                  tables: Set[str],
@@ -37,3 +44,7 @@ class QueryArguments:
         self.sort_attributes = sort_attributes
         self.limit = None
         self.froms = froms
+        # Set when the query reads a sample of its base table instead of the full table (approximate queries)
+        self.sample = None
+        self.estimate_error_bounds = False
+        self.error_bound_columns = []
@@ -10,8 +10,11 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
+import heapq
+import math
+from collections import defaultdict
 from itertools import combinations, count
-from typing import Union, Tuple, List, Dict
+from typing import Union, Tuple, List, Dict, Set
 
 from sqlalchemy.orm import Query
 
@@ -23,7 +26,9 @@ from .OperationOntology import OperationOntology
 from .SQRField import SQRField
 from core.api import utils
 
-import networkx as nx
+
+# Comparisons that can never be true when one of their attribute arguments is null
+NULL_REJECTING_OPERATIONS = {'exact', 'contains', 'greaterthan', 'greaterthan_eq', 'lessthan', 'lessthan_eq'}
 
 
 class QueryBuilderSQR:
@@ -34,7 +39,7 @@ class QueryBuilderSQR:
         # Init the dictionary that will map each subplans steps to the how they will be referred to by other subplans
         step_to_field = {}
         alias_to_queryargs = {}
-        ordered_plan_graph = list(nx.topological_sort(analysis_plan.plan_graph))
+        ordered_plan_graph = analysis_plan.plan_graph.topological_order()
 
         # Iterate from innermost query to outermost
         # for current_alias_idx in range(len(analysis_plan.subplans.keys())):   # This is how it used to be. Look here if something bad happens.
@@ -201,7 +206,7 @@ class QueryBuilderSQR:
                         or ontology.is_analysis_operation(sqrfield.field['type'])\
                         or ontology.is_arithmetic_operation(sqrfield.field['type'])\
                         or ontology.is_rownum_operation(sqrfield.field['type']):
-                    the_field, joins_todo_temp = ring.db_interface.get_field_label_and_joins_for_operation(ring, sqrfield, ontology, subqueries)
+                    the_field, joins_todo_temp = ring.db_interface.get_field_label_and_joins_for_operation(ring, sqrfield, ontology, subqueries, alias_args.sample)
                     alias_args.joins_todo.update(joins_todo_temp)
             elif not sqrfield.entity_name:
                 # Field is from a subquery
@@ -214,7 +219,7 @@ class QueryBuilderSQR:
                 the_field = ring.db_interface.get_sqlalchemy_field(ring, sqrfield, field=field).label(full_field_name)
             else:
                 # Regular field
-                the_field, joins_todo_temp = ring.db_interface.get_field_label_and_name_and_joins_todo(ring, sqrfield)
+                the_field, joins_todo_temp = ring.db_interface.get_field_label_and_name_and_joins_todo(ring, sqrfield, alias_args.sample)
                 alias_args.joins_todo.update(joins_todo_temp)
             alias_args.query_fields.append(the_field)
         # get all pair combinations of entities in the query and add to joins
@@ -237,29 +242,155 @@ class QueryBuilderSQR:
         :return: The updated query.
         :rtype: Query
         """
-        # Get the actual join object referred to by the join name
-        join_list = [ring.get_join_by_name(join_name) for join_name in query_args.joins_todo]
-        while join_list:
-            idx = 0
-            while True:
-                if any(join_table in query_args.tables for join_table in [join_list[idx].from_, join_list[idx].to]):
-                    join_obj = join_list.pop(idx)
-                    break
-                else:
-                    idx += 1
+        # Tables whose rows must be present for the filter to pass don't need to be outer joined
+        null_rejected_tables = self.get_null_rejected_tables(query_args.filter, ring) if query_args.filter else set()
 
+        for join_obj, is_inner in self.plan_joins(query_args, ring, null_rejected_tables):
             # Add the join to the query
-            query, new_table = self.add_join_to_query(query, join_obj, ring, query_args.tables)
+            query, new_table = self.add_join_to_query(query, join_obj, ring, query_args.tables, isouter=not is_inner, sample=query_args.sample)
             if new_table:
                 # Mark this table as joined to the query
                 query_args.tables.add(new_table)
         return query
 
+    def plan_joins(self,
+                   query_args: QueryArguments,
+                   ring: Ring,
+                   null_rejected_tables: Set[str]) -> List[Tuple[RingJoin, bool]]:
+        """
+        Orders the joins of the query and decides which of them can be inner joins.
+        Of the joins connected to a table already in the query, the one bringing in the table with the fewest rows goes
+        next (ties are broken on the join name so the generated SQL is always the same). A table whose rows can't be
+        null for the filter to pass, along with every table on the path used to reach it, is inner joined.
+        :param query_args: The query containing joins to do.
+        :type query_args: QueryArguments
+        :param ring: The Satyrn Ring object.
+        :type ring: Ring
+        :param null_rejected_tables: The tables the filter requires to be non-null.
+        :type null_rejected_tables: Set[str]
+        :return: The joins in the order they should be added along with whether each one is an inner join.
+        :rtype: List[Tuple[RingJoin, bool]]
+        """
+        pending_joins = {join_name: ring.get_join_by_name(join_name) for join_name in query_args.joins_todo}
+        joins_by_table = defaultdict(list)
+        for join_obj in pending_joins.values():
+            joins_by_table[join_obj.from_].append(join_obj)
+            joins_by_table[join_obj.to].append(join_obj)
+
+        joined_tables = set(query_args.tables)
+        candidates = []
+
+        def add_candidates(anchor_table: str) -> None:
+            for join_obj in joins_by_table[anchor_table]:
+                other_table = join_obj.to if join_obj.from_ == anchor_table else join_obj.from_
+                heapq.heappush(candidates, (self._get_table_row_count(ring, other_table), join_obj.name, anchor_table))
+
+        for table in sorted(joined_tables):
+            add_candidates(table)
+
+        ordered_joins = []
+        anchors = {}
+        while pending_joins:
+            if not candidates:
+                raise ValueError(f"Unable to connect the joins {sorted(pending_joins)} to the tables {sorted(joined_tables)}")
+            _, join_name, anchor_table = heapq.heappop(candidates)
+            if join_name not in pending_joins:
+                continue
+            join_obj = pending_joins.pop(join_name)
+
+            if join_obj.to not in joined_tables:
+                new_table = join_obj.to
+            elif join_obj.from_ not in joined_tables:
+                new_table = join_obj.from_
+            else:
+                # Both sides are already in the query (e.g. via another path)
+                continue
+
+            ordered_joins.append((join_obj, new_table))
+            anchors[new_table] = anchor_table
+            joined_tables.add(new_table)
+            add_candidates(new_table)
+
+        # Walk back from each table required by the filter to the base table, marking the joins along the way as inner
+        inner_tables = set()
+        for table in null_rejected_tables:
+            while table in anchors and table not in inner_tables:
+                inner_tables.add(table)
+                table = anchors[table]
+
+        return [(join_obj, new_table in inner_tables) for join_obj, new_table in ordered_joins]
+
+    def get_null_rejected_tables(self,
+                                 filter: SQRField,
+                                 ring: Ring) -> Set[str]:
+        """
+        Gets the tables that must have a (non-null) row for the filter to be true.
+        :param filter: The filter of the query.
+        :type filter: SQRField
+        :param ring: The Satyrn Ring object.
+        :type ring: Ring
+        :return: The names of the tables.
+        :rtype: Set[str]
+        """
+        if type(filter) != SQRField or type(filter.field) != dict:
+            return set()
+
+        if filter.field['type'] == 'and':
+            return {table for arg in filter.field['arguments'] for table in self.get_null_rejected_tables(arg, ring)}
+        elif filter.field['type'] in NULL_REJECTING_OPERATIONS:
+            literals = [str(arg) for arg in filter.field['arguments'] if type(arg) != SQRField]
+            tables = set()
+            for arg in filter.field['arguments']:
+                for entity_name, attribute_name in self._get_compared_attributes(arg, filter.ontology):
+                    attr_obj = self._get_attribute(ring, entity_name, attribute_name)
+                    if attr_obj and attr_obj.null_handling == "cast":
+                        # Nulls get replaced by a value, which only fails an equality check against a different literal
+                        if filter.field['type'] != 'exact' or not literals or str(attr_obj.null_value) in literals:
+                            continue
+                    tables.add(attr_obj.source_table if attr_obj else ring.get_entity_by_name(entity_name).primary_table)
+            return tables
+        else:
+            # Nothing can be assumed about the rows of an 'or' or a 'not'
+            return set()
+
+    def _get_compared_attributes(self,
+                                 arg: Union[SQRField, str],
+                                 ontology: OperationOntology) -> List[Tuple[str, str]]:
+        # Gets the entity attributes the argument is computed from (looking through null-propagating arithmetic)
+        if type(arg) != SQRField:
+            return []
+        if type(arg.field) == dict:
+            if not ontology.is_arithmetic_operation(arg.field['type']):
+                return []
+            return [attribute for sub_arg in arg.field['arguments'] for attribute in self._get_compared_attributes(sub_arg, ontology)]
+        if arg.entity_name:
+            return [(arg.entity_name, arg.field)]
+        return []
+
+    def _get_attribute(self,
+                       ring: Ring,
+                       entity_name: str,
+                       attribute_name: str):
+        if attribute_name == 'id':
+            return None
+        date_denomination = utils.contains_date_denomination(attribute_name)
+        if date_denomination:
+            attribute_name = date_denomination.group(1)
+        return ring.get_entity_by_name(entity_name).attributes[attribute_name]
+
+    def _get_table_row_count(self,
+                             ring: Ring,
+                             table_name: str) -> float:
+        row_count = ring.statistics.get_table_row_count(table_name) if ring.statistics else None
+        return row_count if row_count is not None else math.inf
+
     def add_join_to_query(self,
                           query: Query,
                           join_obj: RingJoin,
                           ring: Ring,
-                          added_tables=set()):
+                          added_tables=set(),
+                          isouter: bool = True,
+                          sample: 'SampledTable' = None):
         """
         Adds a join to the SQL Alchemy query.
         :param query: The SQL Alchemy query to add the joins to.
@@ -270,6 +401,10 @@ class QueryBuilderSQR:
         :type ring: Ring
         :param added_tables: The set of tables that have been joined already.
         :type added_tables: set
+        :param isouter: Whether to add the join as a left outer join (as opposed to an inner join).
+        :type isouter: bool
+        :param sample: The sample to read from in place of its table (if the query is approximate).
+        :type sample: SampledTable
         :return: The Query with the added join and the table which was joined.
         :rtype: Tuple[Query, str]
         """
@@ -291,13 +426,19 @@ class QueryBuilderSQR:
 
         # Ensure the SQL Alchemy model corresponding to the table has the join name
         if hasattr(fromtable, prefix + join_obj.name):
-            return query.join(totable, getattr(fromtable, prefix + join_obj.name), isouter=True), add_table
+            target, relation = totable, getattr(fromtable, prefix + join_obj.name)
         elif hasattr(totable, prefix + join_obj.name):
-            return query.join(fromtable, getattr(totable, prefix + join_obj.name), isouter=True), add_table
+            target, relation = fromtable, getattr(totable, prefix + join_obj.name)
         else:
             print("Problem in add_join_to_query!")
             return query, None
 
+        if sample and sample.table_name in [join_obj.from_, join_obj.to]:
+            # Join on the sample rather than the table it was taken from
+            target = sample.model if sample.table_name == add_table else target
+            return query.join(target, sample.adapt_clause(relation.property.primaryjoin), isouter=isouter), add_table
+        return query.join(target, relation, isouter=isouter), add_table
+
     def _get_op_column_name(self,
                             column: Union[dict, SQRField]) -> str:
         if type(column) == SQRField:
@@ -0,0 +1,374 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+from typing import Dict, List, Optional, Union
+
+from .QueryArguments import QueryArguments
+from .OperationOntology import OperationOntology
+from .SQRField import SQRField
+
+
+class QueryRewriterSQR:
+    """
+    Logical rewrite pass over the QueryArguments produced by the QueryBuilderSQR.
+    Subqueries that only project and filter their inputs are flattened into the query that consumes them, and filters
+    on columns that pass straight through an aggregating subquery are pushed down into that subquery. Finally, queries
+    computing derived attributes that have been materialized are routed to the summary tables.
+    """
+
+    def rewrite(self,
+                query_args: Dict[str, QueryArguments],
+                ontology: OperationOntology,
+                materializer: 'RingMaterializer' = None) -> Dict[str, QueryArguments]:
+        """
+        Rewrites the QueryArguments of a plan into an equivalent, shallower set of queries.
+        :param query_args: The QueryArguments for each subplan alias, ordered from innermost to outermost.
+        :type query_args: Dict[str, QueryArguments]
+        :param ontology: The operation ontology used to classify the operations in the fields.
+        :type ontology: OperationOntology
+        :param materializer: The materializer of the ring (no queries are routed to summary tables if not given).
+        :type materializer: RingMaterializer
+        :return: The rewritten QueryArguments for each remaining subplan alias, in the same order.
+        :rtype: Dict[str, QueryArguments]
+        """
+        query_args = dict(query_args)
+        self.flatten_subqueries(query_args, ontology)
+        self.push_down_filters(query_args, ontology)
+        if materializer:
+            self.route_to_materialized(query_args, ontology, materializer)
+        return query_args
+
+    def flatten_subqueries(self,
+                           query_args: Dict[str, QueryArguments],
+                           ontology: OperationOntology) -> None:
+        """
+        Merges each mergeable subquery into its only consumer until no more subqueries can be merged.
+        :param query_args: The QueryArguments for each subplan alias (updated in place).
+        :type query_args: Dict[str, QueryArguments]
+        :param ontology: The operation ontology.
+        :type ontology: OperationOntology
+        :return: None
+        :rtype: None
+        """
+        merged = True
+        while merged:
+            merged = False
+            # The outermost query is never merged since its select list is the result of the plan
+            for alias in list(query_args.keys())[:-1]:
+                consumers = self.get_consumers(alias, query_args)
+                if len(consumers) != 1 or query_args[consumers[0]].froms != [alias]:
+                    continue
+                if not self.is_mergeable(alias, query_args, ontology):
+                    continue
+                self.merge_subquery(alias, consumers[0], query_args)
+                merged = True
+                break
+
+    def push_down_filters(self,
+                          query_args: Dict[str, QueryArguments],
+                          ontology: OperationOntology) -> None:
+        """
+        Moves the conjuncts of each query's filter that only reference pass-through columns of a single subquery into
+        the filter of that subquery.
+        :param query_args: The QueryArguments for each subplan alias (updated in place).
+        :type query_args: Dict[str, QueryArguments]
+        :param ontology: The operation ontology.
+        :type ontology: OperationOntology
+        :return: None
+        :rtype: None
+        """
+        for alias, alias_args in query_args.items():
+            if not alias_args.filter:
+                continue
+            conjuncts = self._split_conjuncts(alias_args.filter)
+            remaining = []
+            for conjunct in conjuncts:
+                target_alias = self._get_pushdown_target(conjunct, alias, query_args, ontology)
+                if target_alias:
+                    pushed_filter = self._rehome(conjunct, target_alias, conjunct.column_name)
+                    query_args[target_alias].filter = self._conjoin(query_args[target_alias].filter, pushed_filter, target_alias)
+                else:
+                    remaining.append(conjunct)
+            if len(remaining) != len(conjuncts):
+                new_filter = None
+                for conjunct in remaining:
+                    new_filter = self._conjoin(new_filter, conjunct, alias)
+                alias_args.filter = new_filter
+
+    def route_to_materialized(self,
+                              query_args: Dict[str, QueryArguments],
+                              ontology: OperationOntology,
+                              materializer: 'RingMaterializer') -> None:
+        """
+        Has each query that groups an entity by one of its attributes and only aggregates attributes of a related
+        entity read the materialized summary of those aggregations instead (when there is one).
+        :param query_args: The QueryArguments for each subplan alias (updated in place).
+        :type query_args: Dict[str, QueryArguments]
+        :param ontology: The operation ontology.
+        :type ontology: OperationOntology
+        :param materializer: The materializer of the ring.
+        :type materializer: RingMaterializer
+        :return: None
+        :rtype: None
+        """
+        for alias, alias_args in query_args.items():
+            summary = self._get_materialized_summary(alias_args, materializer)
+            if not summary:
+                continue
+
+            # The columns of the summary table are named after the columns of the query, so each field reads the
+            # column of the same name (while keeping its definition for the units and such)
+            alias_args.sqrfields = {name: SQRField(alias,
+                                                   field=SQRField(summary.name,
+                                                                  entity_name=sqrfield.entity_name,
+                                                                  field=sqrfield.field,
+                                                                  column_name_override=sqrfield.column_name,
+                                                                  ontology=sqrfield.ontology),
+                                                   column_name_override=name,
+                                                   ontology=sqrfield.ontology)
+                                    for name, sqrfield in alias_args.sqrfields.items()}
+            if alias_args.filter:
+                alias_args.filter = self._substitute_leaves(alias_args.filter, alias_args.sqrfields[summary.key_column])
+            alias_args.froms = [summary.name]
+            # Each row of the summary is already a group
+            alias_args.group_bys = []
+
+    def get_consumers(self,
+                      alias: str,
+                      query_args: Dict[str, QueryArguments]) -> List[str]:
+        """
+        Gets the aliases of the queries that select from the given subquery.
+        :param alias: The alias of the subquery.
+        :type alias: str
+        :param query_args: The QueryArguments for each subplan alias.
+        :type query_args: Dict[str, QueryArguments]
+        :return: The aliases of the consuming queries.
+        :rtype: List[str]
+        """
+        return [consumer for consumer, consumer_args in query_args.items() if alias in consumer_args.froms]
+
+    def is_mergeable(self,
+                     alias: str,
+                     query_args: Dict[str, QueryArguments],
+                     ontology: OperationOntology) -> bool:
+        """
+        Determines if the subquery only projects and filters its inputs, meaning it can be merged into its consumer.
+        :param alias: The alias of the subquery.
+        :type alias: str
+        :param query_args: The QueryArguments for each subplan alias.
+        :type query_args: Dict[str, QueryArguments]
+        :param ontology: The operation ontology.
+        :type ontology: OperationOntology
+        :return: True if the subquery can be merged, False otherwise.
+        :rtype: bool
+        """
+        alias_args = query_args[alias]
+        if alias_args.group_bys or alias_args.sort_attributes or alias_args.having or alias_args.limit is not None:
+            return False
+
+        # Don't mix subqueries and entity tables in the FROM of the consumer (the join logic assumes one or the other)
+        from_subqueries = [from_ for from_ in alias_args.froms if from_ in query_args]
+        if not alias_args.froms or (from_subqueries and len(from_subqueries) != len(alias_args.froms)):
+            return False
+
+        # Aggregates and window functions change the cardinality (or depend on it) so can't be merged
+        return not any(self._contains_operation(sqrfield, ontology.is_analysis_operation) or self._contains_operation(sqrfield, ontology.is_rownum_operation)
+                       for sqrfield in alias_args.sqrfields.values())
+
+    def merge_subquery(self,
+                       alias: str,
+                       consumer: str,
+                       query_args: Dict[str, QueryArguments]) -> None:
+        """
+        Merges a subquery into the query consuming it, keeping the column names the consumer exposes.
+        :param alias: The alias of the subquery to merge.
+        :type alias: str
+        :param consumer: The alias of the consuming query.
+        :type consumer: str
+        :param query_args: The QueryArguments for each subplan alias (updated in place).
+        :type query_args: Dict[str, QueryArguments]
+        :return: None
+        :rtype: None
+        """
+        inner_args = query_args[alias]
+        outer_args = query_args[consumer]
+
+        outer_args.sqrfields = {name: self._substitute(sqrfield, alias, consumer) for name, sqrfield in outer_args.sqrfields.items()}
+        if outer_args.having:
+            outer_args.having = self._substitute(outer_args.having, alias, consumer)
+        outer_filter = self._substitute(outer_args.filter, alias, consumer) if outer_args.filter else None
+        inner_filter = self._rehome(inner_args.filter, consumer, inner_args.filter.column_name) if inner_args.filter else None
+        outer_args.filter = self._conjoin(inner_filter, outer_filter, consumer)
+        outer_args.froms = list(inner_args.froms)
+
+        del query_args[alias]
+
+    def _get_materialized_summary(self,
+                                  alias_args: QueryArguments,
+                                  materializer: 'RingMaterializer') -> Optional['MaterializedSummary']:
+        if len(alias_args.froms) != 2 or len(alias_args.group_bys) != 1 or alias_args.having:
+            return None
+
+        # The grouped attribute has to come first as it decides which table the query is based on (and so which
+        # groups show up)
+        group_by = alias_args.group_bys[0]
+        key_field = alias_args.sqrfields.get(group_by)
+        if not alias_args.select or alias_args.select[0] != group_by or type(key_field) != SQRField or not key_field.entity_name or type(key_field.field) != str:
+            return None
+        related_entities = [from_ for from_ in alias_args.froms if from_ != key_field.entity_name]
+        if len(related_entities) != 1:
+            return None
+        summary = materializer.get_summary(key_field.entity_name, key_field.column_name, related_entities[0])
+        if not summary:
+            return None
+
+        # Every other field has to be one of the materialized aggregations
+        for name, sqrfield in alias_args.sqrfields.items():
+            if name == group_by:
+                continue
+            if type(sqrfield.field) != dict or len(sqrfield.field['arguments']) != 1:
+                return None
+            arg = sqrfield.field['arguments'][0]
+            if type(arg) != SQRField or arg.entity_name != summary.related_entity_name or type(arg.field) != str:
+                return None
+            if summary.columns.get(name) != (sqrfield.field['type'], arg.field):
+                return None
+
+        # Any filter can only be on the grouped attribute (filtering the related entity would change the aggregations)
+        if alias_args.filter and any(leaf.column_name != group_by or leaf.entity_name != key_field.entity_name for leaf in self._get_leaves(alias_args.filter)):
+            return None
+        return summary
+
+    def _substitute_leaves(self,
+                           sqrfield: Union[SQRField, str],
+                           replacement: SQRField) -> Union[SQRField, str]:
+        # Replaces every field the operation is computed from with the given field
+        if type(sqrfield) != SQRField:
+            return sqrfield
+        if type(sqrfield.field) != dict:
+            return replacement
+        return SQRField(sqrfield.subplan_name,
+                        entity_name=sqrfield.entity_name,
+                        field={"type": sqrfield.field['type'], "arguments": [self._substitute_leaves(arg, replacement) for arg in sqrfield.field['arguments']]},
+                        column_name_override=sqrfield.column_name,
+                        ontology=sqrfield.ontology)
+
+    def _get_pushdown_target(self,
+                             conjunct: SQRField,
+                             alias: str,
+                             query_args: Dict[str, QueryArguments],
+                             ontology: OperationOntology) -> Optional[str]:
+        leaves = self._get_leaves(conjunct)
+        if not leaves or any(type(leaf.field) != SQRField for leaf in leaves):
+            return None
+
+        # The conjunct must only depend on a single subquery which isn't shared with another query
+        target_aliases = {leaf.field.subplan_name for leaf in leaves}
+        if len(target_aliases) != 1:
+            return None
+        target_alias = target_aliases.pop()
+        if target_alias not in query_args or self.get_consumers(target_alias, query_args) != [alias]:
+            return None
+
+        # Filtering before a limit or a window function changes which rows are kept or how they are numbered
+        target_args = query_args[target_alias]
+        if target_args.limit is not None or any(self._contains_operation(sqrfield, ontology.is_rownum_operation) for sqrfield in target_args.sqrfields.values()):
+            return None
+
+        # Only plain attributes pass through unchanged (and only the grouped ones if the subquery aggregates)
+        aggregates = bool(target_args.group_bys) or any(self._contains_operation(sqrfield, ontology.is_analysis_operation) for sqrfield in target_args.sqrfields.values())
+        for leaf in leaves:
+            if not leaf.field.entity_name or type(leaf.field.field) == dict:
+                return None
+            if aggregates and leaf.field.column_name not in target_args.group_bys:
+                return None
+        return target_alias
+
+    def _substitute(self,
+                    sqrfield: Union[SQRField, str],
+                    alias: str,
+                    consumer: str) -> Union[SQRField, str]:
+        # Replaces any reference to a column of the merged subquery with the definition of that column
+        if type(sqrfield) != SQRField:
+            return sqrfield
+        if type(sqrfield.field) == SQRField and sqrfield.field.subplan_name == alias:
+            return self._rehome(sqrfield.field, consumer, sqrfield.column_name)
+        if type(sqrfield.field) == dict:
+            arguments = [self._substitute(arg, alias, consumer) for arg in sqrfield.field['arguments']]
+            if all(new_arg is old_arg for new_arg, old_arg in zip(arguments, sqrfield.field['arguments'])):
+                return sqrfield
+            return SQRField(sqrfield.subplan_name,
+                            entity_name=sqrfield.entity_name,
+                            field={"type": sqrfield.field['type'], "arguments": arguments},
+                            column_name_override=sqrfield.column_name,
+                            ontology=sqrfield.ontology)
+        return sqrfield
+
+    def _rehome(self,
+                sqrfield: Union[SQRField, str],
+                alias: str,
+                column_name: str) -> Union[SQRField, str]:
+        # Copies a field (and any operation arguments) into another subplan, keeping the given column name
+        if type(sqrfield) != SQRField:
+            return sqrfield
+        if type(sqrfield.field) == dict:
+            arguments = [self._rehome(arg, alias, arg.column_name) if type(arg) == SQRField else arg for arg in sqrfield.field['arguments']]
+            return SQRField(alias,
+                            field={"type": sqrfield.field['type'], "arguments": arguments},
+                            column_name_override=column_name,
+                            ontology=sqrfield.ontology)
+        elif sqrfield.entity_name:
+            return SQRField(alias,
+                            entity_name=sqrfield.entity_name,
+                            field=sqrfield.field,
+                            column_name_override=column_name,
+                            ontology=sqrfield.ontology)
+        elif sqrfield.field.subplan_name == alias:
+            # The field reads a column of the target query itself (e.g. a filter being pushed down), so use its definition
+            return self._rehome(sqrfield.field, alias, sqrfield.field.column_name)
+        else:
+            return SQRField(alias,
+                            field=sqrfield.field,
+                            column_name_override=column_name,
+                            ontology=sqrfield.ontology)
+
+    def _conjoin(self,
+                 filter_a: Optional[SQRField],
+                 filter_b: Optional[SQRField],
+                 alias: str) -> Optional[SQRField]:
+        if not filter_a:
+            return filter_b
+        if not filter_b:
+            return filter_a
+        return SQRField(alias,
+                        field={"type": "and", "arguments": [filter_a, filter_b]},
+                        column_name_override=f"and({filter_a.column_name},{filter_b.column_name})",
+                        ontology=filter_a.ontology)
+
+    def _split_conjuncts(self,
+                         filter: SQRField) -> List[SQRField]:
+        if type(filter.field) == dict and filter.field['type'] == 'and':
+            return [conjunct for arg in filter.field['arguments'] for conjunct in self._split_conjuncts(arg)]
+        return [filter]
+
+    def _get_leaves(self,
+                    sqrfield: SQRField) -> List[SQRField]:
+        if type(sqrfield.field) == dict:
+            return [leaf for arg in sqrfield.field['arguments'] if type(arg) == SQRField for leaf in self._get_leaves(arg)]
+        return [sqrfield]
+
+    def _contains_operation(self,
+                            sqrfield: SQRField,
+                            is_operation) -> bool:
+        if type(sqrfield) != SQRField or type(sqrfield.field) != dict:
+            return False
+        return is_operation(sqrfield.field['type']) or any(self._contains_operation(arg, is_operation) for arg in sqrfield.field['arguments'])
@@ -12,20 +12,99 @@ If not, see <https://www.gnu.org/licenses/>.
 
 
 class SQRField:
+    """
+    A column of an SQR subquery: an attribute of an entity, a column of another subplan or an operation (a dict with
+    the operation 'type' and its 'arguments') over other fields.
+    Fields are immutable so their derived properties are only computed once and so they can be hashed (e.g. used as
+    cache keys). Use replace() to get a modified copy.
+    """
+
+    __slots__ = ['subplan_name', 'entity_name', 'field', 'column_name_override', 'ontology', '_key', '_memo']
+
     def __init__(self,
                  subplan_name: str,
                  entity_name: str = None,
                  field: str = None,
                  column_name_override: str = None,
                  ontology = None):
-        self.subplan_name = subplan_name
-        self.entity_name = entity_name
-        self.field = field
-        self.column_name_override = column_name_override
-        self.ontology = ontology
+        if type(field) == dict:
+            # Copy the operation so changes to the dict it was built from can't leak into the field
+            field = {"type": field['type'], "arguments": tuple(field['arguments'])}
+        object.__setattr__(self, 'subplan_name', subplan_name)
+        object.__setattr__(self, 'entity_name', entity_name)
+        object.__setattr__(self, 'field', field)
+        object.__setattr__(self, 'column_name_override', column_name_override)
+        object.__setattr__(self, 'ontology', ontology)
+        object.__setattr__(self, '_key', None)
+        object.__setattr__(self, '_memo', {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"SQRField is immutable, use replace() to change '{name}'")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"SQRField is immutable, can't delete '{name}'")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (SQRField, (self.subplan_name, self.entity_name, self.field, self.column_name_override, self.ontology))
+
+    @property
+    def key(self) -> tuple:
+        """
+        The value of the field as nested tuples (the ontology isn't part of it).
+        """
+        if self._key is None:
+            def to_key(value):
+                if type(value) == SQRField:
+                    return value.key
+                elif type(value) == dict:
+                    return (value['type'], tuple(to_key(arg) for arg in value['arguments']))
+                elif type(value) in [list, tuple]:
+                    return tuple(to_key(item) for item in value)
+                return value
+            object.__setattr__(self, '_key', (self.subplan_name, self.entity_name, to_key(self.field), self.column_name_override))
+        return self._key
+
+    def __eq__(self, other):
+        return type(other) == SQRField and (self is other or self.key == other.key)
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"SQRField({self.subplan_name}, {self.column_name})"
+
+    def replace(self, **changes) -> 'SQRField':
+        """
+        Gets a copy of this field with the given properties changed.
+        :return: The new field.
+        :rtype: SQRField
+        """
+        properties = {
+            "subplan_name": self.subplan_name,
+            "entity_name": self.entity_name,
+            "field": self.field,
+            "column_name_override": self.column_name_override,
+            "ontology": self.ontology
+        }
+        properties.update(changes)
+        return SQRField(**properties)
+
+    def _memoize(self, name, compute):
+        if name not in self._memo:
+            self._memo[name] = compute()
+        return self._memo[name]
 
     @property
     def column_name(self):
+        return self._memoize('column_name', self._get_column_name)
+
+    def _get_column_name(self):
         if self.column_name_override:
             return self.column_name_override
         elif self.entity_name:
@@ -35,23 +114,29 @@ class SQRField:
 
     @property
     def is_analysis_operation(self):
-        return type(self.field) == dict and self.ontology.is_analysis_operation(self.field['type'])
+        return self._memoize('is_analysis_operation', lambda: type(self.field) == dict and self.ontology.is_analysis_operation(self.field['type']))
 
     @property
     def is_arithmetic_operation(self):
-        return type(self.field) == dict and self.ontology.is_arithmetic_operation(self.field['type'])
+        return self._memoize('is_arithmetic_operation', lambda: type(self.field) == dict and self.ontology.is_arithmetic_operation(self.field['type']))
 
     @property
     def satyrn_entity(self):
+        return self._memoize('satyrn_entity', self._get_satyrn_entity)
+
+    def _get_satyrn_entity(self):
         if self.is_analysis_operation or self.is_arithmetic_operation:
             return self.field['arguments'][0].satyrn_entity
         elif self.column_name_override:
-            return self.entity_name
+            return self.entity_name or (self.field.satyrn_entity if type(self.field) == SQRField else None)
         else:
             return self.entity_name or self.field.satyrn_entity
 
     @property
     def satyrn_attribute(self):
+        return self._memoize('satyrn_attribute', self._get_satyrn_attribute)
+
+    def _get_satyrn_attribute(self):
         if type(self.field) == dict:
             if self.ontology.is_analysis_operation(self.field['type']) or self.ontology.is_arithmetic_operation(self.field['type']): # and len(self.field['arguments']) == 1:
                 return self.field['arguments'][0].satyrn_attribute
@@ -63,6 +148,9 @@ class SQRField:
 
     @property
     def has_count_operation(self):
+        return self._memoize('has_count_operation', self._get_has_count_operation)
+
+    def _get_has_count_operation(self):
         if type(self.field) == dict:
             if self.field['type'] in ['count', 'count_unique']:
                 return True
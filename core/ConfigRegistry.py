@@ -0,0 +1,83 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import json
+import threading
+from types import MappingProxyType
+from typing import Any, Mapping
+
+
+def freeze(value: Any) -> Any:
+    """
+    Makes a read-only copy of parsed JSON (objects become read-only mappings and arrays become tuples).
+    :param value: The parsed JSON.
+    :type value: Any
+    :return: The read-only copy.
+    :rtype: Any
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class ConfigRegistry:
+    """
+    The JSON configuration files shipped with Satyrn (defaults.json, upperOntology.json, base_plan_templates.json etc.),
+    parsed once per process and shared as read-only views. In development the files are parsed again whenever they
+    change on disk.
+    """
+
+    _configs = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls,
+            path: str) -> Mapping:
+        """
+        Gets the parsed contents of a JSON configuration file.
+        :param path: The path of the file.
+        :type path: str
+        :return: The read-only contents of the file.
+        :rtype: Mapping
+        """
+        path = os.path.abspath(path)
+        entry = cls._configs.get(path)
+        if entry is not None and not cls.is_reload_enabled():
+            return entry[1]
+
+        modified_at = os.path.getmtime(path)
+        if entry is not None and entry[0] == modified_at:
+            return entry[1]
+
+        with cls._lock:
+            entry = cls._configs.get(path)
+            if entry is None or entry[0] != modified_at:
+                with open(path, 'r') as file:
+                    entry = (modified_at, freeze(json.load(file)))
+                cls._configs[path] = entry
+        return entry[1]
+
+    @classmethod
+    def is_reload_enabled(cls) -> bool:
+        # SATYRN_CONFIG_RELOAD overrides the default of reloading in development
+        reload = os.environ.get("SATYRN_CONFIG_RELOAD")
+        if reload is None:
+            return os.environ.get("FLASK_ENV", "development").lower() in ["dev", "development"]
+        return reload.lower() in ["1", "true", "yes"]
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._configs = {}
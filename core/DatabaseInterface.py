@@ -33,7 +33,8 @@ class DatabaseInterface:
     def get_sqlalchemy_field(self,
                              ring: 'Ring',
                              sqrfield: SQRField,
-                             field = None)  -> InstrumentedAttribute:
+                             field = None,
+                             sample: 'SampledTable' = None)  -> InstrumentedAttribute:
         """
         Gets the field of the entity for given the attribute.
         :param ring:
@@ -42,6 +43,8 @@ class DatabaseInterface:
         :type sqrfield:
         :param field:
         :type field:
+        :param sample: The sample to read from in place of its table (if the query is approximate).
+        :type sample: SampledTable
         :return:
         :rtype:
         """
@@ -68,7 +71,7 @@ class DatabaseInterface:
 
             if field is None:
                 # Get the SQL Alchemy model associated with the model name string
-                model = getattr(self.db, model_name)
+                model = sample.model if sample and sample.table_name == model_name else getattr(self.db, model_name)
 
                 # Get the SQL Alchemy object representing this field
                 field = getattr(model, field_name)
@@ -109,7 +112,8 @@ class DatabaseInterface:
     # PENDING: Adding capabilities for multi-table entities (currently being worked on by developers)
     def get_field_label_and_name_and_joins_todo(self,
                                                 ring: 'Ring',
-                                                sqrfield: SQRField) -> Tuple[Label, list]:
+                                                sqrfield: SQRField,
+                                                sample: 'SampledTable' = None) -> Tuple[Label, list]:
         """
         Returns the SQLAlchemy Label for name, the raw field name, and any joins that must be performed.
         Note: The field.label function converts the Model Attribute's name to the database column name defined in the Satyrn Ring.
@@ -120,6 +124,8 @@ class DatabaseInterface:
         :type ring:
         :param sqrfield:
         :type sqrfield:
+        :param sample: The sample to read from in place of its table (if the query is approximate).
+        :type sample: SampledTable
         :return:
         :rtype:
         """
@@ -128,7 +134,7 @@ class DatabaseInterface:
         joins_todo = ring.get_attribute_joins(sqrfield.satyrn_entity, sqrfield.satyrn_attribute)
 
         # Get the SQL Alchemy field for this attribute
-        field = ring.db_interface.get_sqlalchemy_field(ring, sqrfield)
+        field = ring.db_interface.get_sqlalchemy_field(ring, sqrfield, sample=sample)
 
         # Convert the field to its label
         return field.label(sqrfield.column_name), joins_todo
@@ -137,7 +143,8 @@ class DatabaseInterface:
                                                 ring: 'Ring',
                                                 op_sqrfield: SQRField,
                                                 ontology: OperationOntology,
-                                                subqueries: List[Query]) -> Tuple[Label, list]:
+                                                subqueries: List[Query],
+                                                sample: 'SampledTable' = None) -> Tuple[Label, list]:
         """
         Returns the SQLAlchemy Label for name, the raw field name, and any joins that must be performed.
         Note: The field.label function converts the Model Attribute's name to the database column name defined in the Satyrn Ring.
@@ -150,6 +157,8 @@ class DatabaseInterface:
         :type sqrfield:
         :param ontology:
         :type ontology:
+        :param sample: The sample to read from in place of its table (counts and sums get scaled up to the full table).
+        :type sample: SampledTable
         :return:
         :rtype:
         """
@@ -168,7 +177,7 @@ class DatabaseInterface:
 
                     fields.append(ring.db_interface.get_sqlalchemy_field(ring, sqrfield, field=field))
                 elif type(sqrfield.field) == dict:
-                    field, new_joins_todo = self.get_field_label_and_joins_for_operation(ring, sqrfield, ontology, subqueries)
+                    field, new_joins_todo = self.get_field_label_and_joins_for_operation(ring, sqrfield, ontology, subqueries, sample)
                     joins_todo.update(new_joins_todo)
                     fields.append(field)
                 else:
@@ -177,10 +186,14 @@ class DatabaseInterface:
                 joins_todo.update(ring.get_attribute_joins(sqrfield.satyrn_entity, sqrfield.satyrn_attribute))
 
                 # Get the SQL Alchemy field for this attribute
-                fields.append(ring.db_interface.get_sqlalchemy_field(ring, sqrfield))
+                fields.append(ring.db_interface.get_sqlalchemy_field(ring, sqrfield, sample=sample))
 
         # Add the operation to the field object
         op_field = op.sqlalchemy_op(fields, ring.get_db_type())
+        if sample and op.name == 'count':
+            op_field = cast(func.round(op_field / sample.fraction), sqlalchemy.Integer)
+        elif sample and op.name == 'sum':
+            op_field = op_field / sample.fraction
         if op.name in ['average', 'stddev', 'divide', 'percent_change']:
             op_field = func.round(cast(op_field, sqlalchemy.Numeric), 2)
 
@@ -0,0 +1,167 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import threading
+from typing import Set
+
+from sqlalchemy import Date, String, Table, cast, create_engine, extract, func, literal, select
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+
+class Dialect:
+    """
+    The SQL a type of database needs for the functions that differ between databases, along with what the database can
+    do natively. This base class sticks to standard SQL and is used for any database without a dialect of its own.
+    """
+
+    # Capabilities
+    MEDIAN = "median"
+    PERCENTILE = "percentile"
+    STDDEV = "stddev"
+    WINDOW_FUNCTIONS = "window_functions"
+    FILTER_CLAUSE = "filter_clause"
+    CORRELATION = "correlation"
+    CAPABILITIES = [MEDIAN, PERCENTILE, STDDEV, WINDOW_FUNCTIONS, FILTER_CLAUSE, CORRELATION]
+
+    name = None
+    # Whether approximate queries should read from precomputed sample tables (when the database can't sample as it scans)
+    precompute_samples = False
+
+    def __init__(self,
+                 name: str = None):
+        """
+        :param name: The type of database (the data source type of the ring), if the dialect doesn't have a name of its own.
+        :type name: str
+        """
+        self.name = self.name or name
+        self.engine = None
+        self.capabilities = None
+        self.lock = threading.Lock()
+
+    def create_engine(self,
+                      connection_string: str) -> Engine:
+        """
+        Creates the engine for the database (which the dialect then checks its capabilities against).
+        :param connection_string: The connection string (or path, for file based databases) of the database.
+        :type connection_string: str
+        :return: The engine.
+        :rtype: Engine
+        """
+        self.engine = create_engine(connection_string, pool_size=1, max_overflow=19)
+        return self.engine
+
+    def supports(self,
+                 capability: str) -> bool:
+        """
+        Whether the database has the given capability, checked against the database the first time it's needed.
+        :param capability: One of the CAPABILITIES.
+        :type capability: str
+        :return: Whether the database has the capability.
+        :rtype: bool
+        """
+        if self.capabilities is None:
+            with self.lock:
+                if self.capabilities is None:
+                    self.capabilities = self.detect_capabilities()
+        return capability in self.capabilities
+
+    def detect_capabilities(self) -> Set[str]:
+        """
+        Finds the capabilities of the database by running a tiny query that uses each one.
+        :return: The capabilities of the database.
+        :rtype: Set[str]
+        """
+        if self.engine is None:
+            return set()
+        values = select(literal(1).label("x")).subquery("probe")
+        x = values.c.x
+        probes = {
+            self.MEDIAN: select(self.median(x)),
+            self.PERCENTILE: select(self.percentile(x, 0.9)),
+            self.STDDEV: select(self.stddev(x)),
+            self.WINDOW_FUNCTIONS: select(func.row_number().over(order_by=x)),
+            self.FILTER_CLAUSE: select(func.count().filter(x > 0)),
+            self.CORRELATION: select(func.corr(x, x))
+        }
+        capabilities = set()
+        for capability, probe in probes.items():
+            try:
+                with self.engine.connect() as connection:
+                    connection.execute(probe.select_from(values)).fetchall()
+                capabilities.add(capability)
+            except SQLAlchemyError:
+                pass
+        return capabilities
+
+    def right(self,
+              field,
+              char_n: int = 2):
+        # The last char_n characters of a string
+        return func.right(field, char_n)
+
+    def median(self,
+               field):
+        return self.percentile(field, 0.5)
+
+    def percentile(self,
+                   field,
+                   fraction: float):
+        # The first value at or above the fraction of the (ordered) values
+        return func.percentile_disc(fraction).within_group(field.asc())
+
+    def stddev(self,
+               field):
+        return func.stddev_samp(field)
+
+    def string_agg(self,
+                   field,
+                   separator: str = ', '):
+        return func.string_agg(cast(field, String), separator)
+
+    def date_cast(self,
+                  field):
+        return cast(field, Date)
+
+    def extract(self,
+                field: str,
+                column):
+        # A part (year, month, dow etc.) of a date or datetime
+        return extract(field, column)
+
+    def random_clause(self,
+                      fraction: float):
+        """
+        Builds a WHERE clause that keeps each row with the given probability.
+        :param fraction: The fraction of rows to keep.
+        :type fraction: float
+        :return: The SQL Alchemy boolean expression.
+        :rtype: BinaryExpression
+        """
+        return func.random() < fraction
+
+    def table_sample(self,
+                     table: Table,
+                     fraction: float,
+                     name: str):
+        """
+        Samples the table as it's scanned, if the database can.
+        :param table: The table to sample.
+        :type table: Table
+        :param fraction: The fraction of rows to sample.
+        :type fraction: float
+        :param name: The name of the sample in the FROM clause.
+        :type name: str
+        :return: The sampled table or None if the database can't sample tables.
+        :rtype: TableSample
+        """
+        return None
@@ -0,0 +1,114 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import glob
+from typing import Dict, List
+
+from sqlalchemy import TIMESTAMP, cast, create_engine, extract, func, text
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import BindParameter
+
+from core.Dialects.Dialect import Dialect
+
+
+@compiles(BindParameter, "duckdb")
+def render_bind_parameter(element, compiler, **kw):
+    # DuckDB binds parameters on the server, so an expression with parameters in both the SELECT and the GROUP BY (e.g.
+    # the null value of an attribute) isn't recognized as the same expression. Render the values into the SQL instead.
+    if element.value is not None and not element.expanding and not element.callable:
+        kw["literal_binds"] = True
+    return compiler.visit_bindparam(element, **kw)
+
+
+class DuckDBDialect(Dialect):
+    """
+    DuckDB, an embedded (single node) analytical database. The data is either in a DuckDB database file or in Parquet/CSV
+    files which are queried in place (through views in a small catalog database). Needs the duckdb-engine package.
+    """
+
+    name = "duckdb"
+
+    # The functions reading each type of file, by file extension
+    FILE_READERS = {
+        ".parquet": "read_parquet",
+        ".csv": "read_csv_auto",
+        ".tsv": "read_csv_auto"
+    }
+
+    def create_engine(self,
+                      connection_string: str) -> Engine:
+        # The compiled SQL includes the parameter values (see above) so it can't be cached
+        self.engine = create_engine("duckdb:///{}".format(connection_string), query_cache_size=0)
+        return self.engine
+
+    def percentile(self,
+                   field,
+                   fraction: float):
+        # Rather than median(), which interpolates between the middle values
+        return func.quantile_disc(field, fraction)
+
+    def extract(self,
+                field: str,
+                column):
+        # Dates read from files (or stored as strings) need casting before their parts can be extracted
+        return extract(field, cast(column, TIMESTAMP))
+
+    def create_file_views(self,
+                          data_dir: str,
+                          tables: List[Dict]) -> None:
+        """
+        Creates a view for each table over the files holding its data, so they're queried in place. The file of a table
+        is given by its "file" (a path or glob relative to the data directory) or else is the first of <name>.parquet,
+        <name>.csv or a <name> directory of (possibly hive partitioned) Parquet files found in the data directory.
+        :param data_dir: The directory the files are in.
+        :type data_dir: str
+        :param tables: The tables of the ring's data source.
+        :type tables: List[Dict]
+        :return: None
+        :rtype: None
+        """
+        with self.engine.begin() as connection:
+            for table in tables:
+                connection.execute(text('CREATE OR REPLACE VIEW "{}" AS SELECT * FROM {}'.format(table["name"], self.get_file_reader(data_dir, table))))
+
+    def get_file_reader(self,
+                        data_dir: str,
+                        table: Dict) -> str:
+        """
+        Gets the SQL reading the file(s) of a table.
+        :param data_dir: The directory the files are in.
+        :type data_dir: str
+        :param table: The table (from the ring's data source).
+        :type table: dict
+        :return: The call to the DuckDB function reading the files.
+        :rtype: str
+        """
+        if table.get("file"):
+            candidates = [os.path.join(data_dir, table["file"])]
+        else:
+            name = os.path.join(data_dir, table["name"])
+            candidates = [name + extension for extension in self.FILE_READERS] + [os.path.join(name, "**", "*.parquet")]
+
+        for path in candidates:
+            if not glob.glob(path, recursive=True):
+                continue
+            extension = os.path.splitext(path)[1].lower()
+            if extension not in self.FILE_READERS:
+                raise ValueError(f"Can't read the file {path} of table {table['name']}, expected one of {list(self.FILE_READERS)}")
+            quoted_path = "'{}'".format(os.path.abspath(path).replace("'", "''"))
+            if "*" in path and extension == ".parquet":
+                return f"{self.FILE_READERS[extension]}({quoted_path}, hive_partitioning = true)"
+            return f"{self.FILE_READERS[extension]}({quoted_path})"
+
+        raise ValueError(f"No data file found for table {table['name']} in {data_dir}")
@@ -0,0 +1,33 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+from sqlalchemy import Table, func, tablesample
+
+from core.Dialects.Dialect import Dialect
+
+
+class PostgresDialect(Dialect):
+    """
+    Postgres, which samples tables as they're scanned (TABLESAMPLE BERNOULLI).
+    """
+
+    name = "postgres"
+
+    def stddev(self,
+               field):
+        return func.stddev(field)
+
+    def table_sample(self,
+                     table: Table,
+                     fraction: float,
+                     name: str):
+        return tablesample(table, func.bernoulli(fraction * 100), name=name)
@@ -0,0 +1,203 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+# Aggregate functions SQLite doesn't have, registered on each of its connections. The order statistics buffer the values
+# of the group and select the ones they need (rather than sorting them all), the moments are computed in a single pass.
+
+import math
+from collections import Counter
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def select_values(values: list,
+                  positions: list) -> list:
+    """
+    Selects the values at the given positions of the sorted values, without sorting all of them.
+    :param values: The values of the group.
+    :type values: list
+    :param positions: The (0 based) positions in the sorted values.
+    :type positions: list
+    :return: The value at each of the positions.
+    :rtype: list
+    """
+    if all(map(is_number, values)):
+        # numpy is slow to import and only needed once a query uses one of these aggregates
+        import numpy as np
+        selected = np.partition(np.asarray(values, dtype=float), positions)
+        return [selected[position].item() for position in positions]
+    # E.g. dates (stored as strings), which can only be compared
+    ordered = sorted(values)
+    return [ordered[position] for position in positions]
+
+
+class PercentileDisc:
+    """
+    The first value at or above the fraction of the ordered values, like Postgres' percentile_disc.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.fraction = None
+
+    def step(self,
+             value,
+             fraction=0.5):
+        if self.fraction is None:
+            if not is_number(fraction) or not 0 <= fraction <= 1:
+                raise ValueError(f"Percentile fraction must be in [0, 1], got {fraction}")
+            self.fraction = fraction
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        if not self.values:
+            return None
+        position = max(math.ceil(self.fraction * len(self.values)) - 1, 0)
+        return select_values(self.values, [position])[0]
+
+
+class PercentileCont(PercentileDisc):
+    """
+    The value at the fraction of the ordered values, interpolating between the values either side of it, like Postgres'
+    percentile_cont. Values that can't be interpolated (e.g. dates, which SQLite stores as strings) fall back to
+    percentile_disc.
+    """
+
+    def finalize(self):
+        if not self.values:
+            return None
+        if not all(map(is_number, self.values)):
+            return super().finalize()
+        position = self.fraction * (len(self.values) - 1)
+        lower_position, upper_position = math.floor(position), math.ceil(position)
+        lower, upper = select_values(self.values, [lower_position, upper_position])
+        return lower + (upper - lower) * (position - lower_position)
+
+
+class Median(PercentileDisc):
+
+    def step(self,
+             value):
+        super().step(value, 0.5)
+
+
+class Mode:
+    """
+    The most common value (the smallest of them if there's a tie).
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def step(self,
+             value):
+        if value is not None:
+            self.counts[value] += 1
+
+    def finalize(self):
+        if not self.counts:
+            return None
+        most_common_count = max(self.counts.values())
+        return min(value for value, count in self.counts.items() if count == most_common_count)
+
+
+class Variance:
+    """
+    The sample variance, computed with Welford's algorithm.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.sum_squares = 0.0
+
+    def step(self,
+             value):
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.sum_squares += delta * (value - self.mean)
+
+    def finalize(self):
+        if self.count < 2:
+            return None
+        return self.sum_squares / (self.count - 1)
+
+
+class StdDev(Variance):
+    """
+    The sample standard deviation.
+    """
+
+    def finalize(self):
+        variance = super().finalize()
+        return math.sqrt(variance) if variance is not None else None
+
+
+class Correlation:
+    """
+    The Pearson correlation coefficient of the pairs of values where both are not null, like Postgres' corr.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sum_squares_x = 0.0
+        self.sum_squares_y = 0.0
+        self.sum_products = 0.0
+
+    def step(self,
+             x,
+             y):
+        if x is None or y is None:
+            return
+        self.count += 1
+        delta_x = x - self.mean_x
+        self.mean_x += delta_x / self.count
+        delta_y = y - self.mean_y
+        self.mean_y += delta_y / self.count
+        self.sum_squares_x += delta_x * (x - self.mean_x)
+        self.sum_squares_y += delta_y * (y - self.mean_y)
+        self.sum_products += delta_x * (y - self.mean_y)
+
+    def finalize(self):
+        if self.count < 1 or self.sum_squares_x == 0 or self.sum_squares_y == 0:
+            return None
+        return self.sum_products / math.sqrt(self.sum_squares_x * self.sum_squares_y)
+
+
+# The name, number of arguments and implementation of each aggregate
+AGGREGATES = [
+    ("median", 1, Median),
+    ("percentile_disc", 2, PercentileDisc),
+    ("percentile_cont", 2, PercentileCont),
+    ("mode", 1, Mode),
+    ("variance", 1, Variance),
+    ("var_samp", 1, Variance),
+    ("stdev", 1, StdDev),
+    ("stddev", 1, StdDev),
+    ("stddev_samp", 1, StdDev),
+    ("corr", 2, Correlation)
+]
+
+
+def register_aggregates(dbapi_conn,
+                        unused=None) -> None:
+    # Note: unused needs to be here for the SQLAlchemy listen() function to work properly
+    for name, num_args, aggregate in AGGREGATES:
+        dbapi_conn.create_aggregate(name, num_args, aggregate)
@@ -0,0 +1,67 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+from sqlalchemy import String, cast, create_engine, func
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.event import listen
+
+from core.Dialects.Dialect import Dialect
+from core.Dialects.SQLiteAggregates import register_aggregates
+
+
+class SQLiteDialect(Dialect):
+    """
+    SQLite (and csv rings, which are loaded into SQLite). Median, percentiles, standard deviations and correlations come
+    from the aggregates in SQLiteAggregates, which are registered on every connection (before any of the loadable
+    extensions in core/sqlite_extensions for the platform, so their native functions take over where they exist).
+    """
+
+    name = "sqlite"
+    precompute_samples = True
+
+    def create_engine(self,
+                      connection_string: str) -> Engine:
+        # Imported here since the data source module imports the app
+        from core.RingObjects.RingDataSource import connect_to_extensions
+
+        self.engine = create_engine("sqlite:///{}".format(connection_string))
+        listen(self.engine, 'connect', register_aggregates)
+        connect_to_extensions(self.engine)
+        return self.engine
+
+    def right(self,
+              field,
+              char_n: int = 2):
+        return func.substr(field, -char_n, char_n)
+
+    def percentile(self,
+                   field,
+                   fraction: float):
+        return func.percentile_disc(field, fraction)
+
+    def stddev(self,
+               field):
+        return func.stdev(field)
+
+    def string_agg(self,
+                   field,
+                   separator: str = ', '):
+        return func.group_concat(cast(field, String), separator)
+
+    def date_cast(self,
+                  field):
+        return func.DATE(field)
+
+    def random_clause(self,
+                      fraction: float):
+        # SQLite's random() is a signed 64-bit integer rather than a float in [0, 1)
+        return func.abs(func.random()) % 1000000 < int(fraction * 1000000)
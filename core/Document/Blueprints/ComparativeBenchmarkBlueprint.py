@@ -10,10 +10,10 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-import json
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+from core.ConfigRegistry import ConfigRegistry
 from core.RingObjects.Ring import Ring
 from core.Document.Blueprints.utils import build_metric_name
 
@@ -53,8 +53,7 @@ class ComparativeBenchmarkBlueprint():
 
         # Read in the JSON file of info_requirements.json
         p = Path(__file__).with_name('base_plan_templates.json')
-        with p.open('r') as f:
-            self.base_plan_templates = json.load(f)
+        self.base_plan_templates = ConfigRegistry.get(str(p))
 
         # Generate / retrieve some useful information about the entity and metric
         self.metric_name = build_metric_name(self.metric_aggregation, self.metric_entity_name, self.metric_attribute_name)
@@ -10,19 +10,41 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-import re
-from copy import deepcopy
-from typing import Dict, List, Union
+from typing import Dict, List, Mapping, Union
 from core.RingObjects.Ring import Ring
 
 from core.Analysis.AnalysisStep import AnalysisStep
+from core.Planning.PlanTemplate import PlanTemplate
 
 class SQRPlanFiller:
     def __init__(self,
-                 ring: Ring):
+                 ring: Ring,
+                 plan_parser=None):
+        """
+        :param ring: The ring the plans are filled in for.
+        :type ring: Ring
+        :param plan_parser: The parser used to compile raw plan templates (only needed by fill_plan_template).
+        :type plan_parser: AnalysisPlanParser
+        """
         self.ring = ring
-        self.template_token_matcher = '({([^}]+)})'
-        self.template_token_matcher_regex = re.compile(self.template_token_matcher)
+        self.plan_parser = plan_parser
+
+    def fill_plan_template(self,
+                           raw_plan: Mapping[str, str],
+                           slot_fillers: Dict[str, str]) -> Dict[str, AnalysisStep]:
+        """
+        Fills in the given raw plan template (e.g. a base plan template or an access plan) with the specified slot fillers.
+        The template is parsed and its slots located only the first time it is filled in.
+        :param raw_plan: The plan template mapping step refs to SQR operations.
+        :type raw_plan: Mapping[str, str]
+        :param slot_fillers: Maps the slots (e.g. "Entity:0") to what they should be filled in with.
+        :type slot_fillers: Dict[str, str]
+        :return: The filled in plan steps.
+        :rtype: Dict[str, AnalysisStep]
+        """
+        plan_template = PlanTemplate.get(raw_plan, self.plan_parser)
+        filled_plan = plan_template.fill(slot_fillers)
+        return filled_plan if filled_plan is not None else dict(plan_template.steps)
 
     def fill_plan(self,
                   plan: Dict[str, AnalysisStep],
@@ -36,32 +58,8 @@ class SQRPlanFiller:
         :return:
         :rtype:
         """
-
-        # Make a copy of the plan which will be filled in using the specified slots and fillers
-        plan_to_fill = deepcopy(plan)
-        filled_any_slot = False
-
-        # Get useful information for filling in the slots
-        plan_slot_info = self.identify_slots_in_plan_template(plan)
-
-        # Fill in any of the slots, if possible
-        for slot, filler in slot_fillers.items():
-            if slot in plan_slot_info:
-                for slot_location_dict in plan_slot_info[slot]:
-                    step_idx = slot_location_dict['step_idx']
-                    arg_idx = slot_location_dict['arg_idx']
-                    if arg_idx == -1:
-                        # The filler is meant to replace the operation, not one of the step arguments
-                        plan_to_fill[step_idx].operation = filler
-                    else:
-                        plan_to_fill[step_idx].args[arg_idx] = filler
-                filled_any_slot = True
-
-        # If any of the slots were filled in this plan, add it to the list of output plans
-        if filled_any_slot:
-            return plan_to_fill
-        else:
-            return plan
+        filled_plan = PlanTemplate(plan).fill(slot_fillers)
+        return filled_plan if filled_plan is not None else plan
 
     def generate_plans_with_specified_slots(self,
                                             partial_plan: Dict[str, AnalysisStep],
@@ -75,30 +73,10 @@ class SQRPlanFiller:
         :return: The set of partial plans with some of their slots filled.
         :rtype: List of dict
         """
+        plan_template = PlanTemplate(partial_plan)
 
-        partial_plans = []
-        plan_slot_info = self.identify_slots_in_plan_template(partial_plan)
-        for slot_fillers in fillers_for_slots:
-            # Make a copy of the plan which will be filled in using the specified slots and fillers
-            plan_to_fill = deepcopy(partial_plan)
-            filled_any_slot = False
-
-            # Fill in any of the slots, if possible
-            for slot, filler in slot_fillers.items():
-                if slot in plan_slot_info:
-                    for slot_location_dict in plan_slot_info[slot]:
-                        step_idx = slot_location_dict['step_idx']
-                        arg_idx = slot_location_dict['arg_idx']
-                        if arg_idx == -1:
-                            # The filler is meant to replace the operation, not one of the step arguments
-                            plan_to_fill[step_idx].operation = filler
-                        else:
-                            plan_to_fill[step_idx].args[arg_idx] = filler
-                    filled_any_slot = True
-
-            # If any of the slots were filled in this plan, add it to the list of output plans
-            if filled_any_slot:
-                partial_plans.append(plan_to_fill)
+        # Only keep the plans in which any of the slots were filled
+        partial_plans = [filled_plan for filled_plan in map(plan_template.fill, fillers_for_slots) if filled_plan is not None]
 
         # Deduplicate the partial plans
         deduplicated_partial_plans = self.dedupe_list_of_dict(partial_plans)
@@ -106,17 +84,20 @@ class SQRPlanFiller:
         return deduplicated_partial_plans
 
     def dedupe_list_of_dict(self,
-                            lst: List[Dict]) -> List[Dict]:
+                            lst: List[Dict[str, AnalysisStep]]) -> List[Dict[str, AnalysisStep]]:
         """
-        Returns a new copy the list without duplicate dictionary elements.
-        :param lst: The list of dictionaries for which there should be no duplicated dictionaries.
+        Returns a new copy the list without duplicate plans (keeping the first of each).
+        :param lst: The list of plan steps for which there should be no duplicated plans.
         :type lst: List of dict
-        :return: A new list with no duplicated dictionary elements.
+        :return: A new list with no duplicated plans.
         :rtype:
         """
         unique_list = []
+        seen = set()
         for item in lst:
-            if item not in unique_list:
+            key = PlanTemplate.plan_key(item)
+            if key not in seen:
+                seen.add(key)
                 unique_list.append(item)
         return unique_list
 
@@ -129,35 +110,5 @@ class SQRPlanFiller:
         :return: A dictionary mapping the slot names to a list of locations where this slot appears in the plan.
         :rtype: Dict
         """
-        slot_info = {}
-        for step_idx, step in plan_template.items():
-            # Check if the operation is a slot
-            match = re.search(self.template_token_matcher_regex, step.operation)
-            if match:
-                if match.string.strip("{}") in slot_info:
-                    slot_info[match.string.strip("{}")].append({
-                        "step_idx": step_idx,
-                        "arg_idx": -1
-                    })
-                else:
-                    slot_info[match.string.strip("{}")] = [{
-                        "step_idx": step_idx,
-                        "arg_idx": -1
-                    }]
-
-            # Check if any of the arguments for this step is a slot
-            for arg_idx, step_arg in enumerate(step.args):
-                match = re.search(self.template_token_matcher_regex, str(step.args[arg_idx]))
-                if match:
-                    if match.string.strip("{}") in slot_info:
-                        slot_info[match.string.strip("{}")].append({
-                            "step_idx": step_idx,
-                            "arg_idx": arg_idx
-                        })
-                    else:
-                        slot_info[match.string.strip("{}")] = [{
-                            "step_idx": step_idx,
-                            "arg_idx": arg_idx
-                        }]
-
-        return slot_info
\ No newline at end of file
+        return {slot: [{"step_idx": step_idx, "arg_idx": arg_idx} for step_idx, arg_idx in locations]
+                for slot, locations in PlanTemplate(plan_template).slot_locations.items()}
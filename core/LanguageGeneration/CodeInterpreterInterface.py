@@ -11,14 +11,26 @@ If not, see <https://www.gnu.org/licenses/>.
 '''
 
 import json, os, time
-import openai
+import asyncio
+import logging
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Tuple
+
+from core.LanguageGeneration.LanguageModel import LanguageModel
+
+logger = logging.getLogger(__name__)
+
+class CodeInterpreterInterface(LanguageModel):
+    # The number of seconds between checks on a run, growing up to the max until the run finishes
+    POLL_INTERVAL = 0.1
+    MAX_POLL_INTERVAL = 2.0
 
-class CodeInterpreterInterface:
     def __init__(self,
                  ring_name):
+        super().__init__("openai-assistants")
+
         # Init access to OpenAI's API
+        import openai
         self.openai_api_key = os.environ.get("OPENAI_API_KEY")
         self.client = openai.OpenAI(self.openai_api_key)
 
@@ -39,18 +51,31 @@ class CodeInterpreterInterface:
 
     def generate(self,
                  prompt: str) -> str:
-        # Feed the prompt to the language model
-        response = self.get_response(prompt)
+        # The assistants API is driven through the OpenAI client, so only the backend's concurrency limit and metrics are shared
+        start = time.time()
+        with self.backend.semaphore:
+            try:
+                # Feed the prompt to the language model
+                response, usage = self.get_response(prompt)
+            except Exception:
+                self.backend.record(time.time() - start, 0, True, None)
+                raise
+        self.backend.record(time.time() - start, 0, False, usage)
 
         # Extract the generation from the response
         qdmr = self.extract_generation_from_response(response)
 
         return qdmr
 
+    async def agenerate(self,
+                        prompt: str) -> str:
+        # The run is polled through the (blocking) OpenAI client, so it's done on a worker thread
+        return await asyncio.get_running_loop().run_in_executor(None, self.generate, prompt)
+
     def get_response(self,
-                     prompt: str) -> Dict:
+                     prompt: str) -> Tuple[Dict, Optional[Dict]]:
         # Make the API call off to GPT
-        print(f"Prompt:\n{prompt}")
+        logger.debug("Prompt for %s: %s", self.backend.name, prompt)
 
         message = self.client.beta.threads.messages.create(
             thread_id=self.thread.id,
@@ -63,9 +88,12 @@ class CodeInterpreterInterface:
             assistant_id = self.assistant.id
         )
 
-        while run.status in ['queued', 'in_progress']:
-            print('evaluating')
-            time.sleep(0.5)
+        # Check on the run less and less often (rather than every half second) until it finishes or times out
+        poll_interval = self.POLL_INTERVAL
+        deadline = time.time() + self.backend.timeout
+        while run.status in ['queued', 'in_progress'] and time.time() < deadline:
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, self.MAX_POLL_INTERVAL)
             run = self.client.beta.threads.runs.retrieve(
                 thread_id = self.thread.id,
                 run_id = run.id
@@ -76,11 +104,10 @@ class CodeInterpreterInterface:
             )
         else:
             raise Exception('Connection most likely timed out.')
-        # Save the raw output
-        print("RAW OPENAI RESPONSE")
-        print(messages)
+        logger.debug("Response from %s: %s", self.backend.name, messages)
 
-        return messages
+        usage = getattr(run, "usage", None)
+        return messages, usage.model_dump() if hasattr(usage, "model_dump") else usage
 
     def extract_generation_from_response(self,
                                          response: Dict) -> str:
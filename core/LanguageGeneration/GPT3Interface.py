@@ -11,47 +11,30 @@ If not, see <https://www.gnu.org/licenses/>.
 '''
 
 import os
-from openai import OpenAI
 
-from typing import Dict
+from typing import Dict, Tuple
 
-class GPT3Interface:
-    def __init__(self):
-        # Init access to OpenAI's API
-        self.openai_api_key = os.environ.get("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=self.openai_api_key)
-
-    def generate(self,
-                 prompt: str) -> str:
-        # Feed the prompt to the language model
-        response = self.get_response(prompt)
-
-        # Extract the generation from the response
-        qdmr = self.extract_generation_from_response(response)
+import httpx
 
-        return qdmr
+from core.LanguageGeneration.LanguageModel import LanguageModel
 
-    def get_response(self,
-                     prompt: str) -> Dict:
-        # Make the API call off to GPT
-        print(f"Prompt:\n{prompt}")
-        response = self.client.completions.create(engine="text-davinci-003",
-        prompt=prompt,
-        max_tokens=256,
-        temperature=0.0)
+class GPT3Interface(LanguageModel):
+    def __init__(self):
+        self.base_url = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+        super().__init__(f"openai:{self.base_url}")
+        self.openai_api_key = os.environ.get("OPENAI_API_KEY")
 
-        # Save the raw output
-        print("RAW OPENAI RESPONSE")
-        print(response)
+    def get_cache_parameters(self) -> Dict:
+        # The generation parameters that responses are cached by (along with the prompt)
+        return {"model": "text-davinci-003", "temperature": 0.0, "max_tokens": 256}
 
-        return response
+    def build_request(self,
+                      prompt: str) -> Tuple[str, Dict, Dict]:
+        return f"{self.base_url}/completions", {"Authorization": f"Bearer {self.openai_api_key}"}, dict(self.get_cache_parameters(), prompt=prompt)
 
     def extract_generation_from_response(self,
-                                   response: Dict) -> str:
-        # Pull out the generated text from the response
-        qdmr = response.choices[0].text
-
-        # Clean up the string
-        qdmr = qdmr.strip()
+                                         response: httpx.Response) -> str:
+        response.raise_for_status()
 
-        return qdmr
\ No newline at end of file
+        # Pull out the generated text from the response and clean up the string
+        return response.json()["choices"][0]["text"].strip()
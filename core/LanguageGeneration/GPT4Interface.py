@@ -10,52 +10,20 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-import os
-from openai import OpenAI
+from core.LanguageGeneration.LanguageModel import OpenAIChatModel
 
-from typing import Dict
-
-class GPT4Interface:
+class GPT4Interface(OpenAIChatModel):
     def __init__(self):
-        # Init access to OpenAI's API
-        self.openai_api_key = os.environ.get("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=self.openai_api_key)
+        super().__init__("gpt-4")
 
     def generate(self,
                  prompt: str,
                  temp: float = 0.0,
                  max_tokens: int = 1024) -> str:
-        # Feed the prompt to the language model
-        response = self.get_response(prompt, temp=temp, max_tokens=max_tokens)
-
-        # Extract the generation from the response
-        qdmr = self.extract_generation_from_response(response)
-
-        return qdmr
-
-    def get_response(self,
-                     prompt: str,
-                     temp: float = 0.0,
-                     max_tokens: int = 1024) -> Dict:
-        # Make the API call off to GPT
-        print(f"Prompt:\n{prompt}")
-        response = self.client.chat.completions.create(model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=max_tokens,
-        temperature=temp)
-
-        # Save the raw output
-        print("RAW OPENAI RESPONSE")
-        print(response)
-
-        return response
-
-    def extract_generation_from_response(self,
-                                   response: Dict) -> str:
-        # Pull out the generated text from the response
-        message_content = response.choices[0].message.content
-
-        # Clean up the string
-        message_content = message_content.strip()
+        return super().generate(prompt, temperature=temp, max_tokens=max_tokens)
 
-        return message_content
+    async def agenerate(self,
+                        prompt: str,
+                        temp: float = 0.0,
+                        max_tokens: int = 1024) -> str:
+        return await super().agenerate(prompt, temperature=temp, max_tokens=max_tokens)
@@ -0,0 +1,389 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Dict, Iterator, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class LanguageModelBackend:
+    """
+    The connections and limits shared by every language model talking to the same backend (e.g. the OpenAI API or a
+    Mixtral server): a pooled HTTP client for each of the sync and asyncio APIs, a semaphore limiting the number of
+    requests in flight and the request and token usage metrics.
+    """
+
+    def __init__(self,
+                 name: str,
+                 timeout: float,
+                 max_concurrency: int):
+        """
+        :param name: The name of the backend.
+        :type name: str
+        :param timeout: The number of seconds to wait for a response.
+        :type timeout: float
+        :param max_concurrency: The maximum number of requests in flight to the backend.
+        :type max_concurrency: int
+        """
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        self.client = httpx.Client(timeout=timeout, limits=self.limits)
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        # asyncio clients and semaphores belong to the event loop they're used in
+        self.async_clients = weakref.WeakKeyDictionary()
+        self.async_semaphores = weakref.WeakKeyDictionary()
+
+        self.lock = threading.Lock()
+        self.metrics = {
+            "requests": 0,
+            "failures": 0,
+            "retries": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "latency": 0.0
+        }
+
+    def get_async_client(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if loop not in self.async_clients:
+                self.async_clients[loop] = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+                self.async_semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+            return self.async_clients[loop], self.async_semaphores[loop]
+
+    def record(self,
+               latency: float,
+               retries: int,
+               failed: bool,
+               usage: Optional[Dict]) -> None:
+        with self.lock:
+            self.metrics["requests"] += 1
+            self.metrics["retries"] += retries
+            self.metrics["latency"] += latency
+            if failed:
+                self.metrics["failures"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                self.metrics[key] += (usage or {}).get(key) or 0
+
+    def to_json(self) -> Dict:
+        with self.lock:
+            metrics = dict(self.metrics)
+        metrics["average_latency"] = metrics["latency"] / metrics["requests"] if metrics["requests"] else None
+        metrics["max_concurrency"] = self.max_concurrency
+        metrics["timeout"] = self.timeout
+        return metrics
+
+
+class LanguageModel:
+    """
+    A language model served over HTTP. Subclasses build the request for a prompt (build_request) and pull the generated
+    text out of the response (extract_generation_from_response), while this class sends it with a sync (generate) or
+    asyncio (agenerate) API, retrying timeouts, dropped connections, rate limits and server errors with exponential
+    backoff (or after the delay the server asks for, up to a maximum). Requests go through the pooled client and
+    concurrency limit of the model's backend (see LanguageModelBackend), which are configured from the SATYRN_LLM_*
+    environment variables. A request only counts towards the limit while it's in flight, not while it waits to be
+    retried.
+    """
+
+    # The status codes of responses worth retrying
+    RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+    _backends = {}
+    _backends_lock = threading.Lock()
+
+    def __init__(self,
+                 backend_name: str,
+                 timeout: float = None,
+                 max_retries: int = None,
+                 backoff: float = None,
+                 max_concurrency: int = None,
+                 max_retry_delay: float = None):
+        """
+        :param backend_name: The name of the backend the model is served by (models with the same backend share its connections and limits).
+        :type backend_name: str
+        :param timeout: The number of seconds to wait for a response.
+        :type timeout: float
+        :param max_retries: The number of times to retry a failed request.
+        :type max_retries: int
+        :param backoff: The number of seconds to wait before the first retry (doubling for each retry after).
+        :type backoff: float
+        :param max_concurrency: The maximum number of requests in flight to the backend.
+        :type max_concurrency: int
+        :param max_retry_delay: The most seconds to wait before a retry (even if the server asks for longer).
+        :type max_retry_delay: float
+        """
+        self.backend = self.get_backend(backend_name,
+                                        timeout if timeout is not None else float(os.environ.get("SATYRN_LLM_TIMEOUT", 120)),
+                                        max_concurrency if max_concurrency is not None else int(os.environ.get("SATYRN_LLM_MAX_CONCURRENCY", 8)))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("SATYRN_LLM_MAX_RETRIES", 3))
+        self.backoff = backoff if backoff is not None else float(os.environ.get("SATYRN_LLM_BACKOFF", 0.5))
+        self.max_retry_delay = max_retry_delay if max_retry_delay is not None else float(os.environ.get("SATYRN_LLM_MAX_RETRY_DELAY", 60))
+
+    @classmethod
+    def get_backend(cls,
+                    name: str,
+                    timeout: float,
+                    max_concurrency: int) -> LanguageModelBackend:
+        with cls._backends_lock:
+            if name not in cls._backends:
+                cls._backends[name] = LanguageModelBackend(name, timeout, max_concurrency)
+            return cls._backends[name]
+
+    @classmethod
+    def get_metrics(cls) -> Dict[str, Dict]:
+        """
+        Gets the request and token usage metrics of each backend.
+        :return: The metrics for each backend name.
+        :rtype: Dict[str, Dict]
+        """
+        with cls._backends_lock:
+            backends = list(cls._backends.values())
+        return {backend.name: backend.to_json() for backend in backends}
+
+    def build_request(self,
+                      prompt: str,
+                      **kwargs) -> Tuple[str, Dict, Dict]:
+        """
+        Builds the request to send the prompt to the model.
+        :param prompt: The prompt.
+        :type prompt: str
+        :return: The URL, the headers and the JSON body of the request.
+        :rtype: Tuple[str, Dict, Dict]
+        """
+        raise NotImplementedError
+
+    def extract_generation_from_response(self,
+                                         response: httpx.Response) -> str:
+        raise NotImplementedError
+
+    def get_usage(self,
+                  response: httpx.Response) -> Optional[Dict]:
+        # OpenAI compatible servers report the tokens used in the "usage" of the response
+        try:
+            return response.json().get("usage")
+        except (ValueError, AttributeError):
+            return None
+
+    def should_retry(self,
+                     response: httpx.Response) -> bool:
+        return response.status_code in self.RETRY_STATUS_CODES
+
+    def get_retry_delay(self,
+                        attempt: int,
+                        response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), self.max_retry_delay)
+            except ValueError:
+                pass
+        return min(self.backoff * 2 ** attempt * (1 + random.random() / 2), self.max_retry_delay)
+
+    def generate(self,
+                 prompt: str,
+                 **kwargs) -> str:
+        """
+        Sends the prompt to the model and waits for the generated text.
+        :param prompt: The prompt.
+        :type prompt: str
+        :return: The generated text.
+        :rtype: str
+        """
+        url, headers, body = self.build_request(prompt, **kwargs)
+        logger.debug("Prompt for %s: %s", self.backend.name, prompt)
+        start = time.time()
+        attempt = 0
+        response = None
+        while True:
+            try:
+                with self.backend.semaphore:
+                    response = self.backend.client.post(url, headers=headers, json=body)
+                if not self.should_retry(response) or attempt >= self.max_retries:
+                    break
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    self.backend.record(time.time() - start, attempt, True, None)
+                    raise
+                response = None
+            time.sleep(self.get_retry_delay(attempt, response))
+            attempt += 1
+        return self.finish(response, start, attempt)
+
+    async def agenerate(self,
+                        prompt: str,
+                        **kwargs) -> str:
+        """
+        Sends the prompt to the model and awaits the generated text (without blocking the event loop's thread).
+        :param prompt: The prompt.
+        :type prompt: str
+        :return: The generated text.
+        :rtype: str
+        """
+        url, headers, body = self.build_request(prompt, **kwargs)
+        logger.debug("Prompt for %s: %s", self.backend.name, prompt)
+        client, semaphore = self.backend.get_async_client()
+        start = time.time()
+        attempt = 0
+        response = None
+        while True:
+            try:
+                async with semaphore:
+                    response = await client.post(url, headers=headers, json=body)
+                if not self.should_retry(response) or attempt >= self.max_retries:
+                    break
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    self.backend.record(time.time() - start, attempt, True, None)
+                    raise
+                response = None
+            await asyncio.sleep(self.get_retry_delay(attempt, response))
+            attempt += 1
+        return self.finish(response, start, attempt)
+
+    def stream(self,
+               prompt: str,
+               **kwargs) -> Iterator[str]:
+        """
+        Sends the prompt to the model and yields the generated text as it arrives. Models that can't stream their
+        generations yield all of it at once.
+        :param prompt: The prompt.
+        :type prompt: str
+        :return: The pieces of the generated text.
+        :rtype: Iterator[str]
+        """
+        yield self.generate(prompt, **kwargs)
+
+    def finish(self,
+               response: httpx.Response,
+               start: float,
+               retries: int) -> str:
+        self.backend.record(time.time() - start, retries, response.is_error, self.get_usage(response) if response.is_success else None)
+        logger.debug("Response from %s (%s): %s", self.backend.name, response.status_code, response.text)
+        return self.extract_generation_from_response(response)
+
+
+class OpenAIChatModel(LanguageModel):
+    """
+    A chat model served by the OpenAI API (or a server compatible with it, see OPENAI_BASE_URL).
+    """
+
+    def __init__(self,
+                 model: str,
+                 temperature: float = 0.0,
+                 max_tokens: int = 1024,
+                 **kwargs):
+        """
+        :param model: The name of the model (e.g. "gpt-4").
+        :type model: str
+        :param temperature: The default sampling temperature.
+        :type temperature: float
+        :param max_tokens: The default maximum number of tokens to generate.
+        :type max_tokens: int
+        """
+        self.base_url = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+        super().__init__(f"openai:{self.base_url}", **kwargs)
+        self.openai_api_key = os.environ.get("OPENAI_API_KEY")
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def get_cache_parameters(self) -> Dict:
+        # The generation parameters that responses are cached by (along with the prompt)
+        return {"model": self.model, "temperature": self.temperature, "max_tokens": self.max_tokens}
+
+    def build_request(self,
+                      prompt: str,
+                      temperature: float = None,
+                      max_tokens: int = None) -> Tuple[str, Dict, Dict]:
+        return f"{self.base_url}/chat/completions", {"Authorization": f"Bearer {self.openai_api_key}"}, {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self.max_tokens if max_tokens is None else max_tokens,
+            "temperature": self.temperature if temperature is None else temperature
+        }
+
+    def extract_generation_from_response(self,
+                                         response: httpx.Response) -> str:
+        response.raise_for_status()
+
+        # Pull out the generated text from the response and clean up the string
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    def stream(self,
+               prompt: str,
+               temperature: float = None,
+               max_tokens: int = None) -> Iterator[str]:
+        url, headers, body = self.build_request(prompt, temperature=temperature, max_tokens=max_tokens)
+        body = dict(body, stream=True, stream_options={"include_usage": True})
+        logger.debug("Prompt for %s: %s", self.backend.name, prompt)
+        start = time.time()
+        attempt = 0
+        usage = None
+        failed = True
+        try:
+            # Only the request is retried, once the generation starts arriving it has to be read to the end (holding on
+            # to the backend's semaphore until then)
+            while True:
+                self.backend.semaphore.acquire()
+                try:
+                    response = self.backend.client.send(self.backend.client.build_request("POST", url, headers=headers, json=body), stream=True)
+                except BaseException as e:
+                    self.backend.semaphore.release()
+                    if not isinstance(e, httpx.TransportError) or attempt >= self.max_retries:
+                        raise
+                    response = None
+                else:
+                    if not self.should_retry(response) or attempt >= self.max_retries:
+                        break
+                    response.close()
+                    self.backend.semaphore.release()
+                time.sleep(self.get_retry_delay(attempt, response))
+                attempt += 1
+
+            try:
+                if response.is_error:
+                    response.read()
+                    response.raise_for_status()
+
+                # The generation arrives as server-sent events, each holding the next piece of the text
+                for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    usage = chunk.get("usage") or usage
+                    for choice in chunk.get("choices") or []:
+                        content = (choice.get("delta") or {}).get("content")
+                        if content:
+                            yield content
+                failed = False
+            finally:
+                response.close()
+                self.backend.semaphore.release()
+        finally:
+            self.backend.record(time.time() - start, attempt, failed, usage)
@@ -0,0 +1,246 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterator, Optional
+
+
+class LanguageModelCache:
+    """
+    A store of language model responses keyed by the model, its generation parameters and a hash of the prompt, kept in
+    a SQLite database so they survive restarts and are shared between workers. Responses older than the TTL are
+    generated again and the least recently used responses are dropped once there are more than max_entries.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self,
+                 path: str,
+                 max_entries: int = 10000,
+                 ttl: float = 604800.0):
+        """
+        :param path: The path of the SQLite database file.
+        :type path: str
+        :param max_entries: The maximum number of responses to keep.
+        :type max_entries: int
+        :param ttl: The number of seconds a response is reused for (a non-positive TTL means forever).
+        :type ttl: float
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                               "key TEXT PRIMARY KEY, "
+                               "model TEXT, "
+                               "response TEXT, "
+                               "created_at REAL, "
+                               "used_at REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+
+    @classmethod
+    def get_instance(cls) -> 'LanguageModelCache':
+        """
+        Gets the cache shared by the whole process, configured from the SATYRN_LLM_CACHE_* environment variables.
+        :return: The shared cache.
+        :rtype: LanguageModelCache
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    root_dir = os.environ.get("SATYRN_ROOT_DIR", os.getcwd())
+                    cls._instance = cls(os.environ.get("SATYRN_LLM_CACHE_PATH", os.path.join(root_dir, "llm_cache", "responses.sqlite")),
+                                        max_entries=int(os.environ.get("SATYRN_LLM_CACHE_MAX_ENTRIES", 10000)),
+                                        ttl=float(os.environ.get("SATYRN_LLM_CACHE_TTL", 604800)))
+        return cls._instance
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return os.environ.get("SATYRN_LLM_CACHE", "true").lower() not in ("false", "0", "no", "off")
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def get_key(model: str,
+                parameters: Dict,
+                prompt: str) -> str:
+        """
+        Hashes the model, its generation parameters and the prompt into the key of the response.
+        :param model: The name of the model.
+        :type model: str
+        :param parameters: The generation parameters (e.g. the temperature).
+        :type parameters: dict
+        :param prompt: The prompt.
+        :type prompt: str
+        :return: The key.
+        :rtype: str
+        """
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return hashlib.sha256(json.dumps([model, parameters, prompt_hash], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self,
+            key: str) -> Optional[str]:
+        """
+        Gets the stored response for the key.
+        :param key: The key of the response (see get_key).
+        :type key: str
+        :return: The response or None if it isn't stored or has expired.
+        :rtype: str
+        """
+        now = time.time()
+        with self.connect() as connection:
+            row = connection.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl > 0 and now - row[1] > self.ttl:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                with self.lock:
+                    self.expired += 1
+                row = None
+            if row is not None:
+                connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+
+        with self.lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row is not None else None
+
+    def put(self,
+            key: str,
+            model: str,
+            response: str) -> None:
+        """
+        Stores a response, dropping the least recently used responses if there are too many.
+        :param key: The key of the response (see get_key).
+        :type key: str
+        :param model: The name of the model.
+        :type model: str
+        :param response: The response.
+        :type response: str
+        :return: None
+        :rtype: None
+        """
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO responses (key, model, response, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                               (key, model, response, now, now))
+            count = connection.execute("SELECT count(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                evicted = connection.execute("DELETE FROM responses WHERE key IN "
+                                             "(SELECT key FROM responses ORDER BY used_at LIMIT ?)",
+                                             (count - self.max_entries,)).rowcount
+                with self.lock:
+                    self.evictions += evicted
+
+    def clear(self) -> None:
+        with self.connect() as connection:
+            connection.execute("DELETE FROM responses")
+
+    def to_json(self) -> Dict:
+        with self.connect() as connection:
+            entries = connection.execute("SELECT count(*) FROM responses").fetchone()[0]
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "expired": self.expired,
+                "evictions": self.evictions
+            }
+
+
+class CachedLanguageModel:
+    """
+    Wraps a language model interface (e.g. GPT4Interface) so the responses to prompts it has already been given (with
+    the same generation parameters) are read from a LanguageModelCache rather than generated again.
+    """
+
+    def __init__(self,
+                 language_model,
+                 cache: LanguageModelCache):
+        """
+        :param language_model: The language model interface, which provides generate(prompt) and get_cache_parameters().
+        :type language_model: object
+        :param cache: The store of the responses.
+        :type cache: LanguageModelCache
+        """
+        self.language_model = language_model
+        self.cache = cache
+        self.model = type(language_model).__name__
+
+    def generate(self,
+                 prompt: str,
+                 **kwargs) -> str:
+        parameters = dict(self.language_model.get_cache_parameters(), **kwargs)
+        key = self.cache.get_key(self.model, parameters, prompt)
+        response = self.cache.get(key)
+        if response is None:
+            response = self.language_model.generate(prompt, **kwargs)
+
+            # Failed requests come back empty and shouldn't be reused
+            if response:
+                self.cache.put(key, self.model, response)
+        return response
+
+    async def agenerate(self,
+                        prompt: str,
+                        **kwargs) -> str:
+        parameters = dict(self.language_model.get_cache_parameters(), **kwargs)
+        key = self.cache.get_key(self.model, parameters, prompt)
+        response = self.cache.get(key)
+        if response is None:
+            response = await self.language_model.agenerate(prompt, **kwargs)
+            if response:
+                self.cache.put(key, self.model, response)
+        return response
+
+    def stream(self,
+               prompt: str,
+               **kwargs) -> Iterator[str]:
+        parameters = dict(self.language_model.get_cache_parameters(), **kwargs)
+        key = self.cache.get_key(self.model, parameters, prompt)
+        response = self.cache.get(key)
+        if response is not None:
+            yield response
+            return
+
+        pieces = []
+        for piece in self.language_model.stream(prompt, **kwargs):
+            pieces.append(piece)
+            yield piece
+
+        # Stored the way generate() returns it
+        response = "".join(pieces).strip()
+        if response:
+            self.cache.put(key, self.model, response)
+
+    def __getattr__(self, name):
+        return getattr(self.language_model, name)
@@ -10,11 +10,13 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
 
 class Mistral7BInstruct:
     def __init__(self):
+        # torch and transformers are optional (see requirements-optional.txt) and slow to import
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.model = AutoModelForCausalLM.from_pretrained("mistralai/Mistral-7B-Instruct-v0.2")
         self.tokenizer = AutoTokenizer.from_pretrained("mistralai/Mistral-7B-Instruct-v0.2")
@@ -10,12 +10,16 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-import json
-import requests
+from typing import Dict, Tuple
 
-class Mixtral8x7BInterface:
+import httpx
+
+from core.LanguageGeneration.LanguageModel import LanguageModel
+
+class Mixtral8x7BInterface(LanguageModel):
     def __init__(self,
                  url: str):
+        super().__init__(f"mixtral:{url}")
 
         self.url = url
 
@@ -29,18 +33,18 @@ class Mixtral8x7BInterface:
             "seed": -1
         }
 
-    def generate(self,
-                 prompt: str) -> str:
-
-        self.data["prompt"] = f"[INST] {prompt}[/INST]"
+    def get_cache_parameters(self) -> Dict:
+        # The generation parameters that responses are cached by (along with the prompt)
+        return dict(self.data, url=self.url)
 
-        # Making the POST request
-        response = requests.post(self.url, headers=self.headers, data=json.dumps(self.data))
+    def build_request(self,
+                      prompt: str) -> Tuple[str, Dict, Dict]:
+        return self.url, self.headers, dict(self.data, prompt=f"[INST] {prompt}[/INST]")
 
+    def extract_generation_from_response(self,
+                                         response: httpx.Response) -> str:
         # Checking if the request was successful
         if response.status_code == 200:
-            # Printing the response content
-            result = response.json()["choices"][0]['text']
-            return result
+            return response.json()["choices"][0]['text']
         else:
-            return ""
\ No newline at end of file
+            return ""
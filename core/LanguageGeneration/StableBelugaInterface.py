@@ -10,14 +10,19 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-import requests
+from typing import Dict, Tuple
 
-class StableBelugaInterface:
+import httpx
+
+from core.LanguageGeneration.LanguageModel import LanguageModel
+
+class StableBelugaInterface(LanguageModel):
     def __init__(self):
         # Init access to OpenAI's API
         self.HOST = 'localhost:5000'
         # self.URI = f'http://{self.HOST}/api/v1/generate'
         self.URI = 'https://governments-ton-democratic-councils.trycloudflare.com/api/v1/generate'
+        super().__init__(f"stablebeluga:{self.URI}")
         self.request = {
             'max_new_tokens': 2048,
 
@@ -53,18 +58,20 @@ class StableBelugaInterface:
             'stopping_strings': []
         }
 
+    def get_cache_parameters(self) -> Dict:
+        # The generation parameters that responses are cached by (along with the prompt)
+        return dict(self.request, url=self.URI)
+
     def format_beluga_prompt(self, prompt):
         return f"""### System:\nThis is a system prompt, please behave and help the user.\n\n### User:\n{prompt}\n\n###Assistant:\n"""
 
-    def generate(self,
-                 prompt: str) -> str:
-        
-        formatted_prompt = self.format_beluga_prompt(prompt)
-        self.request['prompt'] = formatted_prompt
-
-        # Feed the prompt to the language model
-        response = requests.post(self.URI, json=self.request)
+    def build_request(self,
+                      prompt: str) -> Tuple[str, Dict, Dict]:
+        return self.URI, {}, dict(self.request, prompt=self.format_beluga_prompt(prompt))
 
+    def extract_generation_from_response(self,
+                                         response: httpx.Response) -> str:
         if response.status_code == 200:
-            result = response.json()['results'][0]['text']
-            return result
+            return response.json()['results'][0]['text']
+        else:
+            return ""
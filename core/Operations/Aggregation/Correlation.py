@@ -14,6 +14,7 @@ from typing import List, Any
 
 from sqlalchemy import func
 
+from core.Dialects.Dialect import Dialect
 from core.Operations.ArgType import ArgType
 from core.Operations.SQLAInterface import SQLAInterface
 from core.Operations.PandasInterface import  PandasInterface
@@ -21,6 +22,9 @@ from core.Operations.OperationArgument import OperationArgument
 from core.Operations.AggregationOperation import AggregationOperation
 
 class Correlation(AggregationOperation, SQLAInterface, PandasInterface):
+    sql_capabilities = [Dialect.CORRELATION]
+    vectorized = True
+
     def __init__(self):
         name = 'correlation'
         input_args = [
@@ -36,8 +40,8 @@ class Correlation(AggregationOperation, SQLAInterface, PandasInterface):
     def sqlalchemy_op(self,
                       operation_input: List[Any],
                       db_type: str) -> None:
-        if db_type == 'postgres':
-            return func.corr(*operation_input)
-        else:
-            raise TypeError(f"{db_type} does not support this operation.")
+        return func.corr(*operation_input)
 
+    def pandas_op(self,
+                  operation_input: List[Any]) -> Any:
+        return operation_input[0].astype(float).corr(operation_input[1].astype(float))
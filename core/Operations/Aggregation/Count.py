@@ -21,6 +21,8 @@ from core.Operations.OperationArgument import OperationArgument
 from core.Operations.AggregationOperation import AggregationOperation
 
 class Count(AggregationOperation, SQLAInterface, PandasInterface):
+    vectorized = True
+
     def __init__(self):
         name = 'count'
         input_args = [
@@ -38,3 +40,6 @@ class Count(AggregationOperation, SQLAInterface, PandasInterface):
                       db_type: str) -> None:
         return func.count(operation_input[0])
 
+    def pandas_op(self,
+                  operation_input: List[Any]) -> Any:
+        return operation_input[0].count()
@@ -21,6 +21,8 @@ from core.Operations.OperationArgument import OperationArgument
 from core.Operations.AggregationOperation import AggregationOperation
 
 class CountUnique(AggregationOperation, SQLAInterface, PandasInterface):
+    vectorized = True
+
     def __init__(self):
         name = 'count_unique'
         input_args = [
@@ -38,3 +40,6 @@ class CountUnique(AggregationOperation, SQLAInterface, PandasInterface):
                       db_type: str) -> None:
         return func.count(distinct(operation_input[0]))
 
+    def pandas_op(self,
+                  operation_input: List[Any]) -> Any:
+        return operation_input[0].nunique()
@@ -13,6 +13,7 @@ If not, see <https://www.gnu.org/licenses/>.
 from typing import List, Any
 
 from core.api.sql_func import sql_median
+from core.Dialects.Dialect import Dialect
 
 from core.Operations.ArgType import ArgType
 from core.Operations.SQLAInterface import SQLAInterface
@@ -21,6 +22,9 @@ from core.Operations.OperationArgument import OperationArgument
 from core.Operations.AggregationOperation import AggregationOperation
 
 class Median(AggregationOperation, SQLAInterface, PandasInterface):
+    sql_capabilities = [Dialect.MEDIAN]
+    vectorized = True
+
     def __init__(self):
         name = 'median'
         input_args = [
@@ -38,3 +42,8 @@ class Median(AggregationOperation, SQLAInterface, PandasInterface):
                       db_type: str) -> None:
         return sql_median(operation_input[0], db_type)
 
+    def pandas_op(self,
+                  operation_input: List[Any]) -> Any:
+        # The lower middle value, like percentile_disc(0.5)
+        values = operation_input[0].dropna().sort_values()
+        return values.iloc[(len(values) - 1) // 2] if len(values) else None
@@ -20,6 +20,8 @@ from core.Operations.OperationArgument import OperationArgument
 from core.Operations.AggregationOperation import AggregationOperation
 
 class Min(AggregationOperation, SQLAInterface, PandasInterface):
+    vectorized = True
+
     def __init__(self):
         name = 'min'
         input_args = [
@@ -37,3 +39,6 @@ class Min(AggregationOperation, SQLAInterface, PandasInterface):
                       db_type: str) -> None:
         return func.min(operation_input[0])
 
+    def pandas_op(self,
+                  operation_input: List[Any]) -> Any:
+        return operation_input[0].min()
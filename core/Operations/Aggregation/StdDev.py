@@ -10,9 +10,11 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-from sqlalchemy import func
 from typing import List, Any
 
+from core.api.sql_func import get_dialect
+from core.Dialects.Dialect import Dialect
+
 from core.Operations.ArgType import ArgType
 from core.Operations.SQLAInterface import SQLAInterface
 from core.Operations.PandasInterface import  PandasInterface
@@ -20,6 +22,9 @@ from core.Operations.OperationArgument import OperationArgument
 from core.Operations.AggregationOperation import AggregationOperation
 
 class StdDev(AggregationOperation, SQLAInterface, PandasInterface):
+    sql_capabilities = [Dialect.STDDEV]
+    vectorized = True
+
     def __init__(self):
         name = 'stddev'
         input_args = [
@@ -35,8 +40,8 @@ class StdDev(AggregationOperation, SQLAInterface, PandasInterface):
     def sqlalchemy_op(self,
                       operation_input: List[Any],
                       db_type: str) -> None:
-        if db_type == 'sqlite':
-            return func.stdev(operation_input[0])
-        else:
-            return func.stddev(operation_input[0])
+        return get_dialect(db_type).stddev(operation_input[0])
 
+    def pandas_op(self,
+                  operation_input: List[Any]) -> Any:
+        return operation_input[0].astype(float).std()
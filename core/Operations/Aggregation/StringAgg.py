@@ -12,7 +12,7 @@ If not, see <https://www.gnu.org/licenses/>.
 
 from typing import List, Any
 
-from sqlalchemy import func, String, cast
+from core.api.sql_func import get_dialect
 
 from core.Operations.ArgType import ArgType
 from core.Operations.SQLAInterface import SQLAInterface
@@ -21,6 +21,8 @@ from core.Operations.OperationArgument import OperationArgument
 from core.Operations.AggregationOperation import AggregationOperation
 
 class StringAgg(AggregationOperation, SQLAInterface, PandasInterface):
+    vectorized = True
+
     def __init__(self):
         name = 'string_agg'
         input_args = [
@@ -36,8 +38,9 @@ class StringAgg(AggregationOperation, SQLAInterface, PandasInterface):
     def sqlalchemy_op(self,
                       operation_input: List[Any],
                       db_type: str) -> None:
-        if db_type == 'sqlite':
-            return func.group_concat(cast(operation_input[0], String), ', ')
-        else:
-            return func.string_agg(cast(operation_input[0], String), ', ')
+        return get_dialect(db_type).string_agg(operation_input[0], ', ')
 
+    def pandas_op(self,
+                  operation_input: List[Any]) -> Any:
+        values = operation_input[0].dropna().astype(str)
+        return ', '.join(values) if len(values) else None
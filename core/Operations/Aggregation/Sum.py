@@ -20,6 +20,8 @@ from core.Operations.OperationArgument import OperationArgument
 from core.Operations.AggregationOperation import AggregationOperation
 
 class Sum(AggregationOperation, SQLAInterface, PandasInterface):
+    vectorized = True
+
     def __init__(self):
         name = 'sum'
         input_args = [
@@ -37,3 +39,6 @@ class Sum(AggregationOperation, SQLAInterface, PandasInterface):
                       db_type: str) -> None:
         return func.sum(operation_input[0])
 
+    def pandas_op(self,
+                  operation_input: List[Any]) -> Any:
+        return operation_input[0].sum(min_count=1)
@@ -16,6 +16,13 @@ from typing import List
 from core.Operations.OperationArgument import OperationArgument
 
 class Operation(ABC):
+    # The databases sqlalchemy_op can build SQL for (None for any database)
+    sql_dialects = None
+    # The capabilities (see Dialect) the database needs to run sqlalchemy_op
+    sql_capabilities = []
+    # Whether pandas_op is implemented, so the operation can be run in memory when it can't be run in the database
+    vectorized = False
+
     def __init__(self,
                  name: str,
                  input_args: List[OperationArgument],
@@ -23,3 +30,14 @@ class Operation(ABC):
         self.name = name
         self.input_args = input_args
         self.output_args = output_args
+
+    def supports_sql(self,
+                     dialect: 'Dialect') -> bool:
+        """
+        Whether the operation can be pushed down to (i.e. run in) the ring's database.
+        :param dialect: The dialect of the ring's database.
+        :type dialect: Dialect
+        :return: Whether the operation can be run in the database.
+        :rtype: bool
+        """
+        return (self.sql_dialects is None or dialect.name in self.sql_dialects) and all(map(dialect.supports, self.sql_capabilities))
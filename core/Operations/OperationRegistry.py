@@ -0,0 +1,97 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import sys
+import importlib
+import threading
+from importlib.metadata import entry_points
+from typing import List, Type
+
+from core.Operations.Operation import Operation
+
+
+class OperationRegistry:
+    """
+    Custom (plugin) operations to add to the operation ontology alongside the built-in ones.
+    Operation classes register themselves with the register decorator when their module is imported. Modules are
+    imported from the "satyrn.operations" entry points of the installed packages and from the comma-separated module
+    paths in SATYRN_OPERATION_MODULES.
+    """
+
+    ENTRY_POINT_GROUP = "satyrn.operations"
+
+    _operation_classes = []
+    _plugins_loaded = False
+    _lock = threading.Lock()
+
+    @classmethod
+    def register(cls,
+                 operation_class: Type[Operation]) -> Type[Operation]:
+        """
+        Registers an operation class (use as a class decorator).
+        :param operation_class: The operation class, which must be constructible without arguments.
+        :type operation_class: Type[Operation]
+        :return: The operation class.
+        :rtype: Type[Operation]
+        """
+        if not issubclass(operation_class, Operation):
+            raise ValueError(f"{operation_class.__name__} is not an Operation")
+        if operation_class not in cls._operation_classes:
+            cls._operation_classes.append(operation_class)
+        return operation_class
+
+    @classmethod
+    def load_plugins(cls) -> None:
+        """
+        Imports the plugin modules (only the first time this is called).
+        :return: None
+        :rtype: None
+        """
+        with cls._lock:
+            if cls._plugins_loaded:
+                return
+            for entry_point in cls.get_entry_points():
+                # The entry point can name a module or the operation class itself
+                loaded = entry_point.load()
+                if isinstance(loaded, type) and issubclass(loaded, Operation):
+                    cls.register(loaded)
+            for module_path in os.environ.get("SATYRN_OPERATION_MODULES", "").split(","):
+                if module_path.strip():
+                    importlib.import_module(module_path.strip())
+            cls._plugins_loaded = True
+
+    @classmethod
+    def get_entry_points(cls) -> list:
+        """
+        Gets the entry points of the installed packages in the operation plugin group.
+        :return: The entry points.
+        :rtype: list
+        """
+        if sys.version_info >= (3, 10):
+            return list(entry_points(group=cls.ENTRY_POINT_GROUP))
+        # Before 3.10 the entry points can't be selected by group and come grouped in a dict instead
+        return list(entry_points().get(cls.ENTRY_POINT_GROUP, []))
+
+    @classmethod
+    def get_operation_classes(cls) -> List[Type[Operation]]:
+        """
+        Gets the registered operation classes, loading the plugins first.
+        :return: The operation classes in the order they were registered.
+        :rtype: List[Type[Operation]]
+        """
+        cls.load_plugins()
+        return list(cls._operation_classes)
+
+
+# Shorthand for decorating plugin operation classes
+register_operation = OperationRegistry.register
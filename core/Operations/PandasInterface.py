@@ -19,4 +19,5 @@ class PandasInterface(ABC):
 
     def pandas_op(self,
                   operation_input: List[Any]):
+        # Takes a pandas Series per argument (the rows of one group for aggregations)
         pass
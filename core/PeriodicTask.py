@@ -0,0 +1,127 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import logging
+import threading
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """
+    An exclusive lock on a file, shared by every process using the same path. It's let go of when the process holding it
+    exits, even if it never gets to release it.
+    """
+
+    def __init__(self,
+                 path: str):
+        """
+        :param path: The path of the lock file (created if it doesn't exist).
+        :type path: str
+        """
+        self.path = path
+        self.file = None
+
+    def __enter__(self) -> 'FileLock':
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.file = open(self.path, "a+")
+        if fcntl:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    # Gives up after 10 seconds, so keep trying until the lock is free
+                    self.file.seek(0)
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if fcntl:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+        self.file = None
+
+
+class PeriodicTask:
+    """
+    Runs a function every so many seconds on a background (daemon) thread. Given a lock file, processes sharing it (e.g.
+    the workers of a server) take turns running the task, so the task can check whether another one has just done the
+    work before doing it again.
+    """
+
+    def __init__(self,
+                 name: str,
+                 interval: float,
+                 task: Callable[[], None],
+                 run_immediately: bool = False,
+                 lock_path: str = None):
+        """
+        :param name: The name of the thread running the task.
+        :type name: str
+        :param interval: The number of seconds to wait between runs.
+        :type interval: float
+        :param task: The function to run.
+        :type task: Callable
+        :param run_immediately: Whether to run the task as soon as the thread starts rather than after the first interval.
+        :type run_immediately: bool
+        :param lock_path: The file to lock while running the task (the task isn't coordinated with other processes if not given).
+        :type lock_path: str
+        """
+        self.name = name
+        self.interval = interval
+        self.task = task
+        self.run_immediately = run_immediately
+        self.lock_path = lock_path
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def run(self) -> None:
+        if self.run_immediately:
+            self.run_task()
+        while not self.stopped.wait(self.interval):
+            self.run_task()
+
+    def run_task(self) -> None:
+        try:
+            if self.lock_path:
+                with FileLock(self.lock_path):
+                    self.task()
+            else:
+                self.task()
+        except Exception:
+            # Keep the schedule going, the next run may well succeed
+            logger.exception("Periodic task '%s' failed", self.name)
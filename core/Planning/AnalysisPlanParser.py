@@ -11,17 +11,30 @@ If not, see <https://www.gnu.org/licenses/>.
 '''
 
 
-import re
-import shlex
-import networkx as nx
-from ast import literal_eval
-from typing import Dict, List
+from typing import Dict, List, Mapping, Tuple
+from core.Analysis.PlanGraph import PlanGraph
 from core.Analysis.OperationOntology import OperationOntology
 from core.Analysis.AnalysisPlan import AnalysisPlan
 from core.Analysis.AnalysisStep import AnalysisStep
 from core.Analysis.AnalysisSubplan import AnalysisSubplan
 
-from core.api import utils
+
+class SQRSyntaxError(ValueError):
+    """
+    Raised when an SQR plan can't be parsed, pointing at the step (and the position in it) where parsing failed.
+    """
+
+    def __init__(self,
+                 message: str,
+                 step_ref: str = None,
+                 position: int = None):
+        self.step_ref = step_ref
+        self.position = position
+        location = ""
+        if step_ref is not None:
+            location = f" in step {step_ref}" + (f" at position {position}" if position is not None else "")
+        super().__init__(f"SQR syntax error{location}: {message}")
+
 
 class AnalysisPlanParser:
     def __init__(self,
@@ -49,8 +62,9 @@ class AnalysisPlanParser:
         :return: The given steps as an AnalysisPlan object
         :rtype: AnalysisPlan
         """
-        plan_graph = self.create_plan_graph(plan_steps)
-        subplans = self.determine_subplans(plan_steps, plan_graph)
+        parents = self.get_step_parents(plan_steps)
+        plan_graph = self.create_plan_graph(plan_steps, parents)
+        subplans = self.determine_subplans(plan_steps, plan_graph, parents)
         return AnalysisPlan(plan_steps, plan_graph, subplans)
 
     def parse_plan_snippet(self,
@@ -63,51 +77,142 @@ class AnalysisPlanParser:
         :rtype: AnalysisPlan
         """
         plan_steps = self.create_analysis_steps(raw_analysis_plan)
-        plan_graph = self.create_plan_graph(plan_steps)
+        plan_graph = self.create_plan_graph(plan_steps, self.get_step_parents(plan_steps))
         return AnalysisPlan(plan_steps, plan_graph, {})
 
     def create_analysis_steps(self,
                               raw_analysis_plan: Dict[str, str]) -> Dict[str, AnalysisStep]:
-
-        def get_literal_arg(arg):
-            try:
-                return literal_eval(arg)
-            except:
-                return arg
-
-        # Map the step index to a list of ops/args for that step
-        d = {}
-        for k, v in raw_analysis_plan.items():
-            l = shlex.split(re.sub(r'[()]', '', v))     # Note: The shlex.split preserves subtrings surrounded by quotes
-            d[k] = {
-                "op": l[0],
-                # "args": [get_literal_arg(arg) for arg in l[1:]] NOTE: Added this at some point to fix a bug, but was itself causing a bug (in case the original bug comes up again - in which case, the shlex.quote function might be able to help solve both issues).
-                "args": l[1:]
-            }
+        if not isinstance(raw_analysis_plan, Mapping) or not raw_analysis_plan:
+            raise SQRSyntaxError("the plan must be a non-empty object mapping step references to steps")
 
         # Create each of the AnalysisStep objects
-        plan_steps = {step_ref: AnalysisStep(step_ref, op_dict['op'], op_dict['args']) for step_ref, op_dict in d.items()}
+        plan_steps = {}
+        for step_ref, raw_step in raw_analysis_plan.items():
+            operation, args = self.tokenize_step(step_ref, raw_step)
+            plan_steps[step_ref] = AnalysisStep(step_ref, operation, args)
 
         return plan_steps
 
+    def tokenize_step(self,
+                      step_ref: str,
+                      raw_step: str) -> Tuple[str, List[str]]:
+        """
+        Splits an SQR step (e.g. "(exact |2| 'New York')") into its operation and arguments in a single pass, exactly
+        like the shlex.split (in POSIX mode) of the step with its parentheses removed that it replaces:
+        - parentheses are dropped everywhere, even in quotes or after a backslash (some plan templates rely on this);
+        - arguments can be quoted with single quotes (taken as they are) or with double quotes (in which a backslash
+          only escapes a double quote or a backslash);
+        - outside of quotes a backslash escapes the next character;
+        - quotes are removed from the arguments and adjacent quoted and unquoted text is joined into a single argument.
+        :param step_ref: The reference of the step (used in error messages).
+        :type step_ref: str
+        :param raw_step: The text of the step.
+        :type raw_step: str
+        :return: The operation and the list of arguments.
+        :rtype: Tuple[str, List[str]]
+        """
+        if type(raw_step) != str:
+            raise SQRSyntaxError(f"expected a string but got {type(raw_step).__name__}", step_ref)
+
+        # The position of each character that's left in the step (for the error messages)
+        positions = [idx for idx, char in enumerate(raw_step) if char != '(' and char != ')']
+        text = ''.join(raw_step[idx] for idx in positions)
+
+        tokens = []
+        token = []
+        in_token = False
+        idx = 0
+        length = len(text)
+        while idx < length:
+            char = text[idx]
+            if char in ' \t\r\n':
+                if in_token:
+                    tokens.append(''.join(token))
+                    token = []
+                    in_token = False
+            elif char == "'" or char == '"':
+                end = idx + 1
+                while end < length and text[end] != char:
+                    if char == '"' and text[end] == '\\' and end + 1 < length:
+                        if text[end + 1] not in '"\\':
+                            token.append(text[end])
+                        end += 1
+                    token.append(text[end])
+                    end += 1
+                if end >= length:
+                    raise SQRSyntaxError(f"unterminated {char} quote", step_ref, positions[idx])
+                in_token = True
+                idx = end
+            elif char == '\\':
+                if idx + 1 >= length:
+                    raise SQRSyntaxError("dangling escape character", step_ref, positions[idx])
+                idx += 1
+                token.append(text[idx])
+                in_token = True
+            else:
+                token.append(char)
+                in_token = True
+            idx += 1
+
+        if in_token:
+            tokens.append(''.join(token))
+        if not tokens:
+            raise SQRSyntaxError("empty step", step_ref)
+
+        return tokens[0], tokens[1:]
+
+    def get_step_parents(self,
+                         plan_steps: Dict[str, AnalysisStep]) -> Dict[str, List[str]]:
+        """
+        Gets the references of the steps each step depends on, checking that every reference points to a step of the plan.
+        :param plan_steps: A dictionary mapping step refs to AnalysisStep objects.
+        :type plan_steps: dict[str, AnalysisStep]
+        :return: The parent step refs for each step ref.
+        :rtype: Dict[str, List[str]]
+        """
+        parents = {}
+        for step_ref, step in plan_steps.items():
+            # Only the first arg of a "retrieve_attribute" step is a reference (the second is the attribute name)
+            args = step.args[:1] if step.operation == 'retrieve_attribute' else step.args
+            step_parents = []
+            for arg in args:
+                if arg in plan_steps:
+                    step_parents.append(arg)
+                elif self.is_reference(arg):
+                    raise SQRSyntaxError(f"reference to unknown step {arg}", step_ref)
+            parents[step_ref] = step_parents
+        return parents
+
+    def is_reference(self,
+                     arg: str) -> bool:
+        return type(arg) == str and len(arg) > 2 and arg[0] == '|' and arg[-1] == '|'
+
     def create_plan_graph(self,
-                          steps: Dict[str, AnalysisStep]) -> nx.DiGraph:
+                          steps: Dict[str, AnalysisStep],
+                          parents: Dict[str, List[str]] = None) -> PlanGraph:
+        if parents is None:
+            parents = self.get_step_parents(steps)
+
         # Init the graph
-        G = nx.DiGraph()
+        G = PlanGraph()
 
         # Add each step to the graph
         for step_ref, step in steps.items():
-            G.add_node(step_ref, data=step)
+            G.add_node(step_ref)
 
         # Add the links between each of the steps in the graph
-        for step_ref, step in steps.items():
-            for parent in self.get_parents(step, steps):
-                G.add_edge(parent.ref, step_ref)  # Edge from the parent to the child (i.e. the current step)
+        for step_ref, parent_refs in parents.items():
+            for parent_ref in parent_refs:
+                G.add_edge(parent_ref, step_ref)  # Edge from the parent to the child (i.e. the current step)
+
+        cycle = G.find_cycle()
+        if cycle:
+            raise SQRSyntaxError(f"steps {' -> '.join(cycle + cycle[:1])} reference each other in a cycle", cycle[0])
 
         return G
 
     def get_leaves(self,
-                   plan_graph: nx.DiGraph) -> List[str]:
+                   plan_graph: PlanGraph) -> List[str]:
         """
         Get the leaf nodes of the plan graph.
         :param plan_graph:
@@ -115,15 +220,19 @@ class AnalysisPlanParser:
         :return: A list of step references (e.g. ['|7|']).
         :rtype: list of str
         """
-        return [node for node in plan_graph.nodes if plan_graph.out_degree(node) == 0]
+        return plan_graph.get_leaves()
 
     def determine_subplans(self,
                            plan_steps: Dict[str, AnalysisStep],
-                           plan_graph: nx.DiGraph) -> Dict[str, AnalysisSubplan]:
+                           plan_graph: PlanGraph,
+                           parents: Dict[str, List[str]] = None) -> Dict[str, AnalysisSubplan]:
+        if parents is None:
+            parents = self.get_step_parents(plan_steps)
 
-        leaf_ref = self.get_leaves(plan_graph)[0]
-        leaf = plan_steps[leaf_ref]
-        subplan_dict, _ = self.split_on_returns(leaf, plan_steps, {})
+        # The plan graph has no cycles, so there's always a leaf
+        leaf_refs = self.get_leaves(plan_graph)
+        leaf = plan_steps[leaf_refs[0]]
+        subplan_dict, _ = self.split_on_returns(leaf, plan_steps, {}, parents=parents)
 
         # Remove duplicate subplans
         deduped_subplan_dict = {}
@@ -138,22 +247,25 @@ class AnalysisPlanParser:
                          start_node: AnalysisStep,
                          all_steps: dict,
                          subplan_steps: dict,
-                         alias_idx: int = 0) -> dict:
+                         alias_idx: int = 0,
+                         parents: Dict[str, List[str]] = None) -> dict:
         if not self.operation_ontology.is_return_operation(start_node.operation):
-            raise Exception("Error: plan does not end with return operation!")
+            raise SQRSyntaxError(f"the plan does not end with a return operation (it ends with '{start_node.operation}')", start_node.ref)
+        if parents is None:
+            parents = self.get_step_parents(all_steps)
         new_plan_dict = {start_node.ref: start_node}
 
-        stack = self.get_parents(start_node, all_steps)
-        explored = [start_node.ref]
+        stack = [all_steps[parent_ref] for parent_ref in parents[start_node.ref]]
+        explored = {start_node.ref}
         while stack:
             node = stack.pop()
             if node.ref not in explored:
                 if self.operation_ontology.is_return_operation(node.operation):
-                    subplan_steps, alias_idx = self.split_on_returns(node, all_steps, subplan_steps, alias_idx)
+                    subplan_steps, alias_idx = self.split_on_returns(node, all_steps, subplan_steps, alias_idx, parents)
                 else:
                     new_plan_dict[node.ref] = node
-                    stack.extend(self.get_parents(node, all_steps))
-            explored.append(node.ref)
+                    stack.extend(all_steps[parent_ref] for parent_ref in parents[node.ref])
+            explored.add(node.ref)
         subplan_steps[f'alias_{alias_idx}'] = new_plan_dict
         return subplan_steps, alias_idx + 1
 
@@ -161,11 +273,11 @@ class AnalysisPlanParser:
                     step: AnalysisStep,
                     all_steps: Dict[str, AnalysisStep]) -> List[AnalysisStep]:
 
-        # Get the references in this step's arguments
-        parent_references = filter(lambda idx_and_arg: utils.is_arg_reference(idx_and_arg[1]) and (step.operation != 'retrieve_attribute' or idx_and_arg[0] == 0), enumerate(step.args))
+        # Get the references in this step's arguments (only the first arg of a "retrieve_attribute" step is a reference)
+        args = step.args[:1] if step.operation == 'retrieve_attribute' else step.args
 
         # Retrieve those steps
-        return [all_steps[idx_and_ref[1]] for idx_and_ref in parent_references]
+        return [all_steps[arg] for arg in args if arg in all_steps]
 
     def is_arg_alias(self,
                      arg: str) -> bool:
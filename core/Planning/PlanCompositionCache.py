@@ -0,0 +1,205 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Tuple
+
+from core.Analysis.AnalysisPlan import AnalysisPlan
+from core.Analysis.AnalysisSubplan import AnalysisSubplan
+
+
+class ComposedPlan:
+    """
+    One of the composed plans of a report, in which the values of the bind parameters (see
+    PlanCompositionCache.bind_parameter) are left to be filled in for each request.
+    """
+
+    def __init__(self,
+                 plan_name: str,
+                 plan: AnalysisPlan,
+                 slot_fillers: Dict[str, Any],
+                 slots_to_ref: Dict):
+        """
+        :param plan_name: The name of the base plan template the plan was composed from.
+        :type plan_name: str
+        :param plan: The composed plan.
+        :type plan: AnalysisPlan
+        :param slot_fillers: The slot fillers the plan was composed with.
+        :type slot_fillers: Dict[str, Any]
+        :param slots_to_ref: Maps the slots of the base plan to the step refs of the access plans that filled them.
+        :type slots_to_ref: Dict
+        """
+        self.plan_name = plan_name
+        self.plan = plan
+        self.slot_fillers = slot_fillers
+        self.slots_to_ref = slots_to_ref
+
+        # The steps with a bind parameter in their args, which are the only ones rebuilt when binding
+        self.bound_refs = [step_ref for step_ref, step in plan.plan_steps.items()
+                           if any(PlanCompositionCache.has_bind_parameter(arg) for arg in step.args)]
+
+    def bind(self,
+             bindings: Mapping[str, Any]) -> Tuple[AnalysisPlan, Dict[str, Any]]:
+        """
+        Fills the values of the bind parameters into a new copy of the plan (sharing the steps and plan graph that don't
+        depend on them) and into the slot fillers.
+        :param bindings: Maps the bind parameters to their values.
+        :type bindings: Mapping[str, Any]
+        :return: The plan and the slot fillers.
+        :rtype: Tuple[AnalysisPlan, Dict[str, Any]]
+        """
+        plan_steps = dict(self.plan.plan_steps)
+        for step_ref in self.bound_refs:
+            step = plan_steps[step_ref]
+            plan_steps[step_ref] = step.replace(args=[self.bind_value(arg, bindings) for arg in step.args])
+
+        subplans = self.plan.subplans
+        if self.bound_refs:
+            subplans = {alias: AnalysisSubplan({step_ref: plan_steps[step_ref] for step_ref in subplan.steps})
+                        for alias, subplan in subplans.items()}
+
+        slot_fillers = {slot: self.bind_value(filler, bindings) for slot, filler in self.slot_fillers.items()}
+        return AnalysisPlan(plan_steps, self.plan.plan_graph, subplans), slot_fillers
+
+    def bind_value(self,
+                   value: Any,
+                   bindings: Mapping[str, Any]) -> Any:
+        if not PlanCompositionCache.has_bind_parameter(value):
+            return value
+        if value in bindings:
+            return bindings[value]
+        for parameter, bound_value in bindings.items():
+            value = value.replace(parameter, str(bound_value))
+        return value
+
+
+class ComposedReport:
+    """
+    The composed plans of a report (i.e. of a blueprint with a given set of parameters).
+    """
+
+    def __init__(self,
+                 base_plan_templates: Mapping,
+                 plans: List[ComposedPlan]):
+        """
+        :param base_plan_templates: The base plan templates the plans were composed from.
+        :type base_plan_templates: Mapping
+        :param plans: The composed plans in the order of the report's composition specs.
+        :type plans: List[ComposedPlan]
+        """
+        self.base_plan_templates = base_plan_templates
+        self.plans = plans
+
+    def bind(self,
+             bindings: Mapping[str, Any]) -> List[Dict]:
+        """
+        Fills the values of the bind parameters into each of the composed plans.
+        :param bindings: Maps the bind parameters to their values.
+        :type bindings: Mapping[str, Any]
+        :return: The plan name, plan, slot fillers and slots_to_ref of each composed plan.
+        :rtype: List[Dict]
+        """
+        bound_plans = []
+        for composed_plan in self.plans:
+            plan, slot_fillers = composed_plan.bind(bindings)
+            bound_plans.append({
+                "plan_name": composed_plan.plan_name,
+                "plan": plan,
+                "slot_fillers": slot_fillers,
+                "slots_to_ref": composed_plan.slots_to_ref
+            })
+        return bound_plans
+
+
+class PlanCompositionCache:
+    """
+    Keeps the composed plans of the most recently requested reports of a ring, keyed by the parameters of the blueprint.
+    The values specific to the entity instance the report is about are given to the blueprint as bind parameters
+    rather than as values, so the plans are composed once for all instances and only the steps using those values are
+    rebuilt for each request.
+    """
+
+    BIND_PREFIX = "__satyrn_bind_"
+
+    def __init__(self,
+                 max_size: int = 256):
+        """
+        :param max_size: The maximum number of reports to keep the composed plans of.
+        :type max_size: int
+        """
+        self.max_size = max_size
+        self.reports = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def bind_parameter(cls,
+                       name: str) -> str:
+        """
+        Gets the bind parameter which stands in for a value in the composed plans.
+        :param name: The name of the parameter (e.g. "entity_instance_identifier_value").
+        :type name: str
+        :return: The bind parameter.
+        :rtype: str
+        """
+        return f"{cls.BIND_PREFIX}{name}__"
+
+    @classmethod
+    def has_bind_parameter(cls,
+                           value: Any) -> bool:
+        return isinstance(value, str) and cls.BIND_PREFIX in value
+
+    @staticmethod
+    def is_bindable(value: Any) -> bool:
+        """
+        Checks if a value can be bound into the composed plans. Values with quotes or backslashes are parsed differently
+        when they are quoted in an SQR step, so the plans using them are composed with the values themselves.
+        :param value: The value.
+        :type value: Any
+        :return: True if the value can be bound.
+        :rtype: bool
+        """
+        return isinstance(value, str) and not any(char in value for char in '"\\')
+
+    def get(self,
+            key: Hashable,
+            base_plan_templates: Mapping,
+            compose: Callable[[], ComposedReport]) -> ComposedReport:
+        """
+        Gets the composed plans of a report, composing them if they aren't kept (or were composed from base plan
+        templates that have since been reloaded).
+        :param key: The parameters of the blueprint (other than the bind parameters).
+        :type key: Hashable
+        :param base_plan_templates: The current base plan templates.
+        :type base_plan_templates: Mapping
+        :param compose: Composes the plans of the report using the bind parameters.
+        :type compose: Callable[[], ComposedReport]
+        :return: The composed plans of the report.
+        :rtype: ComposedReport
+        """
+        with self.lock:
+            composed_report = self.reports.get(key)
+            if composed_report is not None and composed_report.base_plan_templates is base_plan_templates:
+                self.reports.move_to_end(key)
+                return composed_report
+
+        composed_report = compose()
+        with self.lock:
+            self.reports[key] = composed_report
+            self.reports.move_to_end(key)
+            while len(self.reports) > self.max_size:
+                self.reports.popitem(last=False)
+        return composed_report
+
+    def clear(self) -> None:
+        with self.lock:
+            self.reports = OrderedDict()
@@ -0,0 +1,105 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import re
+import threading
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Mapping, Optional, Tuple
+
+from core.Analysis.AnalysisStep import AnalysisStep
+
+
+class PlanTemplate:
+    """
+    A plan template (e.g. the plan_template of a base plan template or the access plan of an attribute) compiled into
+    its (immutable) steps and a table of where each of its slots appears, so it can be filled in without copying or
+    searching the steps that don't contain a slot.
+    """
+
+    SLOT_PATTERN = re.compile('({([^}]+)})')
+
+    _compiled = {}
+    _lock = threading.Lock()
+
+    def __init__(self,
+                 steps: Mapping[str, AnalysisStep]):
+        """
+        :param steps: The steps of the plan template.
+        :type steps: Mapping[str, AnalysisStep]
+        """
+        self.steps = MappingProxyType(dict(steps))
+
+        # Maps each slot (e.g. "Entity:0") to the (step_ref, arg_idx) locations it appears in (arg_idx -1 is the operation)
+        slot_locations = {}
+        for step_ref, step in self.steps.items():
+            if self.SLOT_PATTERN.search(step.operation):
+                slot_locations.setdefault(step.operation.strip("{}"), []).append((step_ref, -1))
+            for arg_idx, step_arg in enumerate(step.args):
+                if self.SLOT_PATTERN.search(str(step_arg)):
+                    slot_locations.setdefault(str(step_arg).strip("{}"), []).append((step_ref, arg_idx))
+        self.slot_locations = {slot: tuple(locations) for slot, locations in slot_locations.items()}
+
+    @classmethod
+    def get(cls,
+            raw_plan: Mapping[str, str],
+            plan_parser) -> 'PlanTemplate':
+        """
+        Gets the compiled plan template, parsing and compiling it the first time.
+        :param raw_plan: The plan template mapping step refs to SQR operations.
+        :type raw_plan: Mapping[str, str]
+        :param plan_parser: The parser used to create the steps of the template.
+        :type plan_parser: AnalysisPlanParser
+        :return: The compiled plan template.
+        :rtype: PlanTemplate
+        """
+        key = tuple(raw_plan.items())
+        compiled = cls._compiled.get(key)
+        if compiled is None:
+            compiled = cls(plan_parser.create_analysis_steps(raw_plan))
+            with cls._lock:
+                compiled = cls._compiled.setdefault(key, compiled)
+        return compiled
+
+    def fill(self,
+             slot_fillers: Mapping[str, str]) -> Optional[Dict[str, AnalysisStep]]:
+        """
+        Fills in the slots of the template with the given fillers. The steps without a slot are shared with the template.
+        :param slot_fillers: Maps the slots (e.g. "Entity:0") to what they should be filled in with.
+        :type slot_fillers: Mapping[str, str]
+        :return: The filled in plan steps or None if none of the slots of the template were filled.
+        :rtype: Dict[str, AnalysisStep]
+        """
+        filled_steps = None
+        for slot, filler in slot_fillers.items():
+            if slot in self.slot_locations:
+                if filled_steps is None:
+                    filled_steps = dict(self.steps)
+                for step_ref, arg_idx in self.slot_locations[slot]:
+                    if arg_idx == -1:
+                        # The filler is meant to replace the operation, not one of the step arguments
+                        filled_steps[step_ref] = filled_steps[step_ref].replace(operation=filler)
+                    else:
+                        step_args = list(filled_steps[step_ref].args)
+                        step_args[arg_idx] = filler
+                        filled_steps[step_ref] = filled_steps[step_ref].replace(args=step_args)
+        return filled_steps
+
+    @staticmethod
+    def plan_key(plan: Mapping[str, AnalysisStep]) -> FrozenSet[Tuple[str, AnalysisStep]]:
+        """
+        Gets a hashable key for the plan steps which is equal for plans whose steps are equal.
+        :param plan: The plan steps.
+        :type plan: Mapping[str, AnalysisStep]
+        :return: The key.
+        :rtype: FrozenSet
+        """
+        return frozenset(plan.items())
@@ -12,7 +12,6 @@ If not, see <https://www.gnu.org/licenses/>.
 
 from typing import Dict, List
 
-import networkx as nx
 
 from core.RingObjects.Ring import Ring
 from core.api.utils import is_arg_reference
@@ -351,7 +350,7 @@ class QuestionGenerator:
         """
 
         # Get all the ancestor nodes for this step in the plan
-        ancestor_node_refs = nx.ancestors(plan.plan_graph, step_ref)
+        ancestor_node_refs = plan.plan_graph.ancestors(step_ref)
 
         step_refs = []
         for ancestor_ref in ancestor_node_refs:
@@ -492,7 +491,7 @@ class QuestionGenerator:
         :return: Boolean denoted whether or not this is a filter step.
         :rtype: bool
         """
-        child_step_refs = dict(nx.bfs_successors(plan.plan_graph, source=step_ref))
+        child_step_refs = dict(plan.plan_graph.bfs_successors(step_ref))
         return self.operation_ontology.is_boolean_operation(plan.plan_steps[step_ref].operation) and \
                any([self.operation_ontology.is_return_operation(plan.plan_steps[ref].operation) for ref in child_step_refs])
 
@@ -508,7 +507,7 @@ class QuestionGenerator:
         :return: Boolean denoted whether or not this is a boolean step.
         :rtype: bool
         """
-        child_step_refs = dict(nx.bfs_successors(plan.plan_graph, source=step_ref))
+        child_step_refs = dict(plan.plan_graph.bfs_successors(step_ref))
         return self.operation_ontology.is_boolean_operation(plan.plan_steps[step_ref].operation) and \
                any([self.operation_ontology.is_collect_operation(plan.plan_steps[ref].operation) for ref in child_step_refs])
 
@@ -12,7 +12,6 @@ If not, see <https://www.gnu.org/licenses/>.
 
 import re
 from typing import List, Dict, Tuple
-from copy import deepcopy
 from collections import defaultdict
 
 from core.RingObjects.Ring import Ring
@@ -63,7 +62,8 @@ class SQRComposer:
         """
         all_slots_to_ref = defaultdict(list, {})
 
-        final_plan = deepcopy(base_plan)
+        # The steps are immutable, so the plans being composed share them rather than copying them
+        final_plan = dict(base_plan)
         for access_plan_input_ref, access_plan in access_plans.items():
             # Identify the slots in the base plan which depend on an access plan
             base_plan_slots = self.get_base_plan_slots(final_plan, access_plan_input_ref)
@@ -106,7 +106,7 @@ class SQRComposer:
         """
         # Make sure there is a filter to compose with the access plan
         if not access_plan_filter:
-            return deepcopy(access_plan)
+            return dict(access_plan)
 
         # Get the letter reference for the access plan
         access_plan_ref_id = self.get_next_ref_letter()
@@ -115,12 +115,13 @@ class SQRComposer:
         access_plan_filter = self.append_to_plan_refs(access_plan_filter, access_plan_ref_id)
 
         # Produce a new dictionary with the steps all added together
-        combined_plan = deepcopy(access_plan)
+        combined_plan = dict(access_plan)
         combined_plan.update(access_plan_filter)
 
         # Add the reference to the final filter step to the access plan's return step
         return_step_ref = [step_ref for step_ref, step in access_plan.items() if step.operation == 'return'][0]
-        combined_plan[return_step_ref].args.append(list(access_plan_filter.keys())[-1])
+        return_step = combined_plan[return_step_ref]
+        combined_plan[return_step_ref] = return_step.replace(args=return_step.args + (list(access_plan_filter.keys())[-1],))
 
         return combined_plan
 
@@ -203,13 +204,13 @@ class SQRComposer:
                 # NOTE: This assumes that these steps are ALWAYS "retrieve_attribute" steps
                 if base_plan[base_plan_ref].args[1] == base_plan_slot:
                     # Replace the first arg with the reference to the final "return" step of the access plan
-                    base_plan[base_plan_ref].args[0] = access_plan_return_step_ref
-
-                    # Replace the second arg with the proper attribute reference from the access plan
-                    base_plan[base_plan_ref].args[1] = base_plan_slots_to_access_plan_refs[base_plan_slot][0]  # Get the first possible value to fill this slot in with...
+                    # and the second arg with the proper attribute reference from the access plan
+                    base_plan[base_plan_ref] = base_plan[base_plan_ref].replace(args=[access_plan_return_step_ref,
+                                                                                      base_plan_slots_to_access_plan_refs[base_plan_slot][0]]  # Get the first possible value to fill this slot in with...
+                                                                                     + list(base_plan[base_plan_ref].args[2:]))
 
         # Combine the access and base plan info into a single structure
-        combined_plan = deepcopy(base_plan)
+        combined_plan = dict(base_plan)
         combined_plan.update(access_plan)
 
         # Compose the base_plan_step_info and access_plan_step_info lists into a single SQR plan
@@ -346,16 +347,9 @@ class SQRComposer:
         # Get the mapping from the original step references to the updated step references
         ref_map = {original_ref: original_ref[0:-1] + ref_addition + original_ref[-1] for original_ref in plan.keys()}
 
-        # Make a copy of the plan and update the step references
-        updated_plan = {ref_map[step_ref]: deepcopy(step) for step_ref, step in plan.items()}
-        for step_ref, step in updated_plan.items():
-            step.ref = step_ref
-
-        # Update the references made in the arguments of each step of the plan
-        for step_ref, step in updated_plan.items():
-            # Update any references in args for the original plan
-            for idx, arg in enumerate(step.args):
-                if is_arg_reference(arg):
-                    step.args[idx] = ref_map[arg]
+        # Make a copy of the plan with the step references updated, including any references in the args of each step
+        updated_plan = {ref_map[step_ref]: step.replace(ref=ref_map[step_ref],
+                                                        args=[ref_map[arg] if is_arg_reference(arg) else arg for arg in step.args])
+                        for step_ref, step in plan.items()}
 
         return updated_plan
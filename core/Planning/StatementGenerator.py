@@ -192,6 +192,8 @@ class StatementGenerator:
         :return: The factual statements
         :rtype: List of str
         """
+        self.step_expressor.prefetch_reference_values([plan])
+
         if self.mode == GenerationMode.OneStatementPerPlan:
             return self.fill_result_one_statement_per_plan(plan, result_template)
         elif self.mode == GenerationMode.OneStatementPerRow:
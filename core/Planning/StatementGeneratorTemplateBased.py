@@ -10,16 +10,15 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-import copy
 import os
-import json
-import re
 from enum import Enum
-from typing import Dict, List
+from typing import Dict, List, Mapping
 
 from core.api import utils
+from core.ConfigRegistry import ConfigRegistry
 from core.RingObjects.Ring import Ring
-from core.Planning.utils import capitalize_first_only, oxfordcomma
+from core.Planning.utils import capitalize_first_only
+from core.Planning.StatementTemplate import StatementTemplate, TemplateSlot
 from core.Analysis.AnalysisPlan import AnalysisPlan
 from core.Planning.StepExpressor import StepExpressor
 from core.Analysis.OperationOntology import OperationOntology
@@ -44,12 +43,19 @@ class StatementGeneratorTemplateBased:
         self.mode = mode
         self.step_expressor = StepExpressor(self.ring, self.operation_ontology)
         self.question_generator = QuestionGenerator(self.ring, self.operation_ontology)
-        self.plan_parser = AnalysisPlanParser(self.operation_ontology)
+        self.base_plan_templates = self.load_base_plan_templates()
+
+    @classmethod
+    def load_base_plan_templates(cls) -> Mapping:
+        """
+        Gets the base plan templates (shared by every statement generator through the config registry).
+        :return: The base plan templates by name.
+        :rtype: Mapping
+        """
         current_directory = os.path.dirname(__file__)
         relative_path = os.path.join('..','Document','Blueprints','base_plan_templates.json')
         p = os.path.normpath(os.path.join(current_directory, relative_path))
-        with open(p, 'r') as f:
-            self.base_plan_templates = json.load(f)
+        return ConfigRegistry.get(p)
 
     def generate_statement(self,
                            base_plan_template_name: str,
@@ -59,73 +65,39 @@ class StatementGeneratorTemplateBased:
                            metric_name_filler: str,
                            analysis_plan: AnalysisPlan,
                            filter_steps_for_postfix: Dict[str, AnalysisPlan]) -> str:
-        # Get the template for the plan
-        base_plan_template = self.base_plan_templates[base_plan_template_name]['statement_template']
-        factual_statement = copy.deepcopy(base_plan_template)
+        # Get the references for the identifiers in the results in one go
+        self.step_expressor.prefetch_reference_values([analysis_plan])
 
-        slots_to_fill = re.findall(r'{(?<={)[a-zA-Z]+:\d+}', base_plan_template)
-        for slot in slots_to_fill:
+        # Get the (compiled) template for the plan
+        template = StatementTemplate.get(self.base_plan_templates[base_plan_template_name]['statement_template'])
 
-            if "{Reference" in slot:
-                reference_number = re.findall(r'\d+', slot)
-                expressed_step = self.step_expressor.express_step("|" + str(reference_number[0]) + "|", analysis_plan)
-                factual_statement = factual_statement.replace(slot, str(expressed_step))
+        # Fill in the slots that don't depend on the results
+        fillers = {}
+        for slot in template.slots:
+            if slot.name.startswith("Reference"):
+                expressed_step = self.step_expressor.express_step("|" + str(slot.number) + "|", analysis_plan)
+                fillers[slot.key] = str(expressed_step)
 
-            elif "{Metric" in slot:
+            elif slot.name.startswith("Metric"):
                 # metric_ref = slots_to_ref[slot]
                 # express_ref = self.step_expressor.express_step(metric_ref[0], analysis_plan)
                 # factual_statement = factual_statement.replace(slot, str(express_ref))
-                factual_statement = factual_statement.replace(slot, metric_name_filler)
-
-            elif 'Result' not in slot and 'Unit' not in slot:
-                slot_key = re.findall(r'(?<={)[a-zA-Z]+:\d+', slot)[0]
-                factual_statement = factual_statement.replace(slot, str(slot_fillers[slot_key]))
+                fillers[slot.key] = metric_name_filler
 
-        # Fill in result and unit slots
-        result_slots_to_fill = [slot for slot in slots_to_fill if 'Result' in slot or 'Unit' in slot]
+            elif not slot.is_result:
+                fillers[slot.key] = str(slot_fillers[slot.key])
 
-        # More than one result (fill in the slots in the <repeat> tags, comma separate the values)
+        # More than one result (fill in the slots in the <repeat> tags for each row, comma separate the rows)
         if result['length'] > 1:
-
-            # Get the string between the <repeat> tags
-            statement_segment_to_repeat = re.findall(r'<repeat>(.+?)</repeat>', factual_statement)[0]
-
-            # For each row of results
-            all_statement_segments = []
-            for result_value_list in result['results']:
-
-                # Make a copy of the string between the <repeat> tags
-                statement_segment = copy.deepcopy(statement_segment_to_repeat)
-
-                # Fill in the slots for the current copy
-                for slot in result_slots_to_fill:
-                    slot_number = int(slot.strip("{}").partition(':')[2])
-                    if "Result" in slot:
-                        filler = self.get_result_filler(slot_number, result_value_list, result['fieldNames'], analysis_plan)
-                        statement_segment = statement_segment.replace(slot, filler)
-
-                    elif "Unit" in slot:
-                        filler = self.get_unit_filler(slot_number, result_value_list, result['fieldNames'], analysis_plan, result['units']['results'])
-                        statement_segment = statement_segment.replace(slot, filler)
-
-                # Save this segment
-                all_statement_segments.append(statement_segment)
-
-            # Replace the original string (including <repeat> tags) in the factual statement with the collection of statements
-            factual_statement = factual_statement.replace("<repeat>" + statement_segment_to_repeat + "</repeat>", oxfordcomma(all_statement_segments))
+            if not template.repeats:
+                raise ValueError(f"The statement template of {base_plan_template_name} has no <repeat> tags for its {result['length']} results")
+            rows = [self.get_result_row_fillers(template.repeated_slots, result_value_list, result, analysis_plan) for result_value_list in result['results']]
+            factual_statement = template.render(fillers, rows)
 
         else:
             # Only one result
-            result_value_list = result['results'][0]
-            for slot in result_slots_to_fill:
-                slot_number = int(slot.strip("{}").partition(':')[2])
-                if "Result" in slot:
-                    filler = self.get_result_filler(slot_number, result_value_list, result['fieldNames'], analysis_plan)
-                    factual_statement = factual_statement.replace(slot, filler)
-
-                elif "Unit" in slot:
-                    filler = self.get_unit_filler(slot_number, result_value_list, result['fieldNames'], analysis_plan, result['units']['results'])
-                    factual_statement = factual_statement.replace(slot, filler)
+            fillers.update(self.get_result_row_fillers(template.slots, result['results'][0], result, analysis_plan))
+            factual_statement = template.render(fillers)
 
         ## Add filters to the factual statements
         # return_step = list(analysis_plan.plan_steps.keys())[-1]
@@ -152,6 +124,32 @@ class StatementGeneratorTemplateBased:
 
         return factual_statement
 
+    def get_result_row_fillers(self,
+                               slots: List[TemplateSlot],
+                               result_value_list: List,
+                               result: Dict,
+                               analysis_plan: AnalysisPlan) -> Dict[str, str]:
+        """
+        Gets the fillers of the result and unit slots for a row of the results.
+        :param slots: The slots of the template (any that aren't result or unit slots are skipped).
+        :type slots: List[TemplateSlot]
+        :param result_value_list: The row of results.
+        :type result_value_list: List
+        :param result: The result dictionary produced by executing the plan.
+        :type result: Dict
+        :param analysis_plan: The executed plan.
+        :type analysis_plan: AnalysisPlan
+        :return: The filler for each of the slots (by its key).
+        :rtype: Dict[str, str]
+        """
+        row_fillers = {}
+        for slot in slots:
+            if "Result" in slot.name:
+                row_fillers[slot.key] = self.get_result_filler(slot.number, result_value_list, result['fieldNames'], analysis_plan)
+            elif "Unit" in slot.name:
+                row_fillers[slot.key] = self.get_unit_filler(slot.number, result_value_list, result['fieldNames'], analysis_plan, result['units']['results'])
+        return row_fillers
+
     def get_result_filler(self,
                           slot_number: int,
                           result: List,
@@ -0,0 +1,151 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import re
+import threading
+from typing import Dict, List, Optional, Union
+
+from core.Planning.utils import oxfordcomma
+
+
+class TemplateSlot:
+    """
+    A slot in a statement template (e.g. "{Result:0}").
+    """
+
+    def __init__(self,
+                 name: str,
+                 number: int):
+        self.name = name
+        self.number = number
+        self.key = f"{name}:{number}"
+        self.text = f"{{{self.key}}}"
+
+    @property
+    def is_result(self) -> bool:
+        # Result and unit slots are filled in from the result rows of the plan
+        return 'Result' in self.name or 'Unit' in self.name
+
+
+class TemplateRepeat:
+    """
+    A part of a statement template (between <repeat> tags) that's repeated for each result row.
+    """
+
+    def __init__(self,
+                 text: str,
+                 nodes: List[Union[str, TemplateSlot]]):
+        self.text = text
+        self.nodes = nodes
+
+
+class StatementTemplate:
+    """
+    A statement template (the statement_template of a base plan template) compiled into its literal text, slots and
+    repeated parts, so a statement is rendered in a single pass over them.
+    """
+
+    SLOT_PATTERN = re.compile(r'\{([a-zA-Z]+):(\d+)\}')
+    REPEAT_PATTERN = re.compile(r'<repeat>(.+?)</repeat>')
+
+    _compiled = {}
+    _lock = threading.Lock()
+
+    def __init__(self,
+                 template: str):
+        """
+        :param template: The statement template.
+        :type template: str
+        """
+        self.template = template
+        self.nodes = []
+        position = 0
+        for match in self.REPEAT_PATTERN.finditer(template):
+            self.nodes.extend(self.compile_slots(template[position:match.start()]))
+            self.nodes.append(TemplateRepeat(match.group(1), self.compile_slots(match.group(1))))
+            position = match.end()
+        self.nodes.extend(self.compile_slots(template[position:]))
+
+        # Only the first repeated part (and any others with the same text) is repeated for the result rows
+        self.repeats = [node for node in self.nodes if isinstance(node, TemplateRepeat)]
+        self.repeated_text = self.repeats[0].text if self.repeats else None
+
+        # The (distinct) slots in the order they first appear in the template and in its repeated part
+        self.slots = list({slot.key: slot for slot in self.iterate_slots(self.nodes)}.values())
+        self.repeated_slots = list({slot.key: slot for slot in self.iterate_slots(self.repeats[:1])}.values())
+
+    @classmethod
+    def get(cls,
+            template: str) -> 'StatementTemplate':
+        """
+        Gets the compiled template, compiling it the first time.
+        :param template: The statement template.
+        :type template: str
+        :return: The compiled template.
+        :rtype: StatementTemplate
+        """
+        compiled = cls._compiled.get(template)
+        if compiled is None:
+            with cls._lock:
+                compiled = cls._compiled.setdefault(template, cls(template))
+        return compiled
+
+    def compile_slots(self,
+                      text: str) -> List[Union[str, TemplateSlot]]:
+        nodes = []
+        position = 0
+        for match in self.SLOT_PATTERN.finditer(text):
+            if match.start() > position:
+                nodes.append(text[position:match.start()])
+            nodes.append(TemplateSlot(match.group(1), int(match.group(2))))
+            position = match.end()
+        if position < len(text):
+            nodes.append(text[position:])
+        return nodes
+
+    @staticmethod
+    def iterate_slots(nodes: List):
+        for node in nodes:
+            if isinstance(node, TemplateSlot):
+                yield node
+            elif isinstance(node, TemplateRepeat):
+                yield from StatementTemplate.iterate_slots(node.nodes)
+
+    def render(self,
+               fillers: Dict[str, str],
+               rows: Optional[List[Dict[str, str]]] = None) -> str:
+        """
+        Fills in the template. Slots without a filler are left as they are.
+        :param fillers: The filler for each slot (by its key, e.g. "Metric:0").
+        :type fillers: Dict[str, str]
+        :param rows: The fillers of the result slots for each result row, for which the repeated part is repeated (and
+        joined into a list). Without rows (or for any other repeated parts) the repeated parts are filled in once,
+        keeping their <repeat> tags.
+        :type rows: List[Dict[str, str]]
+        :return: The statement.
+        :rtype: str
+        """
+        parts = []
+        for node in self.nodes:
+            if isinstance(node, TemplateRepeat):
+                if rows is None or node.text != self.repeated_text:
+                    parts.append(f"<repeat>{self.render_nodes(node.nodes, fillers)}</repeat>")
+                else:
+                    parts.append(oxfordcomma([self.render_nodes(node.nodes, {**fillers, **row}) for row in rows]))
+            else:
+                parts.append(self.render_nodes([node], fillers))
+        return "".join(parts)
+
+    @staticmethod
+    def render_nodes(nodes: List[Union[str, TemplateSlot]],
+                     fillers: Dict[str, str]) -> str:
+        return "".join(node if isinstance(node, str) else fillers.get(node.key, node.text) for node in nodes)
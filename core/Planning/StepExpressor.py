@@ -10,13 +10,12 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-import networkx as nx
-import re
+from collections import defaultdict
+from typing import List
 
 from core.RingObjects.Ring import Ring
-from core.api.utils import is_arg_reference, contains_date_denomination
+from core.api.utils import is_arg_reference, contains_date_denomination, entity_from_subquery_name
 from core.Planning.utils import oxfordcomma
-from core.Analysis.AnalysisEngine import AnalysisEngine
 from core.Analysis.AnalysisPlan import AnalysisPlan
 from core.Analysis.OperationOntology import OperationOntology
 from core.Operations.ArgType import ArgType
@@ -159,7 +158,7 @@ class StepExpressor:
         :rtype: bool
         """
         # Get all the ancestor nodes for this step in the plan
-        ancestor_node_refs = nx.ancestors(plan.plan_graph, step_ref)
+        ancestor_node_refs = plan.plan_graph.ancestors(step_ref)
 
         # Check if any of the ancestor nodes are a groupby
         for ancestor_ref in ancestor_node_refs:
@@ -282,33 +281,34 @@ class StepExpressor:
                              identifier: str,
                              value: str,
                              reference_template: str) -> str:
-        # Init the analysis engine
-        analysis_engine = AnalysisEngine(self.ring)
+        return self.ring.reference_resolver.get_reference(entity, identifier, value, reference_template)
 
-        reference_attributes = re.findall(r'\{(\w+)\}', reference_template)
-
-        reference_attribute_steps = {f'|r{i+1}|': f'(retrieve_attribute |1| {attribute})' for i, attribute in enumerate(reference_attributes)}
-
-        raw_analysis_plan = {
-            '|1|': f'(retrieve_entity {entity})',
-            '|2|': f'(retrieve_attribute |1| \'{identifier}\')',
-            '|3|': f'(exact |2| \'{value}\')',
-            '|4|': f'(collect {" ".join(reference_attribute_steps.keys())})',
-            '|5|': f'(return |4| |3|)'
-        }
-
-        raw_analysis_plan.update(reference_attribute_steps)
-
-        # Parse the analysis plan
-        analysis_plan = analysis_engine.plan_parser.parse(raw_analysis_plan)
-
-        # Run the analysis
-        results = analysis_engine.sqr_single_ring_analysis(analysis_plan, self.ring, self.ring.db.session())
-
-        if results['length'] > 1:
-            raise ValueError('Error: Expected only one result for refrerece retrieval.')
-
-        return reference_template.format(**{attribute_name: result for attribute_name, result in zip(reference_attributes, results['results'][0])})
+    def prefetch_reference_values(self,
+                                  plans: List[AnalysisPlan]) -> None:
+        """
+        Fetches the references for all of the identifier values in the results of the plans up front, so expressing the
+        results takes one query per entity rather than one per result row.
+        :param plans: The executed analysis plans.
+        :type plans: List[AnalysisPlan]
+        :return: None
+        :rtype: None
+        """
+        values_to_reference = defaultdict(list)
+        for plan in plans:
+            # The result is only set on plans that have been executed
+            result = getattr(plan, 'result', None)
+            if not result:
+                continue
+            for idx, field_name in enumerate(result['fieldNames']):
+                field_dict = entity_from_subquery_name(field_name, list(plan.subplans.keys()))
+                if not field_dict:
+                    continue
+                entity = self.ring.get_entity_by_name(field_dict['entity'])
+                if entity.reference and ArgType.Identifier in entity.attributes[field_dict['field']].type:
+                    values_to_reference[(field_dict['entity'], field_dict['field'], entity.reference)].extend(str(row[idx]) for row in result['results'])
+
+        for (entity_name, identifier, reference_template), values in values_to_reference.items():
+            self.ring.reference_resolver.prefetch(entity_name, identifier, values, reference_template)
 
     def express_sort_step(self,
                           step_ref: str,
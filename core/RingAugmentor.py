@@ -17,6 +17,7 @@ from core.Operations.ArgType import ArgType
 from core.Operations.Operation import Operation
 from core.RingObjects.RingEntity import RingEntity
 from core.RingObjects.RingAttribute import RingAttribute
+from core.RingObjects.DerivedAttribute import DerivedAttribute
 from core.Analysis.OperationOntology import OperationOntology
 
 class RingAugmentor():
@@ -26,8 +27,14 @@ class RingAugmentor():
         self.ring = ring
         self.operation_ontology = operation_ontology
 
+        # The ring can restrict which derived attributes get generated and cap how many each entity gets
+        self.allowed_derived_attributes = ring.derived_attributes.get('allow')
+        self.max_derived_attributes_per_entity = ring.derived_attributes.get('maxPerEntity')
+
     def generate_derived_attributes(self) -> None:
         """
+        Registers the derived attributes of each entity. Only their descriptions are created here, the RingAttribute
+        objects (and their access plans) are built when the attributes are first looked up.
         Note: Updates the Ring in-place.
         :return:
         :rtype:
@@ -35,6 +42,7 @@ class RingAugmentor():
 
         # Generate derived attributes for each of the entities
         for ent in self.ring.entities:
+            ent.attributes.factory = self.build_derived_attribute
             self.generate_metric_aggregations_over_related_entities(ent)
             self.generate_counts_over_related_entities(ent)
             self.generate_durations_for_entity(ent)
@@ -76,7 +84,7 @@ class RingAugmentor():
         return None
 
     def get_count_operations(self) -> List[Operation]:
-        operations_to_get = {"count_unique"}
+        operations_to_get = ["count_unique"]
         return [self.operation_ontology.analysis_operations[op] for op in operations_to_get if op in self.operation_ontology.analysis_operations]
 
     def generate_counts_over_related_entities(self,
@@ -96,26 +104,21 @@ class RingAugmentor():
 
         for related_ent in related_entities:
             # Get the set of attributes that can be counted on the related entity (arithmetic attributes of the related entity)
-            countable_attributes = [attr for attr_name, attr in related_ent.attributes.items() if ArgType.Identifier in attr.type]
+            countable_attributes = self.get_attribute_names_with_type(related_ent, ArgType.Identifier)
 
             # Get the set of attributes that can be grouped by on the target entity (the identifier of the target entity)
-            groupby_attributes = [attr for attr_name, attr in target_entity.attributes.items() if ArgType.Identifier in attr.type]
+            groupby_attributes = self.get_attribute_names_with_type(target_entity, ArgType.Identifier)
 
-            # For each combination, create a new RingAttribute
+            # For each combination, register a new derived attribute
             for countable_attr in countable_attributes:
                 for groupby_attr in groupby_attributes:
                     for count_op in count_operations:
-                        # Create the derived attribute
-                        new_attribute = self.create_aggregation_attribute(countable_attr, groupby_attr, count_op, target_entity, related_ent)
-
-                        # Add this derived attribute to the appropriate ring entity
-                        target_entity.attributes[new_attribute.name] = new_attribute
-                        target_entity.attribute_name.append(new_attribute.name)
+                        self.add_derived_attribute(countable_attr, groupby_attr, count_op, target_entity, related_ent)
 
         return None
 
     def get_metric_aggregation_operations(self) -> List[Operation]:
-        operations_to_get = {"average", "max", "min", "median", "sum", "std_dev"}
+        operations_to_get = ["average", "max", "min", "median", "sum", "std_dev"]
         return [self.operation_ontology.analysis_operations[op] for op in operations_to_get if op in self.operation_ontology.analysis_operations]
 
     def generate_metric_aggregations_over_related_entities(self,
@@ -135,24 +138,81 @@ class RingAugmentor():
 
         for related_ent in related_entities:
             # Get the set of attributes that can be aggregated on the related entity (arithmetic attributes of the related entity)
-            aggregation_attributes = [attr for attr_name, attr in related_ent.attributes.items() if ArgType.Arithmetic in attr.type]
+            aggregation_attributes = self.get_attribute_names_with_type(related_ent, ArgType.Arithmetic)
 
             # Get the set of attributes that can be grouped by on the target entity (the identifier of the target entity)
-            groupby_attributes = [attr for attr_name, attr in target_entity.attributes.items() if ArgType.Identifier in attr.type]
+            groupby_attributes = self.get_attribute_names_with_type(target_entity, ArgType.Identifier)
 
-            # For each combination, create a new RingAttribute
+            # For each combination, register a new derived attribute
             for agg_attr in aggregation_attributes:
                 for groupby_attr in groupby_attributes:
                     for agg_op in metric_aggregation_operations:
-                        # Create the derived attribute
-                        new_attribute = self.create_aggregation_attribute(agg_attr, groupby_attr, agg_op, target_entity, related_ent)
+                        self.add_derived_attribute(agg_attr, groupby_attr, agg_op, target_entity, related_ent)
 
-                        # Add this derived attribute to the appropriate ring entity
-                        target_entity.attributes[new_attribute.name] = new_attribute
-                        target_entity.attribute_name.append(new_attribute.name)
+        return None
 
+    def get_attribute_names_with_type(self,
+                                      entity: RingEntity,
+                                      attr_type: ArgType) -> List[str]:
+        # Checks the types without building the derived attributes
+        return [attr_name for attr_name in entity.attributes if attr_type in entity.attributes.get_attribute_type(attr_name)]
+
+    def add_derived_attribute(self,
+                              agg_attr_name: str,
+                              groupby_attr_name: str,
+                              agg_op: Operation,
+                              target_ent: RingEntity,
+                              related_ent: RingEntity) -> None:
+        """
+        Registers the derived attribute found by aggregating the agg_attr of the related entity for each value of the
+        groupby_attr of the target entity, unless the ring doesn't allow it or the target entity has reached its cap.
+        :param agg_attr_name: The name of the attribute to be aggregated.
+        :type agg_attr_name: str
+        :param groupby_attr_name: The name of the attribute to be grouped by.
+        :type groupby_attr_name: str
+        :param agg_op: The operation to perform on the agg_attr.
+        :type agg_op: Operation
+        :param target_ent: The ring entity which has the grouby_attr.
+        :type target_ent: RingEntity
+        :param related_ent: The ring entity which has the agg_attr.
+        :type related_ent: RingEntity
+        :return: None
+        :rtype: None
+        """
+        name = f"{agg_op.name}_{related_ent.name}_{agg_attr_name}"
+        if self.allowed_derived_attributes is not None and name not in self.allowed_derived_attributes:
+            return None
+
+        derived_attributes = target_ent.attributes.derived_attributes
+        if self.max_derived_attributes_per_entity is not None and name not in derived_attributes and len(derived_attributes) >= self.max_derived_attributes_per_entity:
+            return None
+
+        target_ent.attributes.add_derived_attribute(DerivedAttribute(name,
+                                                                     agg_op.output_args[0].arg_types,
+                                                                     agg_op.name,
+                                                                     target_ent.name,
+                                                                     groupby_attr_name,
+                                                                     related_ent.name,
+                                                                     agg_attr_name))
         return None
 
+    def build_derived_attribute(self,
+                                derived_attribute: DerivedAttribute) -> RingAttribute:
+        """
+        Builds the RingAttribute object for a derived attribute when it's first looked up.
+        :param derived_attribute: The description of the derived attribute.
+        :type derived_attribute: DerivedAttribute
+        :return: The fully specified RingAttribute.
+        :rtype: RingAttribute
+        """
+        target_ent = self.ring.get_entity_by_name(derived_attribute.entity_name)
+        related_ent = self.ring.get_entity_by_name(derived_attribute.related_entity_name)
+        return self.create_aggregation_attribute(related_ent.attributes[derived_attribute.attribute],
+                                                 target_ent.attributes[derived_attribute.groupby_attribute],
+                                                 self.operation_ontology.analysis_operations[derived_attribute.operation],
+                                                 target_ent,
+                                                 related_ent)
+
     def create_aggregation_attribute(self,
                                      agg_attr: RingAttribute,
                                      groupby_attr: RingAttribute,
@@ -11,7 +11,6 @@ If not, see <https://www.gnu.org/licenses/>.
 '''
 
 import os
-import json
 import datetime
 from typing import List, Dict, Tuple, Union
 
@@ -19,7 +18,7 @@ import sqlalchemy as sa
 from sqlalchemy import Column, ForeignKey, String, DateTime, Date
 from sqlalchemy.orm import column_property
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql.expression import extract, cast
+from sqlalchemy.sql.expression import cast
 
 try:
     from api import sql_func
@@ -43,6 +42,12 @@ try:
     from RingDB import DBWrapper
     from core.DatabaseInterface import DatabaseInterface
     from core.RingAugmentor import RingAugmentor
+    from core.RingStatistics import RingStatistics
+    from core.RingSampler import RingSampler
+    from core.RingMaterializer import RingMaterializer
+    from core.RingReferenceResolver import RingReferenceResolver
+    from core.Planning.PlanCompositionCache import PlanCompositionCache
+    from core.ConfigRegistry import ConfigRegistry
     from core.Analysis.OperationOntology import OperationOntology
 except:
     from .RingObjects.Ring import Ring
@@ -51,6 +56,12 @@ except:
     from .RingDB import RingDB
     from .DatabaseInterface import DatabaseInterface
     from .RingAugmentor import RingAugmentor
+    from .RingStatistics import RingStatistics
+    from .RingSampler import RingSampler
+    from .RingMaterializer import RingMaterializer
+    from .RingReferenceResolver import RingReferenceResolver
+    from .Planning.PlanCompositionCache import PlanCompositionCache
+    from .ConfigRegistry import ConfigRegistry
     from .Analysis.OperationOntology import OperationOntology
 
 class RingCompiler(object):
@@ -65,10 +76,8 @@ class RingCompiler(object):
 
         # Get upper ontology
         default_path = os.environ.get("SATYRN_ROOT_DIR") + "/" +"core" + "/" + "upperOntology.json"
-        with open(default_path, 'r') as file:
-            defaults = json.load(file)
-            self.upper_ontology = defaults
-            self.upper_ontology.update(UPPER_ONTOLOGY)
+        self.upper_ontology = dict(ConfigRegistry.get(default_path))
+        self.upper_ontology.update(UPPER_ONTOLOGY)
 
     def build_orm(self) -> RingDB:
         """
@@ -232,7 +241,7 @@ class RingCompiler(object):
             gran_name =":only" + field if field != "year" else ":" + field
 
             # Extract the component from the datetime column
-            datetime_component_col = extract(field, col)
+            datetime_component_col = sql_func.sql_extract(field, col, self.ring.data_source.type)
 
             if field != "year" and field != "microsecond":
                 datetime_component_col = sql_func.sql_right("00" + cast(datetime_component_col, String),
@@ -250,7 +259,7 @@ class RingCompiler(object):
             # add column property for year/month/day
             model_map[table][col_name + ":day"] = column_property(datetime_component_col_dict["year"] + "/" + datetime_component_col_dict["month"] +  "/" + datetime_component_col_dict["day"])
             # add column property for day of week
-            model_map[table][col_name + ":dayofweek"] = column_property(cast(extract("dow", model_map[attribute.source_table][col_name]), String))
+            model_map[table][col_name + ":dayofweek"] = column_property(cast(sql_func.sql_extract("dow", col, self.ring.data_source.type), String))
 
         # Add column property for year+month
         if min_id > 0 and max_id == 0:
@@ -377,19 +386,22 @@ def compile_rings(rings_list: List[str],
     return rings, extractors
 
 def compile_ring(ring_config: Union[str, dict],
-                 operation_ontology: OperationOntology,
+                 operation_ontology: OperationOntology = None,
                  in_type: str="json",
                  augment_ring=True) -> Ring:
     """
     Builds the ring configuration object and the SQLAlchemy ORM.
     :param ring_config: A path to the json file containing the ring configuration.
     :type ring_config: Union[str,dict]
+    :param operation_ontology: The operations to derive attributes with (the shared ontology if not given).
+    :type operation_ontology: OperationOntology
     :param in_type: {json|path} specifying how the ring is provided.
     :type in_type: str
     :return: The ring configuration object.
     :rtype: Ring
     """
 
+    operation_ontology = operation_ontology or OperationOntology.get_instance()
     ring = Ring()
     if in_type == "path": # ring is a path to a json file
         ring.parse_file_from_path(ring_config)
@@ -398,6 +410,14 @@ def compile_ring(ring_config: Union[str, dict],
     ring.compiler = RingCompiler(ring)
     ring.db = ring.compiler.build_orm()
     ring.db_interface = DatabaseInterface(ring.db)
+    stats_dir = os.environ.get("SATYRN_STATS_DIR", os.path.join(os.environ.get("SATYRN_ROOT_DIR", os.getcwd()), "stats"))
+    ring.statistics = RingStatistics(ring, storage_dir=stats_dir)
+    ring.sampler = RingSampler(ring, lock_dir=stats_dir)
+    ring.reference_resolver = RingReferenceResolver(ring,
+                                                    max_size=int(os.environ.get("SATYRN_REFERENCE_CACHE_SIZE", 10000)),
+                                                    storage_dir=os.environ.get("SATYRN_REFERENCE_DIR", os.path.join(os.environ.get("SATYRN_ROOT_DIR", os.getcwd()), "references")),
+                                                    max_index_rows=int(os.environ.get("SATYRN_REFERENCE_INDEX_MAX_ROWS", 1000000)))
+    ring.plan_composition_cache = PlanCompositionCache(max_size=int(os.environ.get("SATYRN_PLAN_CACHE_SIZE", 256)))
 
     # Derive additional attributes for the rings based on the available entities/attributes/relationships and analytics
     if augment_ring:
@@ -405,6 +425,22 @@ def compile_ring(ring_config: Union[str, dict],
         ring_augmentor.generate_access_plans()
         ring_augmentor.generate_derived_attributes()
 
+    # Materialize the derived attributes into summary tables if the ring asks for it. Queries stop reading a summary that
+    # has missed two refreshes in a row, unless SATYRN_MATERIALIZE_MAX_AGE says otherwise (a non-positive interval or
+    # age turns off the refreshes or the bound)
+    if ring.materialize_derived_attributes:
+        materialize_refresh_interval = float(os.environ.get("SATYRN_MATERIALIZE_REFRESH_INTERVAL", 3600))
+        materialize_max_age = float(os.environ.get("SATYRN_MATERIALIZE_MAX_AGE", 2 * materialize_refresh_interval))
+        # The workers of a server take turns refreshing through a lock file next to the statistics they share
+        ring.materializer = RingMaterializer(ring, max_age=materialize_max_age if materialize_max_age > 0 else None, lock_dir=stats_dir)
+        if materialize_refresh_interval > 0:
+            ring.materializer.start_refresh_schedule(materialize_refresh_interval)
+
+    # Keep the table statistics fresh in the background (a non-positive interval turns this off)
+    stats_refresh_interval = float(os.environ.get("SATYRN_STATS_REFRESH_INTERVAL", 86400))
+    if stats_refresh_interval > 0:
+        ring.statistics.start_refresh_schedule(stats_refresh_interval)
+
     return ring
 
 # NEW VERSION
@@ -0,0 +1,442 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import json
+import math
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import Column, Float, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Query
+
+from core.PeriodicTask import PeriodicTask
+from core.RingObjects.Ring import Ring
+from core.Analysis.AnalysisEngine import AnalysisEngine
+
+logger = logging.getLogger(__name__)
+
+
+class MaterializedSummary:
+    """
+    A summary table holding the derived attributes that aggregate the same related entity for each value of the same
+    attribute of an entity (e.g. the average/min/max/... of each Wildfire metric for each State name).
+    Its columns are named after the columns of the SQR query that computes them (e.g. 'State//name' and
+    'average(Wildfire//fire_size)') so queries can be routed to it without renaming anything.
+    """
+
+    def __init__(self,
+                 entity_name: str,
+                 groupby_attribute: str,
+                 related_entity_name: str):
+        self.entity_name = entity_name
+        self.groupby_attribute = groupby_attribute
+        self.related_entity_name = related_entity_name
+        self.name = f"satyrn_mat__{entity_name}__{groupby_attribute}__{related_entity_name}"
+        self.key_column = f"{entity_name}//{groupby_attribute}"
+
+        # Maps the column of each derived attribute to the (operation, attribute of the related entity) it aggregates
+        self.columns = {}
+
+        # Set once the summary table exists
+        self.table = None
+        self.high_water_mark = None
+        self.refreshed_at = None
+
+    def add_derived_attribute(self,
+                              operation: str,
+                              attribute: str) -> None:
+        self.columns[f"{operation}({self.related_entity_name}//{attribute})"] = (operation, attribute)
+
+
+class RingMaterializer:
+    """
+    Materializes the derived attributes generated by the RingAugmentor (aggregations over a related entity) into
+    summary tables so queries can read them rather than recomputing the aggregation on every use.
+    Summaries over append only entities are refreshed incrementally by recomputing only the groups that rows added
+    since the last refresh belong to (and the groups of keys added to or removed from the entity being grouped). All
+    other summaries are rebuilt from scratch.
+    Queries stop being routed to a summary once it's older than max_age (e.g. when its refreshes keep failing) and go
+    back to computing the aggregations until it's refreshed again. Processes sharing the lock directory (e.g. the workers
+    of a server) take turns refreshing the summaries, and only the first one due refreshes them while the others pick up
+    the refreshed tables.
+    """
+
+    META_TABLE_NAME = "satyrn_mat__meta"
+
+    def __init__(self,
+                 ring: Ring,
+                 max_age: float = None,
+                 lock_dir: str = None):
+        """
+        :param ring: The compiled (and augmented) ring whose derived attributes are materialized.
+        :type ring: Ring
+        :param max_age: The most seconds since a summary was refreshed for queries to still read it (no bound if not given).
+        :type max_age: float
+        :param lock_dir: The directory of the file locked while refreshing (refreshes aren't coordinated with other processes if not given).
+        :type lock_dir: str
+        """
+        self.ring = ring
+        self.max_age = max_age
+        self.lock_dir = lock_dir
+        self.summaries = self.get_summaries()
+        self.lock = threading.RLock()
+        self.refresh_task = None
+        self.meta_table = Table(self.META_TABLE_NAME,
+                                MetaData(),
+                                Column("table_name", String, primary_key=True),
+                                Column("high_water_mark", String),
+                                Column("refreshed_at", Float))
+
+        self.load()
+
+    def is_enabled(self,
+                   entity_name: str) -> bool:
+        materialize = self.ring.materialize_derived_attributes
+        return materialize is True or (isinstance(materialize, list) and entity_name in materialize)
+
+    def get_summaries(self) -> Dict[str, MaterializedSummary]:
+        """
+        Groups the derived attributes of the entities that have materialization enabled into summaries.
+        :return: The summaries by the name of their table.
+        :rtype: Dict[str, MaterializedSummary]
+        """
+        ontology = AnalysisEngine.for_ring(self.ring).ontology
+        summaries = {}
+        for entity in self.ring.entities:
+            if not self.is_enabled(entity.name):
+                continue
+            for derived_attribute in entity.attributes.get_derived_attributes():
+                related_entity = self.ring.get_entity_by_name(derived_attribute.related_entity_name)
+                if derived_attribute.attribute in related_entity.attributes.derived_attributes:
+                    # Aggregations of other derived attributes aren't backed by a column to aggregate
+                    continue
+                if not ontology.resolve_operation(derived_attribute.operation).supports_sql(self.ring.get_dialect()):
+                    # Aggregations the database can't run are computed in memory when queried
+                    continue
+                summary = MaterializedSummary(entity.name, derived_attribute.groupby_attribute, derived_attribute.related_entity_name)
+                summary = summaries.setdefault(summary.name, summary)
+                summary.add_derived_attribute(derived_attribute.operation, derived_attribute.attribute)
+        return summaries
+
+    def get_summary(self,
+                    entity_name: str,
+                    groupby_column: str,
+                    related_entity_name: str) -> Optional[MaterializedSummary]:
+        """
+        Gets the summary that has been materialized for the given grouping, if there is one (and it isn't too old).
+        :param entity_name: The name of the entity being grouped.
+        :type entity_name: str
+        :param groupby_column: The column name of the attribute being grouped by (e.g. 'State//name').
+        :type groupby_column: str
+        :param related_entity_name: The name of the entity being aggregated.
+        :type related_entity_name: str
+        :return: The summary or None if there's no materialized table for the grouping or it's older than max_age.
+        :rtype: MaterializedSummary
+        """
+        summary = next((summary for summary in self.summaries.values()
+                        if summary.entity_name == entity_name and summary.key_column == groupby_column and summary.related_entity_name == related_entity_name), None)
+        if summary is None or summary.table is None:
+            return None
+        if self.max_age is not None and self.get_age(summary) > self.max_age:
+            return None
+        return summary
+
+    def get_age(self,
+                summary: MaterializedSummary) -> float:
+        """
+        Gets the number of seconds since the summary was last refreshed.
+        :param summary: The summary.
+        :type summary: MaterializedSummary
+        :return: The age of the summary (infinite if it has never been refreshed).
+        :rtype: float
+        """
+        return time.time() - summary.refreshed_at if summary.refreshed_at is not None else math.inf
+
+    def get_summary_plan(self,
+                         summary: MaterializedSummary) -> Dict[str, str]:
+        """
+        Builds the SQR plan that computes every column of the summary.
+        :param summary: The summary.
+        :type summary: MaterializedSummary
+        :return: The SQR plan.
+        :rtype: Dict[str, str]
+        """
+        plan = {
+            "|1|": f"(retrieve_entity {summary.entity_name})",
+            "|2|": f"(retrieve_entity {summary.related_entity_name})",
+            "|3|": f"(retrieve_attribute |1| {summary.groupby_attribute})",
+            "|4|": "(groupby |3|)"
+        }
+        attribute_refs = {}
+        aggregate_refs = []
+        for operation, attribute in summary.columns.values():
+            if attribute not in attribute_refs:
+                attribute_refs[attribute] = f"|{len(plan) + 1}|"
+                plan[attribute_refs[attribute]] = f"(retrieve_attribute |2| {attribute})"
+            aggregate_refs.append(f"|{len(plan) + 1}|")
+            plan[aggregate_refs[-1]] = f"({operation} {attribute_refs[attribute]} |4|)"
+        plan[f"|{len(plan) + 1}|"] = f"(collect |3| {' '.join(aggregate_refs)})"
+        plan[f"|{len(plan) + 1}|"] = f"(return |{len(plan)}|)"
+        return plan
+
+    def get_summary_query(self,
+                          summary: MaterializedSummary) -> Query:
+        """
+        Builds the SQL Alchemy query that computes the summary (the same query the SQR plan would run, without being
+        routed to the summary table itself).
+        :param summary: The summary.
+        :type summary: MaterializedSummary
+        :return: The query.
+        :rtype: Query
+        """
+        return self.build_query(self.get_summary_plan(summary))
+
+    def get_key_query(self,
+                      summary: MaterializedSummary) -> Query:
+        """
+        Builds the SQL Alchemy query that gets every group key the summary should have (the distinct values of the
+        attribute being grouped by, whether or not any rows of the related entity belong to them).
+        :param summary: The summary.
+        :type summary: MaterializedSummary
+        :return: The query.
+        :rtype: Query
+        """
+        return self.build_query({
+            "|1|": f"(retrieve_entity {summary.entity_name})",
+            "|2|": f"(retrieve_attribute |1| {summary.groupby_attribute})",
+            "|3|": "(collect |2|)",
+            "|4|": "(return |3|)"
+        }).distinct()
+
+    def build_query(self,
+                    plan: Dict[str, str]) -> Query:
+        """
+        Builds the SQL Alchemy query that runs an SQR plan (without being routed to the summary tables).
+        :param plan: The SQR plan.
+        :type plan: Dict[str, str]
+        :return: The query.
+        :rtype: Query
+        """
+        analysis_engine = AnalysisEngine.for_ring(self.ring)
+        analysis_plan = analysis_engine.plan_parser.parse(plan)
+        query_args = analysis_engine.query_builder_sqr.build_query_arguments_from_sqr_plan(analysis_plan, analysis_engine.ontology)
+        query_args = analysis_engine.query_rewriter_sqr.rewrite(query_args, analysis_engine.ontology)
+        # Only the query's statement gets used (it's run on the engine), so the session can be closed right away
+        with self.ring.db.session() as session:
+            return analysis_engine.complex_query(query_args, self.ring, session)
+
+    def refresh(self,
+                full: bool = False,
+                min_age: float = None) -> None:
+        """
+        Refreshes every summary (incrementally where possible).
+        :param full: Whether to rebuild every summary from scratch.
+        :type full: bool
+        :param min_age: Summaries refreshed (e.g. by another process) less than this many seconds ago are only loaded.
+        :type min_age: float
+        :return: None
+        :rtype: None
+        """
+        if min_age is not None:
+            # Picks up the summaries other processes have refreshed
+            with self.lock:
+                self.load()
+        for summary in self.summaries.values():
+            if min_age is not None and summary.table is not None and self.get_age(summary) < min_age:
+                continue
+            try:
+                self.refresh_summary(summary, full)
+            except SQLAlchemyError as e:
+                # Keep refreshing the other summaries (queries keep computing this one's aggregations)
+                logger.warning("Unable to refresh the materialized summary '%s': %s", summary.name, e)
+
+    def refresh_summary(self,
+                        summary: MaterializedSummary,
+                        full: bool = False) -> None:
+        """
+        Refreshes a summary, only recomputing the groups with new rows if the related entity is append only.
+        :param summary: The summary to refresh.
+        :type summary: MaterializedSummary
+        :param full: Whether to rebuild the summary from scratch.
+        :type full: bool
+        :return: None
+        :rtype: None
+        """
+        with self.lock:
+            related_entity = self.ring.get_entity_by_name(summary.related_entity_name)
+            high_water_mark = self.get_high_water_mark(summary) if related_entity.append_only else None
+            if full or summary.table is None or high_water_mark is None or summary.high_water_mark is None:
+                self.rebuild_summary(summary)
+            else:
+                # The entity being grouped can change even when no rows have been added to the related entity
+                self.update_summary(summary, summary.high_water_mark if high_water_mark != summary.high_water_mark else None)
+            summary.high_water_mark = high_water_mark
+            summary.refreshed_at = time.time()
+            self.save(summary)
+
+    def rebuild_summary(self,
+                        summary: MaterializedSummary) -> None:
+        """
+        Builds the summary table from scratch (into a new table which then replaces the old one).
+        :param summary: The summary to rebuild.
+        :type summary: MaterializedSummary
+        :return: None
+        :rtype: None
+        """
+        engine = self.ring.db.eng
+        try:
+            compiled_query = self.get_summary_query(summary).statement.compile(engine, compile_kwargs={"literal_binds": True})
+            with engine.connect() as connection:
+                connection.execute(text(f"SELECT * FROM ({compiled_query}) AS summary LIMIT 1")).fetchall()
+        except SQLAlchemyError:
+            # Leave out the aggregations the database can't compute rather than the whole summary
+            self.remove_unsupported_columns(summary)
+            compiled_query = self.get_summary_query(summary).statement.compile(engine, compile_kwargs={"literal_binds": True})
+
+        new_table_name = f"{summary.name}__new"
+        with engine.begin() as connection:
+            connection.execute(text(f'DROP TABLE IF EXISTS "{new_table_name}"'))
+            connection.execute(text(f'CREATE TABLE "{new_table_name}" AS {compiled_query}'))
+            connection.execute(text(f'DROP TABLE IF EXISTS "{summary.name}"'))
+            connection.execute(text(f'ALTER TABLE "{new_table_name}" RENAME TO "{summary.name}"'))
+        summary.table = Table(summary.name, MetaData(), autoload_with=engine)
+
+    def remove_unsupported_columns(self,
+                                   summary: MaterializedSummary) -> None:
+        """
+        Removes the derived attributes whose aggregation fails on the ring's database from the summary.
+        :param summary: The summary.
+        :type summary: MaterializedSummary
+        :return: None
+        :rtype: None
+        """
+        all_columns = summary.columns
+        for column_name, derivation in all_columns.items():
+            summary.columns = {column_name: derivation}
+            try:
+                with self.ring.db.eng.connect() as connection:
+                    connection.execute(self.get_summary_query(summary).limit(1).statement).fetchall()
+            except SQLAlchemyError as e:
+                logger.warning("Not materializing '%s' for %s: %s", column_name, summary.entity_name, e.orig if hasattr(e, 'orig') else e)
+                all_columns = {name: value for name, value in all_columns.items() if name != column_name}
+        summary.columns = all_columns
+
+    def update_summary(self,
+                       summary: MaterializedSummary,
+                       high_water_mark) -> None:
+        """
+        Recomputes the groups of the summary that rows of the related entity past the high water mark belong to, adds
+        the groups of keys the entity being grouped has gained and removes the groups of the keys it no longer has.
+        :param summary: The summary to update.
+        :type summary: MaterializedSummary
+        :param high_water_mark: The largest id of the related entity as of the last refresh (None if no rows have been added since).
+        :type high_water_mark: Any
+        :return: None
+        :rtype: None
+        """
+        related_entity = self.ring.get_entity_by_name(summary.related_entity_name)
+        id_column = getattr(getattr(self.ring.db, related_entity.primary_table), related_entity.id[0])
+        query = self.get_summary_query(summary)
+        key_field = query.column_descriptions[0]['expr'].element
+
+        key_column = summary.table.c[summary.key_column]
+        # Run on the engine rather than the ring's session since refreshes happen on a background thread
+        with self.ring.db.eng.begin() as connection:
+            entity_keys = {row[0] for row in connection.execute(self.get_key_query(summary).statement)}
+            summary_keys = {row[0] for row in connection.execute(select(key_column))}
+            changed_keys = entity_keys - summary_keys
+            if high_water_mark is not None:
+                changed_keys |= entity_keys & {row[0] for row in connection.execute(query.filter(id_column > high_water_mark).statement)}
+            changed_keys = list(changed_keys)
+            removed_keys = list(summary_keys - entity_keys)
+            # Chunked to keep the number of bound parameters down
+            for idx in range(0, len(removed_keys), 500):
+                connection.execute(summary.table.delete().where(key_column.in_(removed_keys[idx:idx + 500])))
+            for idx in range(0, len(changed_keys), 500):
+                keys = changed_keys[idx:idx + 500]
+                rows = connection.execute(query.filter(key_field.in_(keys)).statement).fetchall()
+                connection.execute(summary.table.delete().where(key_column.in_(keys)))
+                if rows:
+                    connection.execute(summary.table.insert(), [dict(zip(summary.table.c.keys(), row)) for row in rows])
+
+    def get_high_water_mark(self,
+                            summary: MaterializedSummary):
+        related_entity = self.ring.get_entity_by_name(summary.related_entity_name)
+        id_column = getattr(getattr(self.ring.db, related_entity.primary_table), related_entity.id[0])
+        with self.ring.db.eng.connect() as connection:
+            return connection.execute(select(func.max(id_column))).scalar()
+
+    def start_refresh_schedule(self,
+                               interval: float) -> None:
+        """
+        Refreshes the summaries every interval seconds on a background thread, starting right away (which only refreshes
+        the summaries that haven't been built or are more than half an interval old).
+        :param interval: The number of seconds between refreshes.
+        :type interval: float
+        :return: None
+        :rtype: None
+        """
+        if not self.refresh_task:
+            self.refresh_task = PeriodicTask(f"ring-materializer-{self.ring.id}-v{self.ring.version}",
+                                             interval,
+                                             lambda: self.refresh(min_age=interval / 2),
+                                             run_immediately=True,
+                                             lock_path=os.path.join(self.lock_dir, f"{self.ring.id}_v{self.ring.version}.materialize.lock") if self.lock_dir else None)
+        self.refresh_task.start()
+
+    def save(self,
+             summary: MaterializedSummary) -> None:
+        with self.ring.db.eng.begin() as connection:
+            self.meta_table.create(connection, checkfirst=True)
+            connection.execute(self.meta_table.delete().where(self.meta_table.c.table_name == summary.name))
+            connection.execute(self.meta_table.insert().values(table_name=summary.name,
+                                                               high_water_mark=json.dumps(summary.high_water_mark, default=str),
+                                                               refreshed_at=summary.refreshed_at))
+
+    def load(self) -> None:
+        if not self.summaries:
+            return
+        engine = self.ring.db.eng
+        try:
+            inspector = inspect(engine)
+            if not inspector.has_table(self.META_TABLE_NAME):
+                return
+            with engine.connect() as connection:
+                meta_rows = {row.table_name: row for row in connection.execute(select(self.meta_table))}
+            for summary in self.summaries.values():
+                if summary.name in meta_rows and inspector.has_table(summary.name):
+                    summary.table = Table(summary.name, MetaData(), autoload_with=engine)
+                    # Columns left out when the table was built stay unmaterialized
+                    summary.columns = {name: value for name, value in summary.columns.items() if name in summary.table.c}
+                    summary.high_water_mark = json.loads(meta_rows[summary.name].high_water_mark)
+                    summary.refreshed_at = meta_rows[summary.name].refreshed_at
+        except SQLAlchemyError as e:
+            logger.warning("Unable to load the materialized summaries of ring %s: %s", self.ring.id, e)
+
+    def to_json(self) -> List[Dict]:
+        return [{
+            "table": summary.name,
+            "entity": summary.entity_name,
+            "groupbyAttribute": summary.groupby_attribute,
+            "relatedEntity": summary.related_entity_name,
+            "columns": list(summary.columns.keys()),
+            "materialized": summary.table is not None,
+            "highWaterMark": summary.high_water_mark,
+            "refreshedAt": summary.refreshed_at,
+            "age": self.get_age(summary) if summary.refreshed_at is not None else None,
+            "maxAge": self.max_age,
+            "routed": summary.table is not None and (self.max_age is None or self.get_age(summary) <= self.max_age)
+        } for summary in self.summaries.values()]
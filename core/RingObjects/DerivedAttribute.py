@@ -0,0 +1,60 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+from typing import List
+
+from core.Operations.ArgType import ArgType
+
+
+class DerivedAttribute:
+    """
+    A lightweight description of an attribute derived by the RingAugmentor (an aggregation of an attribute of a related
+    entity for each value of an attribute of the entity). The full RingAttribute, with its access plan, is only built
+    when the attribute is first used.
+    """
+
+    __slots__ = ['name', 'type', 'operation', 'entity_name', 'groupby_attribute', 'related_entity_name', 'attribute']
+
+    def __init__(self,
+                 name: str,
+                 type: List[ArgType],
+                 operation: str,
+                 entity_name: str,
+                 groupby_attribute: str,
+                 related_entity_name: str,
+                 attribute: str):
+        """
+        :param name: The name of the derived attribute (e.g. 'average_Wildfire_fire_size').
+        :type name: str
+        :param type: The types of the derived attribute (the output types of the operation).
+        :type type: List[ArgType]
+        :param operation: The name of the aggregation operation.
+        :type operation: str
+        :param entity_name: The name of the entity the attribute belongs to.
+        :type entity_name: str
+        :param groupby_attribute: The name of the attribute of the entity being grouped by.
+        :type groupby_attribute: str
+        :param related_entity_name: The name of the related entity being aggregated.
+        :type related_entity_name: str
+        :param attribute: The name of the attribute of the related entity being aggregated.
+        :type attribute: str
+        """
+        self.name = name
+        self.type = type
+        self.operation = operation
+        self.entity_name = entity_name
+        self.groupby_attribute = groupby_attribute
+        self.related_entity_name = related_entity_name
+        self.attribute = attribute
+
+    def __repr__(self):
+        return f"DerivedAttribute({self.name})"
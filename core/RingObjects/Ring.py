@@ -13,7 +13,6 @@ If not, see <https://www.gnu.org/licenses/>.
 import os
 import json
 from functools import reduce
-import networkx as nx
 from typing import Union, Tuple, List, Dict, Set
 
 from sqlalchemy.engine.row import Row
@@ -26,6 +25,7 @@ from .RingRelationship import RingRelationship
 from .RingRelationshipGraph import RingRelationshipGraph
 from .RingAttribute import RingAttribute
 
+from core.ConfigRegistry import ConfigRegistry
 from core.Analysis.OperationOntology import OperationOntology
 from core.Operations.ArgType import ArgType
 
@@ -54,6 +54,16 @@ class Ring(RingObject):
         self.relationship_graph = None
         self.default_target_entity = None
 
+        # Whether to materialize the derived attributes into summary tables (True for all entities or a list of entity names)
+        self.materialize_derived_attributes = False
+
+        # Whether to index the references of the instances of the entities (True for all entities or a list of entity names)
+        self.index_references = False
+
+        # Limits on the derived attributes generated for each entity ('allow' lists the names to generate and
+        # 'maxPerEntity' caps how many are generated)
+        self.derived_attributes = {}
+
         # Initialize other important properties
         self.db = None
         self.compiler = None
@@ -67,6 +77,12 @@ class Ring(RingObject):
         self.current_target_entity = None
         self.cache = {}
         self.db_interface = None
+        self.statistics = None
+        self.sampler = None
+        self.materializer = None
+        self.analysis_engine = None
+        self.reference_resolver = None
+        self.plan_composition_cache = None
 
     def parse(self,
               configuration: dict) -> None:
@@ -88,6 +104,9 @@ class Ring(RingObject):
         else:
             self.default_target_entity = configuration.get('defaultTargetEntity')
         self.description = configuration.get('description')
+        self.materialize_derived_attributes = configuration.get('materializeDerivedAttributes', False)
+        self.index_references = configuration.get('indexReferences', False)
+        self.derived_attributes = configuration.get('derivedAttributes', {})
         self.parse_source(configuration)
         self.parse_entities(configuration)
         self.parse_relationships(configuration)
@@ -103,10 +122,9 @@ class Ring(RingObject):
                               configuration: dict) -> None:
         # i.e. where to put the attributes in the ring json
         default_path = os.environ.get("SATYRN_ROOT_DIR") + "/" +"core" + "/" + "defaults.json"
-        with open(default_path, 'r') as file:
-            defaults = json.load(file)
-            self.sig_figs = defaults.get("result_formatting")["rounding"][1]
-            self.rounding = True
+        defaults = ConfigRegistry.get(default_path)
+        self.sig_figs = defaults.get("result_formatting")["rounding"][1]
+        self.rounding = True
 
     def parse_source(self,
                      configuration: dict) -> None:
@@ -133,6 +151,8 @@ class Ring(RingObject):
             rels = configuration.get("ontology", {}).get("relationships", [])
         else:
             rels = configuration.get("relationships", [])
+        # networkx is only imported once a ring is compiled (importing core shouldn't load it)
+        import networkx as nx
         relationship_graph = nx.Graph()
         for rel in rels:
             relationship_object = RingRelationship()
@@ -178,6 +198,9 @@ class Ring(RingObject):
         configuration = {}
         self.safe_insert('name', self.name, configuration)
         self.safe_insert('version', self.version, configuration)
+        self.safe_insert('materializeDerivedAttributes', self.materialize_derived_attributes, configuration)
+        self.safe_insert('indexReferences', self.index_references, configuration)
+        self.safe_insert('derivedAttributes', self.derived_attributes, configuration)
         self.safe_insert('dataSource', self.data_source.construct(), configuration)
         self.safe_insert('entities', list(map((lambda entity: entity.construct()), self.entities)), configuration)
         return configuration
@@ -314,6 +337,9 @@ class Ring(RingObject):
     def get_db_type(self):
         return self.data_source.type
 
+    def get_dialect(self):
+        return self.data_source.dialect
+
     def get_rounding(self):
         return self.rounding
 
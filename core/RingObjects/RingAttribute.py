@@ -11,10 +11,10 @@ If not, see <https://www.gnu.org/licenses/>.
 '''
 
 import os
-import json
 from typing import Dict, Tuple, Union
 
 from .RingObject import RingObject
+from core.ConfigRegistry import ConfigRegistry
 from core.Operations.ArgType import ArgType
 
 class RingAttribute(RingObject):
@@ -93,35 +93,34 @@ class RingAttribute(RingObject):
             self.description = md.get('description')
 
         default_path = os.environ.get("SATYRN_ROOT_DIR") + "/" +"core" + "/" + "defaults.json"
-        with open(default_path, 'r') as file:
-            defaults = json.load(file)
-            ##check if the value is set in the ring
-            if info.get("nullHandling"):
-                self.null_handling = info.get("nullHandling")
+        defaults = ConfigRegistry.get(default_path)
+        ##check if the value is set in the ring
+        if info.get("nullHandling"):
+            self.null_handling = info.get("nullHandling")
+        else:
+            self.null_handling = defaults.get("null_defaults")[self.base_isa][0]
+        if info.get("nullValue"):
+            self.null_value = info.get("nullValue")
+        else:
+            self.null_value = defaults.get("null_defaults")[self.base_isa][1]
+
+        ## rounding
+        if self.base_isa in ["float"]: # , "integer"]:
+            ##chek if the value is set in the ring
+            if info.get("rounding"):
+                self.rounding = info.get("rounding")[0]
+                self.sig_figs = info.get("rounding")[1]
             else:
-                self.null_handling = defaults.get("null_defaults")[self.base_isa][0]
-            if info.get("nullValue"):
-                self.null_value = info.get("nullValue")
+                self.rounding = defaults.get("result_formatting")["rounding"][0]
+                self.sig_figs = defaults.get("result_formatting")["rounding"][1]
+
+        if self.base_isa and self.base_isa in ["date", "datetime", "date:year"]:
+            if info.get("dateGranularity"):
+                granularity = info.get("dateGranularity")
             else:
-                self.null_value = defaults.get("null_defaults")[self.base_isa][1]
-
-            ## rounding
-            if self.base_isa in ["float"]: # , "integer"]:
-                ##chek if the value is set in the ring
-                if info.get("rounding"):
-                    self.rounding = info.get("rounding")[0]
-                    self.sig_figs = info.get("rounding")[1]
-                else:
-                    self.rounding = defaults.get("result_formatting")["rounding"][0]
-                    self.sig_figs = defaults.get("result_formatting")["rounding"][1]
-
-            if self.base_isa and self.base_isa in ["date", "datetime", "date:year"]:
-                if info.get("dateGranularity"):
-                    granularity = info.get("dateGranularity")
-                else:
-                    granularity = defaults.get("date_defaults")[self.base_isa]
-                self.date_max_granularity = granularity[1]
-                self.date_min_granularity = granularity[0]
+                granularity = defaults.get("date_defaults")[self.base_isa]
+            self.date_max_granularity = granularity[1]
+            self.date_min_granularity = granularity[0]
 
         return None
 
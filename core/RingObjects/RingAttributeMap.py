@@ -0,0 +1,98 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import threading
+from collections.abc import MutableMapping
+from typing import Iterator, List, Tuple
+
+from .RingAttribute import RingAttribute
+from .DerivedAttribute import DerivedAttribute
+from core.Operations.ArgType import ArgType
+
+
+class RingAttributeMap(MutableMapping):
+    """
+    The attributes of an entity by name. Derived attributes are registered as DerivedAttribute descriptors and only
+    built into RingAttribute objects (by the factory the RingAugmentor provides) the first time they're looked up.
+    Membership tests and type lookups don't build anything.
+    """
+
+    def __init__(self):
+        self.attributes = {}
+        self.derived_attributes = {}
+        self.factory = None
+        self.lock = threading.Lock()
+
+    def __getitem__(self,
+                    name: str) -> RingAttribute:
+        if name in self.attributes:
+            return self.attributes[name]
+        if name not in self.derived_attributes or not self.factory:
+            raise KeyError(name)
+        with self.lock:
+            if name not in self.attributes:
+                self.attributes[name] = self.factory(self.derived_attributes[name])
+            return self.attributes[name]
+
+    def __setitem__(self,
+                    name: str,
+                    attribute: RingAttribute) -> None:
+        self.attributes[name] = attribute
+
+    def __delitem__(self,
+                    name: str) -> None:
+        if name not in self.attributes and name not in self.derived_attributes:
+            raise KeyError(name)
+        self.attributes.pop(name, None)
+        self.derived_attributes.pop(name, None)
+
+    def __contains__(self,
+                     name) -> bool:
+        return name in self.attributes or name in self.derived_attributes
+
+    def __iter__(self) -> Iterator[str]:
+        yield from list(self.attributes)
+        yield from [name for name in list(self.derived_attributes) if name not in self.attributes]
+
+    def __len__(self) -> int:
+        return len(self.attributes) + len([name for name in self.derived_attributes if name not in self.attributes])
+
+    def __repr__(self):
+        return f"RingAttributeMap({list(self)})"
+
+    def add_derived_attribute(self,
+                              derived_attribute: DerivedAttribute) -> None:
+        self.derived_attributes[derived_attribute.name] = derived_attribute
+
+    def get_derived_attributes(self) -> List[DerivedAttribute]:
+        return list(self.derived_attributes.values())
+
+    def get_attribute_type(self,
+                           name: str) -> List[ArgType]:
+        """
+        Gets the types of an attribute without building it if it's derived.
+        :param name: The name of the attribute.
+        :type name: str
+        :return: The types of the attribute.
+        :rtype: List[ArgType]
+        """
+        if name in self.attributes:
+            return self.attributes[name].type
+        return self.derived_attributes[name].type
+
+    def base_items(self) -> List[Tuple[str, RingAttribute]]:
+        """
+        Gets the attributes defined in the ring configuration (i.e. those backed by a column rather than derived).
+        :return: The attribute names and objects.
+        :rtype: List[Tuple[str, RingAttribute]]
+        """
+        return [(name, attribute) for name, attribute in list(self.attributes.items()) if name not in self.derived_attributes]
@@ -13,10 +13,8 @@ If not, see <https://www.gnu.org/licenses/>.
 import os
 import datetime
 import platform
-import pandas as pd
 from dateutil import parser
 from functools import reduce
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.event import listen
 from sqlalchemy.ext.declarative import declarative_base
@@ -25,6 +23,7 @@ from sqlalchemy.engine.base import Engine
 from .RingJoin import RingJoin
 from .RingObject import RingObject
 from ..RingDB import RingDB
+from ..api.sql_func import create_dialect
 
 try:
     from core.satyrnBundler import app
@@ -83,6 +82,7 @@ class RingDataSource(RingObject):
         self.joins = []
         self.eng = None
         self.session = None
+        self.dialect = None
 
         # # Tie in the base
         self.base = base if base else declarative_base()
@@ -92,7 +92,7 @@ class RingDataSource(RingObject):
     def parse(self,
               source_config: dict) -> None:
         self.type = source_config.get('type')
-        if self.type in ["sqlite", "csv"]:
+        if self.type in ["sqlite", "csv", "duckdb"]:
             ffl = os.environ.get("FLAT_FILE_LOC", "/")
             self.connection_string = os.path.join(ffl, source_config.get('connectionString'))
         else:
@@ -152,18 +152,36 @@ class RingDataSource(RingObject):
         :return: The database engine and the session used to make queries
         :rtype:
         """
-        if self.type == "sqlite":
-            self.eng = create_engine("sqlite:///{}".format(self.connection_string))
-            connect_to_extensions(self.eng)
-            self.session = sessionmaker(bind=self.eng)
-        elif self.type == "csv":
+        self.dialect = create_dialect(self.type)
+        if self.type == "csv":
             self.eng, self.session = self.csv_file_pathway(self.connection_string, db)
+        elif self.type == "duckdb" and os.path.isdir(self.connection_string):
+            self.eng, self.session = self.duckdb_file_pathway(self.connection_string)
         else:
-            self.eng = create_engine(self.connection_string, pool_size=1, max_overflow=19)
+            self.eng = self.dialect.create_engine(self.connection_string)
             self.session = sessionmaker(bind=self.eng)
         return self.eng, self.session
 
 
+    def duckdb_file_pathway(self,
+                            data_dir,
+                            catalog_file="satyrn_catalog.duckdb"):
+        """
+        Queries the Parquet/CSV files in the data directory in place with DuckDB. The catalog database (kept next to the
+        files) only holds a view over the files of each table, along with any summary tables the ring materializes.
+        :param data_dir: The directory with a file (or directory of files) per table.
+        :type data_dir: str
+        :param catalog_file: The name of the catalog database file.
+        :type catalog_file: str
+        :return: The database engine and the session used to make queries
+        :rtype:
+        """
+        self.eng = self.dialect.create_engine(os.path.join(data_dir, catalog_file))
+        # Recreated on every start so the views pick up any changes to the files of the ring
+        self.dialect.create_file_views(data_dir, self.tables)
+        self.session = sessionmaker(bind=self.eng)
+        return self.eng, self.session
+
     def csv_file_pathway(self,
                          csv_path,
                          db,
@@ -182,13 +200,11 @@ class RingDataSource(RingObject):
         # if condition to check if all stuff has been created
         path = os.path.join(self.connection_string, satyrn_file)
         if os.path.isfile(path):
-            self.eng = create_engine("sqlite:///" + path)
-            connect_to_extensions(self.eng)
+            self.eng = self.dialect.create_engine(path)
             self.session = sessionmaker(bind=self.eng)
             return self.eng, self.session
         else:
-            self.eng = create_engine("sqlite:///" + path)
-            connect_to_extensions(self.eng)
+            self.eng = self.dialect.create_engine(path)
             self.session = sessionmaker(bind=self.eng)
 
         def cast_value(value,
@@ -238,6 +254,9 @@ class RingDataSource(RingObject):
                 print("unrecognized tpe")
                 return value
 
+        # pandas is slow to import and only needed for CSV rings
+        import pandas as pd
+
         for model_name in db.__dict__.keys():
             model_class = getattr(db, model_name)
             file_name = "{}{}.csv".format(self.connection_string, model_name)
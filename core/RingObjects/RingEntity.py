@@ -14,6 +14,7 @@ from typing import List
 
 from .RingObject import RingObject
 from .RingAttribute import RingAttribute
+from .RingAttributeMap import RingAttributeMap
 
 from core.Operations.ArgType import ArgType
 
@@ -30,9 +31,12 @@ class RingEntity(RingObject):
         self.nicename = None
         self.primary_table = None
         self.reference = None
-        self.attributes = {}
+        self.attributes = RingAttributeMap()
         self.metrics = {}
 
+        # Rows of an append only entity are never updated or deleted (so aggregates over it can be refreshed incrementally)
+        self.append_only = False
+
         ## Error handling
         self.error_set = set()
         self.attribute_name = []
@@ -45,6 +49,7 @@ class RingEntity(RingObject):
         self.primary_table = entity_config.get('table')
         self.id = self.safe_extract_list('id', entity_config)
         self.id_type = self.safe_extract_list('idType', entity_config)
+        self.append_only = entity_config.get('appendOnly', False)
         self.parse_attributes(entity_config)
         self.parse_metrics(entity_config)
 
@@ -69,6 +74,7 @@ class RingEntity(RingObject):
         self.safe_insert('idType', self.id_type, entity)
         self.safe_insert('name', self.name, entity)
         self.safe_insert('table', self.primary_table, entity)
+        self.safe_insert('appendOnly', self.append_only, entity)
         self.safe_insert('attributes', self.attributes, entity)
         return entity
 
@@ -105,4 +111,4 @@ class RingEntity(RingObject):
         :return: The attributes with the specified type.
         :rtype: List of RingAttribute
         """
-        return [attr for attr_name, attr in self.attributes.items() if attr_type in attr.type]
+        return [self.attributes[attr_name] for attr_name in self.attributes if attr_type in self.attributes.get_attribute_type(attr_name)]
@@ -10,14 +10,16 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-import networkx as nx
-
 class RingRelationshipGraph(object):
 
     def __init__(self, graph=None):
+        # networkx is only imported once a ring is compiled (importing core shouldn't load it)
+        import networkx as nx
+
         # Set default values
         self.graph = graph if graph else nx.Graph()
 
     def get_path(self, entity_a, entity_b):
+        import networkx as nx
         node_path = nx.dijkstra_path(self.graph, entity_a, entity_b)
         return [self.graph[node_pair[0]][node_pair[1]]['relationship'] for node_pair in zip(node_path[:-1], node_path[1:])]
\ No newline at end of file
@@ -0,0 +1,375 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import re
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from core.RingObjects.Ring import Ring
+from core.Analysis.AnalysisEngine import AnalysisEngine
+
+
+class ReferenceIndex:
+    """
+    The references for every instance of an entity, as sorted arrays of the identifier values and their references.
+    """
+
+    def __init__(self,
+                 identifier: str,
+                 reference_template: str,
+                 values: List[str],
+                 references: List[str],
+                 built_at: float = None):
+        """
+        :param identifier: The name of the identifier attribute of the entity.
+        :type identifier: str
+        :param reference_template: The reference template the references were filled in from.
+        :type reference_template: str
+        :param values: The sorted identifier values.
+        :type values: List[str]
+        :param references: The reference for each of the identifier values.
+        :type references: List[str]
+        :param built_at: When the index was built.
+        :type built_at: float
+        """
+        self.identifier = identifier
+        self.reference_template = reference_template
+        self.values = values
+        self.references = references
+        self.built_at = built_at or time.time()
+
+    @classmethod
+    def from_references(cls,
+                        identifier: str,
+                        reference_template: str,
+                        references: Dict[str, str]) -> 'ReferenceIndex':
+        values = sorted(references)
+        return cls(identifier, reference_template, values, [references[value] for value in values])
+
+    @classmethod
+    def from_json(cls,
+                  stored: Dict) -> 'ReferenceIndex':
+        return cls(stored["identifier"], stored["reference_template"], stored["values"], stored["references"], stored.get("built_at"))
+
+    def matches(self,
+                identifier: str,
+                reference_template: str) -> bool:
+        return self.identifier == identifier and self.reference_template == reference_template
+
+    def get(self,
+            value: str) -> Optional[str]:
+        """
+        Looks up the reference for an identifier value.
+        :param value: The identifier value.
+        :type value: str
+        :return: The reference or None if the value isn't in the index.
+        :rtype: str
+        """
+        idx = bisect_left(self.values, value)
+        if idx < len(self.values) and self.values[idx] == value:
+            return self.references[idx]
+        return None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_json(self) -> Dict:
+        return {
+            "identifier": self.identifier,
+            "reference_template": self.reference_template,
+            "built_at": self.built_at,
+            "values": self.values,
+            "references": self.references
+        }
+
+
+class RingReferenceResolver:
+    """
+    Resolves the identifiers of entity instances to their references (e.g. "wildfire {fire_name}") for statement
+    generation. The references for all the identifier values of a report are fetched in a single query per entity (with
+    the values bound to an IN filter) and the most recently used ones are kept so the same instance isn't looked up again.
+    The entities the ring lists in indexReferences instead get the references of all their instances fetched at once the
+    first time they're needed, making them a lookup in an index that is stored alongside the ring version. Values
+    missing from the index (e.g. instances added since it was built) are fetched as above.
+    """
+
+    # The most identifier values looked up per query (keeps the bound parameters under the limits of the databases)
+    BATCH_SIZE = 10000
+
+    # Marks identifier values shared by more than one instance of the entity
+    AMBIGUOUS = object()
+
+    def __init__(self,
+                 ring: Ring,
+                 max_size: int = 10000,
+                 storage_dir: str = None,
+                 max_index_rows: int = 1000000):
+        """
+        :param ring: The compiled ring whose entities are referenced.
+        :type ring: Ring
+        :param max_size: The maximum number of references to keep.
+        :type max_size: int
+        :param storage_dir: The directory to store the reference indexes in (they're only kept in memory if not given).
+        :type storage_dir: str
+        :param max_index_rows: Entities whose table has more rows than this aren't indexed.
+        :type max_index_rows: int
+        """
+        self.ring = ring
+        self.max_size = max_size
+        self.storage_dir = storage_dir
+        self.max_index_rows = max_index_rows
+        self.references = OrderedDict()
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.index_lock = threading.Lock()
+
+        self.load()
+
+    @property
+    def storage_path(self) -> Optional[str]:
+        if not self.storage_dir:
+            return None
+        return os.path.join(self.storage_dir, f"{self.ring.id}_v{self.ring.version}.json")
+
+    def is_indexed(self,
+                   entity_name: str) -> bool:
+        index_references = self.ring.index_references
+        return index_references is True or (isinstance(index_references, list) and entity_name in index_references)
+
+    def get_reference(self,
+                      entity: str,
+                      identifier: str,
+                      value: str,
+                      reference_template: str) -> str:
+        """
+        Gets the reference to the instance of the entity with the given identifier value, fetching it if it isn't kept.
+        :param entity: The name of the entity.
+        :type entity: str
+        :param identifier: The name of the identifier attribute of the entity.
+        :type identifier: str
+        :param value: The value of the identifier (any other type is looked up as its string, e.g. a number from JSON).
+        :type value: str
+        :param reference_template: The reference template of the entity.
+        :type reference_template: str
+        :return: The reference filled in with the attributes of the instance.
+        :rtype: str
+        """
+        # The references are kept by the string of the identifier value, as the query results are
+        value = str(value)
+        index = self.get_index(entity, identifier, reference_template)
+        reference = index.get(value) if index else None
+        if reference is not None:
+            return reference
+
+        key = (entity, identifier, value, reference_template)
+        reference = self.get_kept_reference(key)
+        if reference is None:
+            self.prefetch(entity, identifier, [value], reference_template)
+            reference = self.get_kept_reference(key)
+
+        if reference is None:
+            raise ValueError(f"Error: No {entity} found with {identifier} '{value}' for reference retrieval.")
+        if reference is self.AMBIGUOUS:
+            raise ValueError('Error: Expected only one result for refrerece retrieval.')
+        return reference
+
+    def prefetch(self,
+                 entity: str,
+                 identifier: str,
+                 values: Iterable[str],
+                 reference_template: str) -> None:
+        """
+        Fetches the references for the identifier values which aren't kept yet in a single query (unless there are
+        more than BATCH_SIZE of them).
+        :param entity: The name of the entity.
+        :type entity: str
+        :param identifier: The name of the identifier attribute of the entity.
+        :type identifier: str
+        :param values: The values of the identifier.
+        :type values: Iterable[str]
+        :param reference_template: The reference template of the entity.
+        :type reference_template: str
+        :return: None
+        :rtype: None
+        """
+        values = [str(value) for value in values]
+        index = self.get_index(entity, identifier, reference_template)
+        if index:
+            values = [value for value in values if index.get(value) is None]
+
+        with self.lock:
+            missing = list(OrderedDict.fromkeys(value for value in values if (entity, identifier, value, reference_template) not in self.references))
+
+        for start in range(0, len(missing), self.BATCH_SIZE):
+            references = self.fetch(entity, identifier, missing[start:start + self.BATCH_SIZE], reference_template)
+            with self.lock:
+                for value, reference in references.items():
+                    self.references[(entity, identifier, value, reference_template)] = reference
+                    self.references.move_to_end((entity, identifier, value, reference_template))
+                while len(self.references) > self.max_size:
+                    self.references.popitem(last=False)
+
+    def get_index(self,
+                  entity: str,
+                  identifier: str,
+                  reference_template: str) -> Optional[ReferenceIndex]:
+        """
+        Gets the reference index of the entity, building it the first time if the entity is indexed.
+        :param entity: The name of the entity.
+        :type entity: str
+        :param identifier: The name of the identifier attribute of the entity.
+        :type identifier: str
+        :param reference_template: The reference template of the entity.
+        :type reference_template: str
+        :return: The index or None if the entity isn't (or can't be) indexed.
+        :rtype: ReferenceIndex
+        """
+        if not self.is_indexed(entity):
+            return None
+
+        # Entities too large to index are kept as None so they're not counted again
+        index = self.indexes.get(entity, False)
+        if index is None or (index and index.matches(identifier, reference_template)):
+            return index
+
+        with self.index_lock:
+            # Another thread may have built the index while this one waited on the lock
+            index = self.indexes.get(entity, False)
+            if index is False or (index and not index.matches(identifier, reference_template)):
+                index = self.build_index(entity, identifier, reference_template)
+                self.indexes[entity] = index
+                self.save()
+        return index
+
+    def build_index(self,
+                    entity: str,
+                    identifier: str,
+                    reference_template: str) -> Optional[ReferenceIndex]:
+        """
+        Fetches the references of all of the instances of the entity into an index.
+        :param entity: The name of the entity.
+        :type entity: str
+        :param identifier: The name of the identifier attribute of the entity.
+        :type identifier: str
+        :param reference_template: The reference template of the entity.
+        :type reference_template: str
+        :return: The index or None if the entity has too many instances to index.
+        :rtype: ReferenceIndex
+        """
+        primary_table = self.ring.get_entity_by_name(entity).primary_table
+        row_count = self.ring.statistics.get_table_row_count(primary_table) if self.ring.statistics else None
+        if row_count is None and self.ring.statistics:
+            # The statistics haven't been collected yet, so count the table (only once, as the index is kept)
+            row_count = self.ring.statistics.count_table_rows(primary_table)
+        if row_count is None or row_count > self.max_index_rows:
+            return None
+
+        references = self.fetch(entity, identifier, None, reference_template)
+        # Values shared by several instances are left to the lookup by value, which reports them
+        return ReferenceIndex.from_references(identifier, reference_template, {value: reference for value, reference in references.items() if reference is not self.AMBIGUOUS})
+
+    def fetch(self,
+              entity: str,
+              identifier: str,
+              values: Optional[List[str]],
+              reference_template: str) -> dict:
+        """
+        Queries the references for the given identifier values.
+        :param entity: The name of the entity.
+        :type entity: str
+        :param identifier: The name of the identifier attribute of the entity.
+        :type identifier: str
+        :param values: The values of the identifier (or None for every instance of the entity).
+        :type values: List[str]
+        :param reference_template: The reference template of the entity.
+        :type reference_template: str
+        :return: The reference for each of the values found (or AMBIGUOUS if more than one instance has the value).
+        :rtype: dict
+        """
+        analysis_engine = AnalysisEngine.for_ring(self.ring)
+
+        reference_attributes = re.findall(r'\{(\w+)\}', reference_template)
+
+        reference_attribute_steps = {f'|r{i+1}|': f'(retrieve_attribute |1| {attribute})' for i, attribute in enumerate(reference_attributes)}
+        raw_analysis_plan = {
+            '|1|': f'(retrieve_entity {entity})',
+            '|2|': f'(retrieve_attribute |1| \'{identifier}\')',
+            '|4|': f'(collect |2| {" ".join(reference_attribute_steps.keys())})',
+            '|5|': '(return |4|)'
+        }
+        raw_analysis_plan.update(reference_attribute_steps)
+
+        # Parse the analysis plan and build its query
+        analysis_plan = analysis_engine.plan_parser.parse(raw_analysis_plan)
+        query_args = analysis_engine.query_builder_sqr.build_query_arguments_from_sqr_plan(analysis_plan, analysis_engine.ontology)
+        query_args = analysis_engine.query_rewriter_sqr.rewrite(query_args, analysis_engine.ontology)
+
+        with self.ring.db.session() as session:
+            query = analysis_engine.complex_query(query_args, self.ring, session)
+            if values is not None:
+                # The values are bound rather than written into the plan, so they can hold any character
+                identifier_field = query.column_descriptions[0]['expr'].element
+                query = query.filter(identifier_field.in_(values))
+            results = query.all()
+
+        references = {}
+        for result in results:
+            value = str(result[0])
+            reference = reference_template.format(**{attribute_name: attribute_value for attribute_name, attribute_value in zip(reference_attributes, result[1:])})
+            references[value] = self.AMBIGUOUS if value in references else reference
+        return references
+
+    def get_kept_reference(self,
+                           key: tuple):
+        with self.lock:
+            reference = self.references.get(key)
+            if reference is not None:
+                self.references.move_to_end(key)
+            return reference
+
+    def clear(self) -> None:
+        """
+        Forgets the kept references and the reference indexes (e.g. after the data in the ring has changed) so they get
+        fetched again.
+        :return: None
+        :rtype: None
+        """
+        with self.lock:
+            self.references = OrderedDict()
+        with self.index_lock:
+            self.indexes = {}
+            if self.storage_path and os.path.isfile(self.storage_path):
+                os.remove(self.storage_path)
+
+    def save(self) -> None:
+        if not self.storage_path:
+            return
+        os.makedirs(self.storage_dir, exist_ok=True)
+        temp_path = f"{self.storage_path}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({entity: index.to_json() for entity, index in self.indexes.items() if index is not None}, file)
+        os.replace(temp_path, self.storage_path)
+
+    def load(self) -> None:
+        if not self.storage_path or not os.path.isfile(self.storage_path):
+            return
+        try:
+            with open(self.storage_path, 'r') as file:
+                stored = json.load(file)
+            self.indexes = {entity: ReferenceIndex.from_json(index) for entity, index in stored.items()}
+        except (OSError, ValueError, KeyError):
+            return
@@ -0,0 +1,260 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import logging
+import threading
+from contextlib import nullcontext
+from typing import Optional
+
+from sqlalchemy import Column, MetaData, Table, inspect, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.util import ClauseAdapter
+
+from core.PeriodicTask import FileLock
+from core.RingObjects.Ring import Ring
+
+logger = logging.getLogger(__name__)
+
+
+class SampledTable:
+    """
+    A uniform sample of one of the tables of a ring, usable in place of the table's SQL Alchemy model.
+    """
+
+    def __init__(self,
+                 table_name: str,
+                 fraction: float,
+                 name: str,
+                 source_table: Table,
+                 selectable):
+        """
+        :param table_name: The name of the sampled table.
+        :type table_name: str
+        :param fraction: The fraction of the rows of the table in the sample.
+        :type fraction: float
+        :param name: The name the sample goes by in the FROM clause of the query.
+        :type name: str
+        :param source_table: The SQL Alchemy table the sample was taken from.
+        :type source_table: Table
+        :param selectable: The SQL Alchemy selectable (sample table, subquery or table sample) to read from.
+        :type selectable: FromClause
+        """
+        self.table_name = table_name
+        self.fraction = fraction
+        self.name = name
+        self.source_table = source_table
+        self.selectable = selectable
+        self.model = None
+
+    def adapt_clause(self,
+                     clause):
+        """
+        Rewrites the clause (e.g. a join condition) to read the columns of the sampled table from the sample.
+        :param clause: The SQL Alchemy expression.
+        :type clause: ClauseElement
+        :return: The adapted expression.
+        :rtype: ClauseElement
+        """
+        adapter = ClauseAdapter(self.selectable, include_fn=lambda column: getattr(column, 'table', None) is self.source_table, adapt_on_names=True)
+        return adapter.traverse(clause)
+
+
+class RingSampler:
+    """
+    Provides uniform samples of the tables backing a ring for approximate queries.
+    Databases that can sample a table as it's scanned (e.g. Postgres' TABLESAMPLE BERNOULLI) do so, while SQLite reads
+    from a sample table which is built from the full table the first time it's needed. Any other database (or a SQLite
+    database that can't be written to) filters the table on a random number instead.
+    Sample tables are named after the ring version and the collection of the ring's statistics they were taken
+    alongside, so every process sharing the database reads the same tables and moves on to new ones (built the first
+    time one of them needs them) once it has picked up newly collected statistics. Collecting the statistics drops the
+    samples taken before the previous collection, and a query that still finds its sample gone has it rebuilt.
+    """
+
+    # Sample fractions are rounded up to one of these so the precomputed sample tables get reused across requests
+    SAMPLE_FRACTIONS = [0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5]
+
+    def __init__(self,
+                 ring: Ring,
+                 lock_dir: str = None):
+        """
+        :param ring: The compiled ring whose tables are sampled.
+        :type ring: Ring
+        :param lock_dir: The directory of the file locked while building or dropping sample tables (they aren't coordinated with other processes if not given).
+        :type lock_dir: str
+        """
+        self.ring = ring
+        self.lock_dir = lock_dir
+        self.sample_tables = {}
+        self.generation = None
+        self.lock = threading.Lock()
+
+    @property
+    def table_prefix(self) -> str:
+        return f"satyrn_sample__{self.ring.id}_v{self.ring.version}__"
+
+    def get_generation(self,
+                       collected_at: float = None) -> int:
+        """
+        Gets the generation of the sample tables taken alongside the statistics collected at the given time.
+        :param collected_at: When the statistics were collected (the ring's current statistics if not given).
+        :type collected_at: float
+        :return: The generation (0 if the statistics have never been collected).
+        :rtype: int
+        """
+        if collected_at is None and self.ring.statistics:
+            collected_at = self.ring.statistics.collected_at
+        return int(collected_at) if collected_at else 0
+
+    def get_file_lock(self):
+        if not self.lock_dir:
+            return nullcontext()
+        return FileLock(os.path.join(self.lock_dir, f"{self.ring.id}_v{self.ring.version}.samples.lock"))
+
+    def get_sample_fraction(self,
+                            table_name: str,
+                            sample_fraction: float = None,
+                            sample_rows: int = None) -> float:
+        """
+        Gets the fraction of a table to sample, either as requested or so the sample has about the requested number of
+        rows. Fractions above the largest sample fraction mean the full table is read.
+        :param table_name: The name of the table.
+        :type table_name: str
+        :param sample_fraction: The requested fraction of the rows.
+        :type sample_fraction: float
+        :param sample_rows: The requested number of rows (only used if no fraction is requested).
+        :type sample_rows: int
+        :return: The fraction of the table to sample (1.0 for the full table).
+        :rtype: float
+        """
+        if sample_fraction is None:
+            row_count = self.ring.statistics.get_table_row_count(table_name) if self.ring.statistics else None
+            if not row_count or not sample_rows:
+                return 1.0
+            sample_fraction = min(sample_rows / row_count, 1.0)
+        if sample_fraction <= 0 or sample_fraction > 1:
+            raise ValueError(f"Sample fraction must be in (0, 1], got {sample_fraction}")
+        return next((fraction for fraction in self.SAMPLE_FRACTIONS if fraction >= sample_fraction), 1.0)
+
+    def sample_table(self,
+                     table_name: str,
+                     fraction: float) -> Optional[SampledTable]:
+        """
+        Gets a sample of the given table.
+        :param table_name: The name of the table to sample.
+        :type table_name: str
+        :param fraction: The fraction of the rows to sample (one of the SAMPLE_FRACTIONS).
+        :type fraction: float
+        :return: The sample or None if the full table should be read.
+        :rtype: SampledTable
+        """
+        if fraction >= 1:
+            return None
+
+        model = getattr(self.ring.db, table_name)
+        name = f"{self.table_prefix}{self.get_generation()}__{table_name}__{round(fraction * 1000)}"
+        dialect = self.ring.get_dialect()
+        sample = dialect.table_sample(model.__table__, fraction, name)
+        if sample is None and dialect.precompute_samples:
+            sample = self.get_sample_table(table_name, fraction, name)
+        if sample is None:
+            sample = select(model.__table__).where(self.ring.statistics.get_sample_clause(fraction)).subquery(name)
+
+        sampled_table = SampledTable(table_name, fraction, name, model.__table__, sample)
+        sampled_table.model = aliased(model, sample, adapt_on_names=True)
+        return sampled_table
+
+    def get_sample_table(self,
+                         table_name: str,
+                         fraction: float,
+                         name: str) -> Optional[Table]:
+        """
+        Gets the precomputed sample table, building it if no process has built it yet.
+        :param table_name: The name of the table to sample.
+        :type table_name: str
+        :param fraction: The fraction of the rows to sample.
+        :type fraction: float
+        :param name: The name of the sample table.
+        :type name: str
+        :return: The sample table or None if it couldn't be created.
+        :rtype: Table
+        """
+        with self.lock:
+            generation = self.get_generation()
+            if generation != self.generation:
+                # The statistics have been collected (or loaded) since, so the samples of the earlier ones are left behind
+                self.sample_tables = {}
+                self.generation = generation
+            if name not in self.sample_tables:
+                source_table = getattr(self.ring.db, table_name).__table__
+                engine = self.ring.db.eng
+                try:
+                    with self.get_file_lock():
+                        if not inspect(engine).has_table(name):
+                            # Built under a temporary name and renamed, so queries never see a half built sample
+                            temp_name = f"{name}__{os.getpid()}"
+                            sample_query = select(source_table).where(self.ring.statistics.get_sample_clause(fraction))
+                            compiled_query = sample_query.compile(engine, compile_kwargs={"literal_binds": True})
+                            with engine.begin() as connection:
+                                connection.execute(text(f'DROP TABLE IF EXISTS "{temp_name}"'))
+                                connection.execute(text(f'CREATE TABLE "{temp_name}" AS {compiled_query}'))
+                                connection.execute(text(f'ALTER TABLE "{temp_name}" RENAME TO "{name}"'))
+                    self.sample_tables[name] = Table(name, MetaData(), *[Column(column.name, column.type) for column in source_table.columns])
+                except SQLAlchemyError:
+                    # E.g. the database is read only
+                    self.sample_tables[name] = None
+            return self.sample_tables[name]
+
+    def forget_missing_sample_tables(self) -> bool:
+        """
+        Forgets the sample tables this process has used that no longer exist (e.g. because another process dropped
+        them), so they get rebuilt the next time they're needed.
+        :return: Whether any sample tables were missing.
+        :rtype: bool
+        """
+        with self.lock:
+            try:
+                table_names = set(inspect(self.ring.db.eng).get_table_names())
+            except SQLAlchemyError:
+                return False
+            missing = [name for name, sample_table in self.sample_tables.items() if sample_table is not None and name not in table_names]
+            for name in missing:
+                del self.sample_tables[name]
+            return bool(missing)
+
+    def drop_sample_tables(self,
+                           min_generation: int = None) -> None:
+        """
+        Drops the precomputed sample tables of the ring (e.g. after the data in the ring has changed) so they get
+        rebuilt the next time they're needed. Called whenever the ring's statistics are collected.
+        :param min_generation: The oldest generation of samples to keep (all of them are dropped if not given).
+        :type min_generation: int
+        :return: None
+        :rtype: None
+        """
+        with self.lock:
+            engine = self.ring.db.eng
+            try:
+                with self.get_file_lock():
+                    for name in inspect(engine).get_table_names():
+                        if not name.startswith(self.table_prefix):
+                            continue
+                        generation = name[len(self.table_prefix):].partition("__")[0]
+                        if min_generation is None or not generation.isdigit() or int(generation) < min_generation:
+                            with engine.begin() as connection:
+                                connection.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                            self.sample_tables.pop(name, None)
+            except SQLAlchemyError as e:
+                # E.g. the database is read only or another process is reading the sample, it's dropped next time
+                logger.warning("Unable to drop the sample tables of ring %s: %s", self.ring.id, e)
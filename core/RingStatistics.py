@@ -0,0 +1,314 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import distinct, func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.PeriodicTask import PeriodicTask
+from core.RingObjects.Ring import Ring
+
+
+class RingStatistics:
+    """
+    Statistics about the tables backing a ring (row counts along with the distinct counts, null fractions and min/max
+    values of the columns behind each attribute). These are used when planning queries and are stored alongside the
+    ring version so they survive restarts. They're only collected when asked to (e.g. by the refresh schedule), never
+    while planning a query. Processes sharing the storage directory (e.g. the workers of a server) take turns refreshing
+    them, and only the first one due collects them while the others load what it stored.
+    """
+
+    def __init__(self,
+                 ring: Ring,
+                 storage_dir: str = None,
+                 sample_threshold: int = 1000000,
+                 sample_size: int = 100000):
+        """
+        :param ring: The compiled ring whose tables are described.
+        :type ring: Ring
+        :param storage_dir: The directory to store the statistics in (they're only kept in memory if not given).
+        :type storage_dir: str
+        :param sample_threshold: Tables with more rows than this have their column statistics computed over a sample.
+        :type sample_threshold: int
+        :param sample_size: The approximate number of rows to sample from large tables.
+        :type sample_size: int
+        """
+        self.ring = ring
+        self.storage_dir = storage_dir
+        self.sample_threshold = sample_threshold
+        self.sample_size = sample_size
+        self.row_counts = {}
+        self.table_statistics = {}
+        self.collected_at = None
+        self.row_counts_collected_at = None
+        self.lock = threading.RLock()
+        self.refresh_task = None
+
+        self.load()
+
+    @property
+    def storage_path(self) -> Optional[str]:
+        if not self.storage_dir:
+            return None
+        return os.path.join(self.storage_dir, f"{self.ring.id}_v{self.ring.version}.json")
+
+    def get_table_row_count(self,
+                            table_name: str) -> Optional[int]:
+        """
+        Gets the number of rows in the given table as of the last collection of the row counts.
+        :param table_name: The name of the table in the ring's data source.
+        :type table_name: str
+        :return: The number of rows in the table or None if it hasn't been (or couldn't be) counted.
+        :rtype: int
+        """
+        return self.row_counts.get(table_name)
+
+    def count_table_rows(self,
+                         table_name: str) -> Optional[int]:
+        """
+        Counts the rows in a single table (for one-off uses like deciding whether to index a table, not query planning).
+        :param table_name: The name of the table in the ring's data source.
+        :type table_name: str
+        :return: The number of rows in the table or None if it couldn't be counted.
+        :rtype: int
+        """
+        model = getattr(self.ring.db, table_name, None)
+        try:
+            with self.ring.db.eng.connect() as connection:
+                return connection.execute(select(func.count()).select_from(model.__table__)).scalar()
+        except (AttributeError, SQLAlchemyError):
+            return None
+
+    def get_column_statistics(self,
+                              table_name: str,
+                              column_name: str) -> Optional[Dict]:
+        """
+        Gets the statistics collected for a column.
+        :param table_name: The name of the table in the ring's data source.
+        :type table_name: str
+        :param column_name: The name of the column.
+        :type column_name: str
+        :return: The distinct count, null fraction, min and max of the column (or None if not collected).
+        :rtype: dict
+        """
+        return self.table_statistics.get(table_name, {}).get("columns", {}).get(column_name)
+
+    def get_attribute_statistics(self,
+                                 entity_name: str,
+                                 attribute_name: str) -> Optional[Dict]:
+        """
+        Gets the statistics collected for the column backing the attribute of an entity.
+        :param entity_name: The name of the entity.
+        :type entity_name: str
+        :param attribute_name: The name of the attribute.
+        :type attribute_name: str
+        :return: The distinct count, null fraction, min and max of the attribute (or None if not collected).
+        :rtype: dict
+        """
+        attr_obj = self.ring.get_entity_by_name(entity_name).attributes.get(attribute_name)
+        if not attr_obj or not attr_obj.source_table or not attr_obj.source_columns:
+            return None
+        return self.get_column_statistics(attr_obj.source_table, attr_obj.source_columns[0])
+
+    def collect_row_counts(self) -> Dict[str, Optional[int]]:
+        """
+        Counts the rows in each of the tables of the ring's data source.
+        :return: The row count for each table name.
+        :rtype: Dict[str, Optional[int]]
+        """
+        with self.lock:
+            row_counts = {}
+            with self.ring.db.eng.connect() as connection:
+                for table in self.ring.data_source.tables:
+                    model = getattr(self.ring.db, table['name'], None)
+                    try:
+                        row_counts[table['name']] = connection.execute(select(func.count()).select_from(model.__table__)).scalar()
+                    except (AttributeError, SQLAlchemyError):
+                        row_counts[table['name']] = None
+
+            self.row_counts = row_counts
+            self.row_counts_collected_at = time.time()
+            return self.row_counts
+
+    def collect(self) -> Dict:
+        """
+        Collects the row counts and the column statistics for every attribute of the ring and stores them.
+        :return: The collected statistics.
+        :rtype: dict
+        """
+        with self.lock:
+            previous_collected_at = self.collected_at
+            self.collect_row_counts()
+
+            table_statistics = {}
+            with self.ring.db.eng.connect() as connection:
+                for table_name, column_names in self.get_attribute_columns().items():
+                    try:
+                        table_statistics[table_name] = self.collect_table_statistics(connection, table_name, column_names)
+                    except (AttributeError, SQLAlchemyError) as e:
+                        table_statistics[table_name] = {"error": str(e), "columns": {}}
+
+            self.table_statistics = table_statistics
+            self.collected_at = time.time()
+            self.save()
+
+        # The precomputed samples were taken from the data as it was before, so they're rebuilt from the current data.
+        # Only the ones before the previous collection are dropped since other processes may still be reading those
+        if self.ring.sampler:
+            self.ring.sampler.drop_sample_tables(min_generation=self.ring.sampler.get_generation(previous_collected_at))
+        return self.to_json()
+
+    def collect_table_statistics(self,
+                                 connection,
+                                 table_name: str,
+                                 column_names: List[str]) -> Dict:
+        """
+        Computes the statistics for the given columns of a table in a single scan (over a sample for large tables).
+        :param connection: An open connection to the ring's database.
+        :type connection: Connection
+        :param table_name: The name of the table.
+        :type table_name: str
+        :param column_names: The columns to compute statistics for.
+        :type column_names: List[str]
+        :return: The statistics for the table and its columns.
+        :rtype: dict
+        """
+        table = getattr(self.ring.db, table_name).__table__
+        columns = [table.c[column_name] for column_name in column_names if column_name in table.c]
+
+        aggregates = [func.count()]
+        for column in columns:
+            aggregates.extend([func.count(column), func.count(distinct(column)), func.min(column), func.max(column)])
+        query = select(*aggregates).select_from(table)
+
+        row_count = self.row_counts.get(table_name)
+        sample_fraction = None
+        if row_count and row_count > self.sample_threshold:
+            sample_fraction = self.sample_size / row_count
+            query = query.where(self.get_sample_clause(sample_fraction))
+
+        row = connection.execute(query).fetchone()
+        sampled_rows = row[0]
+        column_statistics = {}
+        for idx, column in enumerate(columns):
+            non_null, distinct_count, min_value, max_value = row[1 + 4 * idx: 5 + 4 * idx]
+            if sample_fraction and non_null and distinct_count > 0.9 * non_null:
+                # A (nearly) unique column keeps growing its distinct count with the number of rows, so scale it up
+                distinct_count = round(distinct_count / sample_fraction)
+            column_statistics[column.name] = {
+                "distinct_count": distinct_count,
+                "null_fraction": 1 - non_null / sampled_rows if sampled_rows else None,
+                "min": min_value,
+                "max": max_value
+            }
+
+        return {
+            "row_count": row_count,
+            "sample_fraction": sample_fraction,
+            "columns": column_statistics
+        }
+
+    def get_attribute_columns(self) -> Dict[str, List[str]]:
+        """
+        Gets the columns backing the attributes of the ring, grouped by table.
+        :return: The column names for each table name.
+        :rtype: Dict[str, List[str]]
+        """
+        columns = defaultdict(list)
+        for entity in self.ring.entities:
+            for attr_name, attr_obj in entity.attributes.base_items():
+                if attr_obj.source_table and attr_obj.source_columns and attr_obj.source_columns[0] not in columns[attr_obj.source_table]:
+                    columns[attr_obj.source_table].append(attr_obj.source_columns[0])
+        return dict(columns)
+
+    def get_sample_clause(self,
+                          fraction: float):
+        """
+        Builds a WHERE clause that keeps each row with the given probability.
+        :param fraction: The fraction of rows to keep.
+        :type fraction: float
+        :return: The SQL Alchemy boolean expression.
+        :rtype: BinaryExpression
+        """
+        return self.ring.get_dialect().random_clause(fraction)
+
+    def refresh(self,
+                min_age: float) -> None:
+        """
+        Collects the statistics unless they were collected (e.g. by another process sharing the storage directory) less
+        than min_age seconds ago, in which case the stored ones are loaded.
+        :param min_age: The number of seconds the statistics are kept after being collected.
+        :type min_age: float
+        :return: None
+        :rtype: None
+        """
+        with self.lock:
+            self.load()
+            if self.collected_at is not None and time.time() - self.collected_at < min_age:
+                return
+            self.collect()
+
+    def start_refresh_schedule(self,
+                               interval: float) -> None:
+        """
+        Refreshes the statistics every interval seconds on a background thread, starting right away (which only
+        collects them if the stored ones are more than half an interval old).
+        :param interval: The number of seconds between refreshes.
+        :type interval: float
+        :return: None
+        :rtype: None
+        """
+        if not self.refresh_task:
+            self.refresh_task = PeriodicTask(f"ring-statistics-{self.ring.id}-v{self.ring.version}",
+                                             interval,
+                                             lambda: self.refresh(interval / 2),
+                                             run_immediately=True,
+                                             lock_path=f"{self.storage_path}.lock" if self.storage_path else None)
+        self.refresh_task.start()
+
+    def to_json(self) -> Dict:
+        return {
+            "ring_id": self.ring.id,
+            "ring_version": self.ring.version,
+            "collected_at": self.collected_at,
+            "row_counts_collected_at": self.row_counts_collected_at,
+            "row_counts": self.row_counts,
+            "tables": self.table_statistics
+        }
+
+    def save(self) -> None:
+        if not self.storage_path:
+            return
+        os.makedirs(self.storage_dir, exist_ok=True)
+        temp_path = f"{self.storage_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(self.to_json(), file, default=str)
+        os.replace(temp_path, self.storage_path)
+
+    def load(self) -> None:
+        if not self.storage_path or not os.path.isfile(self.storage_path):
+            return
+        try:
+            with open(self.storage_path, 'r') as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return
+        self.collected_at = stored.get("collected_at")
+        self.row_counts_collected_at = stored.get("row_counts_collected_at")
+        self.row_counts = stored.get("row_counts", {})
+        self.table_statistics = stored.get("tables", {})
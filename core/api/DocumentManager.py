@@ -28,10 +28,10 @@ class DocumentManager:
                  operation_ontology: OperationOntology,
                  statement_generation_mode: GenerationMode = GenerationMode.OneStatementPerPlan,
                  qa_index_path: Optional[str] = None,
-                 language_model = GPT4Interface(),
+                 language_model = None,
                  plan_statement_generator = StatementGenerator):
         self.ring = ring
         self.operation_ontology = operation_ontology
-        self.analysis_engine = AnalysisEngine(self.ring)
+        self.analysis_engine = AnalysisEngine.for_ring(self.ring)
         self.language_model = language_model
         self.plan_statement_generator = plan_statement_generator(self.ring, self.operation_ontology, mode=statement_generation_mode)
@@ -10,45 +10,58 @@ You should have received a copy of the GNU General Public License along with Sat
 If not, see <https://www.gnu.org/licenses/>.
 '''
 
-# SQL functions to be able to work in postres and sqlite
+# SQL functions to be able to work across databases (the differences are handled by the dialect of each database)
 
 from typing import List
-from sqlalchemy import func, Date, cast
 from functools import reduce
 from sqlalchemy.sql.expression import case, Case
 
+from core.Dialects.Dialect import Dialect
+from core.Dialects.SQLiteDialect import SQLiteDialect
+from core.Dialects.PostgresDialect import PostgresDialect
+from core.Dialects.DuckDBDialect import DuckDBDialect
+
+DIALECTS = {
+    "sqlite": SQLiteDialect,
+    "csv": SQLiteDialect,
+    "postgres": PostgresDialect,
+    "duckdb": DuckDBDialect
+}
+
+# Dialects (without a database to check capabilities against) for building SQL given just the type of database
+_dialects = {}
+
+def create_dialect(db_type: str) -> Dialect:
+    # Any other type of database gets standard SQL
+    return DIALECTS[db_type]() if db_type in DIALECTS else Dialect(db_type)
+
+def get_dialect(db_type: str) -> Dialect:
+    if db_type not in _dialects:
+        _dialects[db_type] = create_dialect(db_type)
+    return _dialects[db_type]
+
 def sql_right(field, db_type: str, char_n: int=2):
     # Given a sqlalchemy string field, return the last char_n chars
-    if db_type == "sqlite":
-        return func.substr(field, -2, 2)
-    elif db_type == "postgres":
-        return func.right(field, 2)
+    return get_dialect(db_type).right(field, char_n)
 
 def sql_concat(field_lst: List[Case], db_type: str):
     # concatenating strings together
     if len(field_lst) == 1:
         return field_lst[0]
 
-    if db_type == "sqlite":
-        return reduce(lambda a, b: a + b, field_lst, "")
-
-    elif db_type == "postgres":
-        return reduce(lambda a, b: a + b, field_lst, "")
-        # return func.concatenate(field_lst)
+    # + compiles to the concatenation operator of each database
+    return reduce(lambda a, b: a + b, field_lst, "")
 
 def sql_median(field, db_type):
-    # Given a sqlalchemy string field, return the last char_n chars
-    if db_type == "sqlite":
-        return func.median(field)
-    elif db_type == "postgres":
-        return func.percentile_disc(0.5).within_group(field.asc())
+    return get_dialect(db_type).median(field)
 
 def nan_cast(field, cast_val):
     # Casts a field in case it is a null value
     return case([(field == None, cast_val)], else_=field)
 
 def date_cast(field, db_type):
-    if db_type == "sqlite":
-        return func.DATE(field)
-    elif db_type == "postgres":
-        return cast(field, Date)
+    return get_dialect(db_type).date_cast(field)
+
+def sql_extract(field: str, column, db_type: str):
+    # Extracts a part (e.g. the year) of a date or datetime column
+    return get_dialect(db_type).extract(field, column)
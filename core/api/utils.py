@@ -15,8 +15,6 @@ import json
 
 from typing import List, Tuple, Optional, Any, Match
 
-from langchain.docstore.document import Document
-
 def parse_ref_string(ref_str: str) -> Tuple[list, list]:
     """
 
@@ -168,7 +166,10 @@ def concatenate_sentences_from_json(input_json_paths: List[str],
     return '\n'.join(sentences)
 
 def create_texts_from_json(input_json_path: str,
-                           metadata_name: str) -> List[Document]:
+                           metadata_name: str) -> List['Document']:
+    # langchain takes seconds to import and is only needed here, so it's imported on first use
+    from langchain.docstore.document import Document
+
     with open(input_json_path) as file:
         data = json.load(file)
 
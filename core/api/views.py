@@ -9,12 +9,14 @@ See the GNU General Public License for more details.
 You should have received a copy of the GNU General Public License along with Satyrn. 
 If not, see <https://www.gnu.org/licenses/>.
 '''
+import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Blueprint, current_app, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from flask_cors import cross_origin
 
-from .viewHelpers import api_key_check, get_or_create_ring
+from .viewHelpers import api_key_check, error_gen, get_or_create_ring
 from core.Analysis.AnalysisEngine import AnalysisEngine
 from core.Analysis.OperationOntology import OperationOntology
 from core.LanguageGeneration.GPT35Interface import GPT35Interface
@@ -22,20 +24,23 @@ from core.LanguageGeneration.GPT4Interface import GPT4Interface
 from core.LanguageGeneration.Mixtral8x7BInterface import Mixtral8x7BInterface
 from core.LanguageGeneration.CodeInterpreterInterface import CodeInterpreterInterface
 from core.LanguageGeneration.StableBelugaInterface import StableBelugaInterface
+from core.LanguageGeneration.LanguageModel import LanguageModel
+from core.LanguageGeneration.LanguageModelCache import CachedLanguageModel, LanguageModelCache
 from core.Planning.StatementGenerator import StatementGenerator, GenerationMode
 from core.Planning.StatementGeneratorTemplateBased import StatementGeneratorTemplateBased
 from core.api.DocumentManager import DocumentManager
 from core.Planning.SQRComposer import SQRComposer
+from core.Planning.PlanCompositionCache import ComposedPlan, ComposedReport, PlanCompositionCache
 from core.Document.Blueprints.SQRPlanFiller import SQRPlanFiller
 from core.Analysis.AnalysisPlan import AnalysisPlan
+from core.RingObjects.Ring import Ring
 from core.Document.Blueprints.RankingBlueprint import RankingBlueprint
 from core.Document.Blueprints.ComparativeBenchmarkBlueprint import ComparativeBenchmarkBlueprint
 from core.Document.Blueprints.TimeOverTimeBlueprint import TimeOverTimeBlueprint
 from core.Operations.ArgType import ArgType
 from prettytable import PrettyTable
 
-from functools import reduce
-from typing import Dict, Tuple
+from typing import Dict, Iterator, List, Tuple
 
 # # some "local globals"
 app = current_app # this is now the same app instance as defined in appBundler.py
@@ -72,25 +77,169 @@ def analysis(ring_id: str,
         # ring will now be an error message
         return json.dumps(ring)
 
-    # Init the analysis engine
-    analysis_engine = AnalysisEngine(ring)
-
     # The analysis plan come in via a JSON body
     raw_analysis_plan = request.json
 
-    # Parse the analysis plan
+    try:
+        approximate, sample_fraction, sample_rows = get_approximation_arguments()
+        results = run_analysis_plan(ring, raw_analysis_plan, approximate, sample_fraction, sample_rows)
+    except ValueError as e:
+        # Bad sampling arguments or an SQR syntax error (SQRSyntaxError is a ValueError)
+        return error_gen(e)
+
+    # doing jsonify here manages the mimetype
+    return jsonify(results)
+
+@api.route("/sqr_analysis_batch/<ring_id>/<version>/", methods=["POST"])
+@cross_origin(supports_credentials=True)
+@api_key_check
+def analysis_batch(ring_id: str,
+                   version: str) -> Dict:
+    """
+    Runs many SQR plans in one request (e.g. all of the plans needed to render a page).
+    The JSON body is a list of plans (or {"plans": [...]}). Identical plans are only run once and the distinct plans are
+    run concurrently, each on its own session from the ring's connection pool. Sampling arguments in the query string
+    apply to every plan (see /sqr_analysis).
+    :param ring_id: The ID of the ring.
+    :type ring_id: str
+    :param version: The ring version.
+    :type version: str
+    :return: The results (or the error) of each plan, in the order the plans were given.
+    :rtype: dict
+    """
+    ring = get_or_create_ring(ring_id, version)
+    if type(ring) is tuple:
+        # ring will now be an error message
+        return json.dumps(ring)
+
+    raw_analysis_plans = request.json.get("plans") if isinstance(request.json, dict) else request.json
+    if not isinstance(raw_analysis_plans, list) or not raw_analysis_plans:
+        return error_gen("Expected a non-empty list of SQR plans")
+    max_plans = int(os.environ.get("SATYRN_BATCH_MAX_PLANS", 100))
+    if len(raw_analysis_plans) > max_plans:
+        return error_gen(f"A batch can have at most {max_plans} plans, got {len(raw_analysis_plans)}")
+
+    try:
+        approximate, sample_fraction, sample_rows = get_approximation_arguments()
+    except ValueError as e:
+        return error_gen(e)
+
+    # Only run each distinct plan once
+    plan_keys = [json.dumps(raw_analysis_plan, sort_keys=True) for raw_analysis_plan in raw_analysis_plans]
+    distinct_plans = dict(zip(plan_keys, raw_analysis_plans))
+
+    def run_plan(raw_analysis_plan: Dict) -> Dict:
+        try:
+            return {"success": True, **run_analysis_plan(ring, raw_analysis_plan, approximate, sample_fraction, sample_rows)}
+        except Exception as e:
+            # One failing plan shouldn't fail the rest of the batch
+            return {"success": False, "message": str(e)}
+
+    max_workers = min(int(os.environ.get("SATYRN_BATCH_MAX_WORKERS", 4)), len(distinct_plans))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqr-analysis-batch") as executor:
+        results = dict(zip(distinct_plans.keys(), executor.map(run_plan, distinct_plans.values())))
+
+    return jsonify({
+        "success": True,
+        "results": [results[plan_key] for plan_key in plan_keys]
+    })
+
+def get_approximation_arguments() -> Tuple[bool, float, int]:
+    """
+    Reads the sampling arguments of an analysis request from the query string
+    (e.g. ?approximate=true&sample_rows=100000 or ?sample_fraction=0.01).
+    :return: Whether to approximate, the fraction of the tables to sample and the number of rows to sample.
+    :rtype: Tuple[bool, float, int]
+    """
+    try:
+        sample_fraction = float(request.args["sample_fraction"]) if "sample_fraction" in request.args else None
+        sample_rows = int(request.args.get("sample_rows", 100000))
+    except ValueError:
+        raise ValueError("sample_fraction must be a number and sample_rows must be an integer")
+    if sample_fraction is not None and not 0 < sample_fraction <= 1:
+        raise ValueError("sample_fraction must be greater than 0 and at most 1")
+    approximate = request.args.get("approximate", "false").lower() == "true" or sample_fraction is not None or "sample_rows" in request.args
+    return approximate, sample_fraction, sample_rows
+
+def run_analysis_plan(ring: Ring,
+                      raw_analysis_plan: Dict,
+                      approximate: bool = False,
+                      sample_fraction: float = None,
+                      sample_rows: int = None) -> Dict:
+    """
+    Parses and runs an SQR plan on a session of its own.
+    :param ring: The ring to run the plan against.
+    :type ring: Ring
+    :param raw_analysis_plan: The SQR plan.
+    :type raw_analysis_plan: dict
+    :return: The JSON-ready results of the plan.
+    :rtype: dict
+    """
+    analysis_engine = AnalysisEngine.for_ring(ring)
     analysis_plan = analysis_engine.plan_parser.parse(raw_analysis_plan)
 
-    # Run the analysis
-    results = analysis_engine.sqr_single_ring_analysis(analysis_plan, ring, ring.db.session())
+    with ring.db.session() as session:
+        results = analysis_engine.sqr_single_ring_analysis(analysis_plan, ring, session, approximate=approximate, sample_fraction=sample_fraction, sample_rows=sample_rows)
 
-    if "score" in results:
-        results["score"] = results["score"]
     # this next line is a bit of a hack to deal with un-jsonable things by coercing them
     # to strings without having to write quick managers for every possible type (date, datetime, int64, etc)
-    results = json.loads(json.dumps(results, default=str))
-    # doing jsonify here manages the mimetype
-    return jsonify(results)
+    return json.loads(json.dumps(results, default=str))
+
+@api.route("/ring_statistics/<ring_id>/<version>/", methods=["GET"])
+@cross_origin(supports_credentials=True)
+@api_key_check
+def ring_statistics(ring_id: str,
+                    version: str) -> Dict:
+    """
+    Gets the table and attribute statistics collected for a ring (collecting them first if requested via ?refresh=true).
+    :param ring_id: The ID of the ring.
+    :type ring_id: str
+    :param version: The ring version.
+    :type version: str
+    :return: A dictionary of the row counts and column statistics for each table.
+    :rtype: dict
+    """
+
+    ring = get_or_create_ring(ring_id, version)
+    if type(ring) is tuple:
+        # ring will now be an error message
+        return json.dumps(ring)
+
+    if request.args.get("refresh", "false").lower() == "true" or ring.statistics.collected_at is None:
+        statistics = ring.statistics.collect()
+    else:
+        statistics = ring.statistics.to_json()
+
+    # Add which column each attribute is backed by so the statistics can be looked up by attribute
+    statistics["attributes"] = {entity.name: {attr_name: {"table": attr_obj.source_table, "column": attr_obj.source_columns[0] if attr_obj.source_columns else None}
+                                              for attr_name, attr_obj in entity.attributes.base_items()}
+                                for entity in ring.entities}
+    return jsonify(json.loads(json.dumps(statistics, default=str)))
+
+@api.route("/llm_cache/", methods=["GET"])
+@cross_origin(supports_credentials=True)
+@api_key_check
+def llm_cache_statistics() -> Dict:
+    """
+    Gets the size and hit metrics of the language model response cache (clearing it first if requested via ?clear=true).
+    :return: A dictionary of the number of responses kept and the hits, misses, expirations and evictions.
+    :rtype: dict
+    """
+    llm_cache = LanguageModelCache.get_instance()
+    if request.args.get("clear", "false").lower() == "true":
+        llm_cache.clear()
+    return jsonify(llm_cache.to_json())
+
+@api.route("/llm_metrics/", methods=["GET"])
+@cross_origin(supports_credentials=True)
+@api_key_check
+def llm_metrics() -> Dict:
+    """
+    Gets the request, retry, latency and token usage metrics of each language model backend.
+    :return: A dictionary of the metrics for each backend.
+    :rtype: dict
+    """
+    return jsonify(LanguageModel.get_metrics())
 
 @api.route("/generate_report/<ring_id>/<version>/", methods=["GET", "POST"])
 @api_key_check
@@ -99,6 +248,69 @@ def generate_report(ring_id, version):
     # Get the request dictionary out of the JSON body
     request_dict = request.json if request.content_type == "application/json" else {}
 
+    for event in generate_report_events(ring_id, version, request_dict):
+        if event['event'] == 'error':
+            return event['message']
+        elif event['event'] == 'report':
+            return {key: event[key] for key in ('plans', 'facts', 'prompt', 'report')}
+
+@api.route("/generate_report_stream/<ring_id>/<version>/", methods=["GET", "POST"])
+@api_key_check
+def generate_report_stream(ring_id, version):
+    """
+    Generates a report like generate_report, but streams it back as each part of it is ready: an event with the results
+    and factual statements of each plan as soon as it has run, then the prompt, the tokens of the report as the language
+    model generates them and finally the whole report. The events are newline delimited JSON objects with an "event" key
+    ("plan", "prompt", "token", "report" or "error"), or server-sent events if requested with ?format=sse or an Accept
+    header of text/event-stream.
+    :param ring_id: The ID of the ring.
+    :type ring_id: str
+    :param version: The ring version.
+    :type version: str
+    :return: The streamed response.
+    :rtype: Response
+    """
+
+    # Get the request dictionary out of the JSON body
+    request_dict = request.json if request.content_type == "application/json" else {}
+    use_sse = request.args.get("format") == "sse" or "text/event-stream" in request.headers.get("Accept", "")
+
+    def serialize(event: Dict) -> str:
+        data = json.dumps(event, default=str)
+        return f"event: {event['event']}\ndata: {data}\n\n" if use_sse else data + "\n"
+
+    def stream_events():
+        try:
+            for event in generate_report_events(ring_id, version, request_dict, stream=True):
+                yield serialize(event)
+        except Exception as e:
+            # The response has already started, so the error is reported as the last event
+            yield serialize({"event": "error", "message": str(e)})
+
+    return Response(stream_with_context(stream_events()),
+                    mimetype="text/event-stream" if use_sse else "application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def generate_report_events(ring_id: str,
+                           version: str,
+                           request_dict: Dict,
+                           stream: bool = False) -> Iterator[Dict]:
+    """
+    Generates a report, yielding an event for each part of it as it's ready (see generate_report_stream). Unless
+    streaming, all the plans are run before any of their statements are generated so the references in their results
+    are looked up together, and the report is generated in one go.
+    :param ring_id: The ID of the ring.
+    :type ring_id: str
+    :param version: The ring version.
+    :type version: str
+    :param request_dict: The report request.
+    :type request_dict: Dict
+    :param stream: Whether to generate the statements of each plan as soon as it has run and stream the report's tokens.
+    :type stream: bool
+    :return: The events, ending with a "report" event holding the plans, facts, prompt and report.
+    :rtype: Iterator[Dict]
+    """
+
     # Given a dict with:
     # {
     #     "report_type": "<report_type>",
@@ -118,10 +330,11 @@ def generate_report(ring_id, version):
     # }
 
     if not request_dict:
-        return "No request provided."
+        yield {"event": "error", "message": "No request provided."}
+        return
 
     ring = get_or_create_ring(ring_id, version)
-    operation_ontology = OperationOntology()
+    operation_ontology = OperationOntology.get_instance()
     llm = None
     if 'llm' in request_dict and request_dict['llm'] == 'gpt4':
         llm = GPT4Interface()
@@ -131,21 +344,27 @@ def generate_report(ring_id, version):
         llm = StableBelugaInterface()
     elif 'llm' in request_dict and request_dict['llm'] == 'mistral':
         if not request_dict['llm_url']:
-            return "Please provide 'llm_url' for Mistral."
+            yield {"event": "error", "message": "Please provide 'llm_url' for Mistral."}
+            return
         llm = Mixtral8x7BInterface(request_dict['llm_url'])
     elif 'llm' in request_dict and request_dict['llm'] == 'mixtral':
         if not request_dict['llm_url']:
-            return "Please provide 'llm_url' for Mixtral."
+            yield {"event": "error", "message": "Please provide 'llm_url' for Mixtral."}
+            return
         llm = Mixtral8x7BInterface(request_dict['llm_url'])
     elif 'llm' in request_dict and request_dict['llm'] == 'code_interpreter':
         llm = CodeInterpreterInterface(ring.name)
+
+    # Reuse the responses to prompts that have been given before (the code interpreter keeps a conversation, so isn't cached)
+    if llm and not isinstance(llm, CodeInterpreterInterface) and LanguageModelCache.is_enabled():
+        llm = CachedLanguageModel(llm, LanguageModelCache.get_instance())
     doc_manager = DocumentManager(ring,
                                   operation_ontology,
                                   statement_generation_mode=GenerationMode.OneStatementPerPlan,
                                   language_model=llm,
                                   plan_statement_generator=StatementGeneratorTemplateBased if request_dict['statement_generation_method'] == 'template' else StatementGenerator)
     sqr_composer = SQRComposer(ring, operation_ontology)
-    plan_filler = SQRPlanFiller(ring)
+    plan_filler = SQRPlanFiller(ring, doc_manager.analysis_engine.plan_parser)
 
     # Extract some directions used in the reports
     metric_sort_direction = 'desc'
@@ -178,55 +397,51 @@ def generate_report(ring_id, version):
 
     metric_set_filter = request_dict['metric_set_filter'] if 'metric_set_filter' in request_dict else {}
 
-    if report_type == RankingBlueprint:
-        report = report_type(request_dict['entity_name'],
-                             request_dict['entity_instance_identifier_attribute_name'],
-                             request_dict['entity_instance_identifier_value'],
-                             entity_reference,
-                             request_dict['metric_entity_name'],
-                             request_dict['metric_attribute_name'],
-                             request_dict['metric_aggregation'],
-                             metric_set_filter,
-                             metric_sort_direction,
-                             metric_preference_direction,
-                             ring)
-    elif report_type == ComparativeBenchmarkBlueprint:
-        report = report_type(request_dict['entity_name'],
-                             request_dict['entity_instance_identifier_attribute_name'],
-                             request_dict['entity_instance_identifier_value'],
-                             entity_reference,
-                             request_dict['metric_entity_name'],
-                             request_dict['metric_attribute_name'],
-                             request_dict['metric_aggregation'],
-                             metric_set_filter,
-                             metric_sort_direction,
-                             metric_preference_direction,
-                             request_dict['benchmark_target'],
-                             ring)
-    elif report_type == TimeOverTimeBlueprint:
-        report = report_type(request_dict['entity_name'],
-                             request_dict['entity_instance_identifier_attribute_name'],
-                             request_dict['entity_instance_identifier_value'],
-                             entity_reference,
-                             request_dict['metric_entity_name'],
-                             request_dict['metric_attribute_name'],
-                             request_dict['metric_aggregation'],
-                             metric_set_filter,
-                             metric_preference_direction,
-                             request_dict['time_attribute_name'],
-                             request_dict['time_zero'],
-                             request_dict['time_one'],
-                             ring)
-    else:
-        raise ValueError(f"Unknown report type being requested: {request_dict['report_type']}")
-
-    # Get the list of {"plan_name": ..., "base_plan": ..., "access_plans": ..., "slot_fillers": ...}
-    composition_specs = report.get_plan_composition_specs()
+    def build_report(entity_instance_identifier_value: str,
+                     entity_reference: str):
+        if report_type == RankingBlueprint:
+            return report_type(request_dict['entity_name'],
+                               request_dict['entity_instance_identifier_attribute_name'],
+                               entity_instance_identifier_value,
+                               entity_reference,
+                               request_dict['metric_entity_name'],
+                               request_dict['metric_attribute_name'],
+                               request_dict['metric_aggregation'],
+                               metric_set_filter,
+                               metric_sort_direction,
+                               metric_preference_direction,
+                               ring)
+        elif report_type == ComparativeBenchmarkBlueprint:
+            return report_type(request_dict['entity_name'],
+                               request_dict['entity_instance_identifier_attribute_name'],
+                               entity_instance_identifier_value,
+                               entity_reference,
+                               request_dict['metric_entity_name'],
+                               request_dict['metric_attribute_name'],
+                               request_dict['metric_aggregation'],
+                               metric_set_filter,
+                               metric_sort_direction,
+                               metric_preference_direction,
+                               request_dict['benchmark_target'],
+                               ring)
+        elif report_type == TimeOverTimeBlueprint:
+            return report_type(request_dict['entity_name'],
+                               request_dict['entity_instance_identifier_attribute_name'],
+                               entity_instance_identifier_value,
+                               entity_reference,
+                               request_dict['metric_entity_name'],
+                               request_dict['metric_attribute_name'],
+                               request_dict['metric_aggregation'],
+                               metric_set_filter,
+                               metric_preference_direction,
+                               request_dict['time_attribute_name'],
+                               request_dict['time_zero'],
+                               request_dict['time_one'],
+                               ring)
+        else:
+            raise ValueError(f"Unknown report type being requested: {request_dict['report_type']}")
 
-    # Remove any empty access plan filters from the composition specs
-    for spec in composition_specs:
-        for access_plan_ref, access_plan_spec in spec['access_plans'].items():
-            access_plan_spec['access_plan_filters']['filters'] = list(filter(None, access_plan_spec['access_plan_filters']['filters']))
+    report = build_report(request_dict['entity_instance_identifier_value'], entity_reference)
 
     def fill_and_compose(composition_specification: Dict) -> Tuple[AnalysisPlan, Dict]:
 
@@ -239,18 +454,14 @@ def generate_report(ring_id, version):
         }
 
         # Produce the base_plan
-        base_plan_steps = doc_manager.analysis_engine.plan_parser.create_analysis_steps(composition_specification['base_plan']['plan_template'])
-        base_plan_steps = plan_filler.fill_plan(base_plan_steps, composition_specification['slot_fillers'])
+        base_plan_steps = plan_filler.fill_plan_template(composition_specification['base_plan']['plan_template'], composition_specification['slot_fillers'])
         final_spec["base_plan"] = base_plan_steps
 
         # Produce the access_plans
         for access_plan_ref, access_plan_spec in composition_specification["access_plans"].items():
 
-            # Parse the raw plan into AnalysisStep objects
-            access_plan_steps = doc_manager.analysis_engine.plan_parser.create_analysis_steps(access_plan_spec['access_plan'])
-
-            # Fill in the plans with the specified slot fillers
-            access_plan_steps = plan_filler.fill_plan(access_plan_steps, composition_specification['slot_fillers'])
+            # Fill in the (compiled) access plan with the specified slot fillers
+            access_plan_steps = plan_filler.fill_plan_template(access_plan_spec['access_plan'], composition_specification['slot_fillers'])
 
             # Parse the raw SQR filters into AnalysisStep objects and compose them into a single filtering plan
             parsed_access_plan_filters = [doc_manager.analysis_engine.plan_parser.create_analysis_steps(filter_plan) for filter_plan in access_plan_spec["access_plan_filters"]["filters"]]
@@ -270,65 +481,118 @@ def generate_report(ring_id, version):
 
         return composed_plan, slots_to_ref
 
-    # Generate the plans and gather useful metadata for generating factual statements
-    plans_and_metadata = []
-    for spec in composition_specs:
-        # Gather all the info
-        composed_plan, slots_to_ref = fill_and_compose(spec)
-        base_plan_name = spec['plan_name']
-        slot_fillers = spec['slot_fillers']
-
-        # Gather the info
-        plans_and_metadata.append({
-            "plan": composed_plan,
-            "base_plan_name": base_plan_name,
-            "slot_fillers": slot_fillers,
-            "slots_to_ref": slots_to_ref,
-            "results": None
-        })
-
-    # Perform the analysis
-    all_results = [doc_manager.analysis_engine.sqr_single_ring_analysis(plan['plan'], doc_manager.ring, doc_manager.ring.db.session()) for plan in plans_and_metadata]
-
-    for plan, result in zip(plans_and_metadata, all_results):
-        plan['results'] = result
-        plan['plan'].result = result
-
-    # Generate statement_templates and fill with results
-    if request_dict['statement_generation_method'] == 'recursive':
-        # Express these plans in natural language by generating a template where the results can be slotted in
-        statement_templates = [doc_manager.plan_statement_generator.generate_statement_template_from_plan(p['plan']) for p in plans_and_metadata]
-        factual_statements = reduce(
-            lambda a, plans_and_template: a + doc_manager.plan_statement_generator.fill_result(*plans_and_template),
-            zip([p['plan'] for p in plans_and_metadata], statement_templates), [])
+    def compose_report(report_to_compose) -> ComposedReport:
+        # Get the list of {"plan_name": ..., "base_plan": ..., "access_plans": ..., "slot_fillers": ...}
+        composition_specs = report_to_compose.get_plan_composition_specs()
+
+        # Remove any empty access plan filters from the composition specs
+        for spec in composition_specs:
+            for access_plan_ref, access_plan_spec in spec['access_plans'].items():
+                access_plan_spec['access_plan_filters']['filters'] = list(filter(None, access_plan_spec['access_plan_filters']['filters']))
+
+        composed_plans = []
+        for spec in composition_specs:
+            composed_plan, slots_to_ref = fill_and_compose(spec)
+            composed_plans.append(ComposedPlan(spec['plan_name'], composed_plan, spec['slot_fillers'], slots_to_ref))
+        return ComposedReport(report_to_compose.base_plan_templates, composed_plans)
+
+    # Compose the plans of the report once for every entity instance, binding in the values for this one
+    bindings = {
+        PlanCompositionCache.bind_parameter('entity_instance_identifier_value'): request_dict['entity_instance_identifier_value'],
+        PlanCompositionCache.bind_parameter('entity_reference'): entity_reference
+    }
+    if ring.plan_composition_cache and all(PlanCompositionCache.is_bindable(value) for value in bindings.values()):
+        report_key = json.dumps({
+            "report_type": request_dict['report_type'],
+            "entity_name": request_dict['entity_name'],
+            "entity_instance_identifier_attribute_name": request_dict['entity_instance_identifier_attribute_name'],
+            "metric_entity_name": request_dict['metric_entity_name'],
+            "metric_attribute_name": request_dict['metric_attribute_name'],
+            "metric_aggregation": request_dict['metric_aggregation'],
+            "metric_set_filter": metric_set_filter,
+            "metric_sort_direction": metric_sort_direction,
+            "metric_preference_direction": metric_preference_direction,
+            "benchmark_target": request_dict.get('benchmark_target'),
+            "time_attribute_name": request_dict.get('time_attribute_name'),
+            "time_zero": request_dict.get('time_zero'),
+            "time_one": request_dict.get('time_one')
+        }, sort_keys=True, default=str)
+        composed_report = ring.plan_composition_cache.get(report_key,
+                                                          report.base_plan_templates,
+                                                          lambda: compose_report(build_report(*bindings.keys())))
+        composed_plans = composed_report.bind(bindings)
+    else:
+        composed_plans = compose_report(report).bind({})
 
-        # Clean the factual_statements by removing extra spaces
-        factual_statements = [" ".join(f.split()) for f in factual_statements]
+    def generate_factual_statements(p: Dict) -> List[str]:
+        if request_dict['statement_generation_method'] == 'recursive':
+            # Express the plan in natural language by generating a template where the results can be slotted in
+            statement_template = doc_manager.plan_statement_generator.generate_statement_template_from_plan(p['plan'])
+            statements = doc_manager.plan_statement_generator.fill_result(p['plan'], statement_template)
 
-    elif request_dict['statement_generation_method'] == 'table':
-        # Express the results of these plans as a table of results
-        factual_statements = []
-        for p in plans_and_metadata:
-            # Build the table that will comprise one of the factual statements
+        elif request_dict['statement_generation_method'] == 'table':
+            # Express the results of the plan as a table of results
             x = PrettyTable()
             x.field_names = p['results']['fieldNames']
             x.add_rows(p['results']['results'])
 
-            # Save the factual statement
-            factual_statements.append(str(x))
+            # The table is the factual statement (and isn't cleaned up below)
+            return [str(x)]
 
-    else:
-        # Express these plans in natural language by using a stored template where the results can be slotted in
-        factual_statements = [doc_manager.plan_statement_generator.generate_statement(p['base_plan_name'],
-                                                                                      p['results'],
-                                                                                      p['slot_fillers'],
-                                                                                      p['slots_to_ref'],
-                                                                                      report.metric_nicename,
-                                                                                      p['plan'],
-                                                                                      metric_set_filter) for p in plans_and_metadata]
+        else:
+            # Express the plan in natural language by using a stored template where the results can be slotted in
+            statements = [doc_manager.plan_statement_generator.generate_statement(p['base_plan_name'],
+                                                                                 p['results'],
+                                                                                 p['slot_fillers'],
+                                                                                 p['slots_to_ref'],
+                                                                                 report.metric_nicename,
+                                                                                 p['plan'],
+                                                                                 metric_set_filter)]
 
         # Clean the factual_statements by removing extra spaces
-        factual_statements = [" ".join(f.split()) for f in factual_statements]
+        return [" ".join(f.split()) for f in statements]
+
+    # Generate the plans and gather useful metadata for generating factual statements
+    plans_and_metadata = []
+    for composed in composed_plans:
+        plans_and_metadata.append({
+            "plan": composed['plan'],
+            "base_plan_name": composed['plan_name'],
+            "slot_fillers": composed['slot_fillers'],
+            "slots_to_ref": composed['slots_to_ref'],
+            "results": None
+        })
+
+    # Run the plans and express their results as factual statements (all at once, or one plan at a time when streaming)
+    factual_statements = []
+    plan_index = 0
+    batches = [[p] for p in plans_and_metadata] if stream else [plans_and_metadata]
+    for batch in batches:
+        # Perform the analysis
+        all_results = [doc_manager.analysis_engine.sqr_single_ring_analysis(plan['plan'], doc_manager.ring, doc_manager.ring.db.session()) for plan in batch]
+
+        for plan, result in zip(batch, all_results):
+            plan['results'] = result
+            plan['plan'].result = result
+
+        # Look up the references for the identifiers in all of the results at once (rather than row by row when filling in the statements)
+        if request_dict['statement_generation_method'] != 'table':
+            doc_manager.plan_statement_generator.step_expressor.prefetch_reference_values([p['plan'] for p in batch])
+
+        # Generate statement_templates and fill with results
+        batch_statements = [generate_factual_statements(p) for p in batch]
+        factual_statements.extend(statement for statements in batch_statements for statement in statements)
+
+        for p, statements in zip(batch, batch_statements):
+            yield {
+                "event": "plan",
+                "index": plan_index,
+                "plan_name": p['base_plan_name'],
+                "plan": p['plan'].to_json(),
+                "results": p['results'],
+                "facts": statements
+            }
+            plan_index += 1
 
     # Generate prompt that can be used for generation
     def get_filter_statement(filter_steps: Dict[str, str]) -> str:
@@ -352,18 +616,27 @@ def generate_report(ring_id, version):
     else:
         prompt = report.build_baseline_prompt_with_facts(entity_reference, filter_statement, factual_statements)
 
-    if llm:
+    if stream:
+        yield {"event": "prompt", "prompt": prompt}
+
+    if llm and stream:
+        # Produce reports using the LLM conditioned on the factual statements, passing on its tokens as they're generated
+        tokens = []
+        for token in doc_manager.language_model.stream(prompt):
+            tokens.append(token)
+            yield {"event": "token", "text": token}
+        report = "".join(tokens).strip()
+    elif llm:
         # Produce reports using the LLM conditioned on the factual statements
         report = doc_manager.language_model.generate(prompt)
     else:
         # Produce reports consisting of just the factual statements concatenated together
         report = " ".join(factual_statements)
 
-    output = {
+    yield {
+        'event': 'report',
         'plans': [p['plan'].to_json() for p in plans_and_metadata],
         'facts': factual_statements,
         'prompt': prompt,
         'report': report
     }
-
-    return output
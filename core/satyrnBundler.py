@@ -87,7 +87,7 @@ app.ring_extractors = {}
 
 # if we're in local dev, we can initialize rings through the site config
 if app.config["ENV"].lower() in ["dev", "development"]:
-    operation_ontology = OperationOntology()
+    operation_ontology = OperationOntology.get_instance()
     rings, extractors = compile_rings(app.sat_metadata.get("rings", []), operation_ontology=operation_ontology)
     app.rings = rings
     app.ring_extractors = extractors
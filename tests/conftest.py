@@ -0,0 +1,82 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import sys
+import sqlite3
+
+import pytest
+
+# Run the tests against the checked out core package without starting the refresh threads or writing into the repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SATYRN_ROOT_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SATYRN_STATS_REFRESH_INTERVAL", "0")
+os.environ.setdefault("SATYRN_MATERIALIZE_REFRESH_INTERVAL", "0")
+
+
+def make_wildfire_ring_config(db_path: str) -> dict:
+    return {
+        "id": 1,
+        "rid": "materializer-test",
+        "name": "Wildfires",
+        "description": "Wildfires by state",
+        "version": 1,
+        "schemaVersion": 2.1,
+        "materializeDerivedAttributes": True,
+        "dataSource": {
+            "type": "sqlite",
+            "connectionString": db_path,
+            "tables": [{"name": "wildfire", "primaryKey": {"id": "integer"}},
+                       {"name": "state", "primaryKey": {"name": "string"}}],
+            "joins": [{"name": "wildfireTostate", "from": "wildfire", "to": "state",
+                       "path": [["wildfire.state_name", "state.name", "string"]]}]
+        },
+        "ontology": {
+            "defaultTargetEntity": "State",
+            "relationships": [{"name": "WildfireToState", "from": "Wildfire", "to": "State",
+                               "join": ["wildfireTostate"], "relation": "m2o"}],
+            "entities": [
+                {"name": "Wildfire", "nicename": ["Wildfire", "Wildfires"], "table": "wildfire", "id": "id",
+                 "idType": "integer", "reference": "wildfire {id}", "appendOnly": True,
+                 "attributes": {
+                     "id": {"nicename": ["Wildfire ID", "Wildfire IDs"], "isa": "integer", "type": ["Identifier"],
+                            "source": {"table": "wildfire", "columns": ["id"]}},
+                     "fire_size": {"nicename": ["fire size", "fire sizes"], "units": ["acre", "acres"], "isa": "float",
+                                   "type": ["Arithmetic", "Metric"], "source": {"table": "wildfire", "columns": ["fire_size"]}}
+                 }},
+                {"name": "State", "nicename": ["State", "States"], "table": "state", "id": "name",
+                 "idType": "string", "reference": "{name}",
+                 "attributes": {
+                     "name": {"nicename": ["Name", "Names"], "isa": "string", "type": ["Identifier", "Categorical"],
+                              "source": {"table": "state", "columns": ["name"]}}
+                 }}
+            ]
+        }
+    }
+
+
+@pytest.fixture
+def wildfire_db(tmp_path, monkeypatch) -> str:
+    """
+    A SQLite database of a few wildfires in a few states, for the ring of make_wildfire_ring_config (with the ring's
+    statistics and references stored in the test's directory).
+    """
+    monkeypatch.setenv("SATYRN_STATS_DIR", str(tmp_path / "stats"))
+    monkeypatch.setenv("SATYRN_REFERENCE_DIR", str(tmp_path / "references"))
+    db_path = str(tmp_path / "wildfires.db")
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("CREATE TABLE state(name text primary key)")
+        connection.execute("CREATE TABLE wildfire(id integer primary key, state_name text, fire_size real)")
+        connection.executemany("INSERT INTO state VALUES (?)", [("Oregon",), ("Texas",), ("Maine",)])
+        connection.executemany("INSERT INTO wildfire VALUES (?, ?, ?)",
+                               [(1, "Oregon", 10.0), (2, "Oregon", 30.0), (3, "Texas", 5.5), (4, "Texas", 1.0)])
+    return db_path
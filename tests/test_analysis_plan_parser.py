@@ -0,0 +1,83 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import re
+import shlex
+
+import pytest
+
+from core.Analysis.OperationOntology import OperationOntology
+from core.Planning.AnalysisPlanParser import AnalysisPlanParser, SQRSyntaxError
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return AnalysisPlanParser(OperationOntology.get_instance())
+
+
+def test_parse(parser):
+    plan = parser.parse({
+        "|1|": "(retrieve_entity Wildfire)",
+        "|2|": "(retrieve_attribute |1| state_name)",
+        "|3|": "(exact |2| 'New York')",
+        "|4|": "(collect |2|)",
+        "|5|": "(return |4| |3|)"
+    })
+    assert list(plan.plan_steps["|3|"].args) == ["|2|", "New York"]
+    assert plan.plan_graph.topological_order() == ["|1|", "|2|", "|3|", "|4|", "|5|"]
+    assert list(plan.subplans) == ["alias_0"]
+
+
+@pytest.mark.parametrize("raw_plan, cycle", [
+    # A cycle next to a final step
+    ({"|1|": "(x |2|)", "|2|": "(y |1|)", "|3|": "(return |1|)"}, "|1| -> |2| -> |1|"),
+    ({"|1|": "(retrieve_entity Wildfire)", "|2|": "(retrieve_attribute |1| id)", "|3|": "(count |2| |5|)", "|4|": "(groupby |3|)",
+      "|5|": "(collect |4|)", "|6|": "(return |5|)"}, "|3| -> |4| -> |5| -> |3|"),
+    ({"|1|": "(x |1|)"}, "|1| -> |1|"),
+])
+def test_cycles_are_syntax_errors(parser, raw_plan, cycle):
+    with pytest.raises(SQRSyntaxError, match=f"steps {cycle} reference each other in a cycle".replace("|", r"\|")):
+        parser.parse(raw_plan)
+
+
+def test_unknown_reference(parser):
+    with pytest.raises(SQRSyntaxError, match=r"in step \|2\|: reference to unknown step \|9\|"):
+        parser.parse({"|1|": "(retrieve_entity Wildfire)", "|2|": "(collect |9|)", "|3|": "(return |2|)"})
+
+
+@pytest.mark.parametrize("raw_step, expected", [
+    ("(exact |2| 'New York')", ["exact", "|2|", "New York"]),
+    ('(exact |2| "say \\"hi\\"")', ["exact", "|2|", 'say "hi"']),
+    ('(exact |2| "C:\\Users")', ["exact", "|2|", "C:\\Users"]),
+    ("(exact |2| 'it''s')", ["exact", "|2|", "its"]),
+    ("(exact |2| O\\'Brien)", ["exact", "|2|", "O'Brien"]),
+    # Parentheses are dropped everywhere, even in quotes and after a backslash
+    ("(exact |2| 'Smith (Jr)')", ["exact", "|2|", "Smith Jr"]),
+    ("(exact |2| a\\(b)", ["exact", "|2|", "ab"]),
+    ("(exact |2| '')", ["exact", "|2|", ""]),
+])
+def test_tokenize_step(parser, raw_step, expected):
+    operation, args = parser.tokenize_step("|1|", raw_step)
+    assert [operation, *args] == expected
+    # Exactly what the shlex based tokenizer it replaced gave
+    assert [operation, *args] == shlex.split(re.sub(r'[()]', '', raw_step))
+
+
+@pytest.mark.parametrize("raw_step, message", [
+    ("(exact |2| 'New York)", "at position 11: unterminated ' quote"),
+    ('(exact |2| "New York\\")', "at position 11: unterminated \" quote"),
+    ("(exact |2| New\\", "at position 14: dangling escape character"),
+    ("( )", "empty step"),
+])
+def test_tokenize_step_errors(parser, raw_step, message):
+    with pytest.raises(SQRSyntaxError, match=re.escape(message)):
+        parser.tokenize_step("|1|", raw_step)
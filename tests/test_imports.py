@@ -0,0 +1,34 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed by some of the language models, CSV rings, plotting or compiled rings, so importing the app shouldn't load them
+LAZY_MODULES = ["pandas", "numpy", "networkx", "matplotlib", "langchain", "langchain_community", "openai", "torch",
+                "transformers", "sentence_transformers", "chromadb"]
+
+
+@pytest.mark.parametrize("module", ["core", "wsgi"])
+def test_import_does_not_load_lazy_modules(module):
+    env = {name: value for name, value in os.environ.items() if not name.startswith("SATYRN_")}
+    env.update(SATYRN_ROOT_DIR=ROOT_DIR, SATYRN_STATS_REFRESH_INTERVAL="0", SATYRN_MATERIALIZE_REFRESH_INTERVAL="0")
+    code = f"import sys, json, {module}; print(json.dumps(sorted(name for name in {LAZY_MODULES!r} if name in sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True).stdout
+
+    assert json.loads(output.strip().splitlines()[-1]) == []
@@ -0,0 +1,229 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httpx
+import pytest
+
+from core.LanguageGeneration.LanguageModel import LanguageModel, OpenAIChatModel
+
+
+class StubServer:
+    """
+    A local OpenAI compatible server whose responses are given by a handler function of the request number and body
+    (returning the status code, the headers, the body and the seconds to wait before responding).
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.requests.append((time.time(), body))
+                    number = len(stub.requests)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    status, headers, content, delay = stub.handle(number, body)
+                    time.sleep(delay)
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    servers = []
+
+    def start(handle):
+        server = StubServer(handle)
+        server.thread.start()
+        servers.append(server)
+        # Each server gets its own backend (they're shared by base URL)
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        return server
+
+    yield start
+    for server in servers:
+        server.server.shutdown()
+        server.server.server_close()
+
+
+def completion(content, delay=0.0, usage=None):
+    body = {"choices": [{"message": {"content": content}}], "usage": usage or {"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3}}
+    return 200, {"Content-Type": "application/json"}, json.dumps(body).encode(), delay
+
+
+def test_retries_with_backoff(stub_server):
+    server = stub_server(lambda number, body: (503, {}, b"", 0.0) if number < 3 else completion(" done "))
+    model = OpenAIChatModel("test", max_retries=3, backoff=0.05)
+
+    start = time.time()
+    assert model.generate("hello") == "done"
+    assert len(server.requests) == 3
+    # Waits at least the backoff before the first retry and double it before the second
+    first, second, third = [requested_at for requested_at, _ in server.requests]
+    assert second - first >= 0.05
+    assert third - second >= 0.1
+    assert time.time() - start < 2
+
+    metrics = model.backend.to_json()
+    assert (metrics["requests"], metrics["retries"], metrics["failures"], metrics["total_tokens"]) == (1, 2, 0, 3)
+
+
+def test_gives_up_after_max_retries(stub_server):
+    server = stub_server(lambda number, body: (500, {}, b"", 0.0))
+    model = OpenAIChatModel("test", max_retries=2, backoff=0.01)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        model.generate("hello")
+    assert len(server.requests) == 3
+    assert model.backend.to_json()["failures"] == 1
+
+
+def test_retry_after_is_capped(stub_server):
+    server = stub_server(lambda number, body: (429, {"Retry-After": "3600"}, b"", 0.0) if number == 1 else completion("done"))
+    model = OpenAIChatModel("test", max_retries=1, backoff=0.01, max_retry_delay=0.2)
+
+    assert model.get_retry_delay(0, httpx.Response(429, headers={"Retry-After": "3600"})) == 0.2
+    assert model.get_retry_delay(0, httpx.Response(429, headers={"Retry-After": "0.1"})) == 0.1
+    assert model.get_retry_delay(10, None) == 0.2
+
+    start = time.time()
+    assert model.generate("hello") == "done"
+    assert 0.2 <= time.time() - start < 2
+    assert len(server.requests) == 2
+
+
+def test_timeout(stub_server):
+    server = stub_server(lambda number, body: completion("late", delay=1.0))
+    model = OpenAIChatModel("test", timeout=0.2, max_retries=1, backoff=0.01)
+
+    start = time.time()
+    with pytest.raises(httpx.TimeoutException):
+        model.generate("hello")
+    assert time.time() - start < 1.0
+    assert len(server.requests) == 2
+    assert model.backend.to_json()["failures"] == 1
+
+
+def test_concurrency_limit(stub_server):
+    server = stub_server(lambda number, body: completion(body["messages"][0]["content"], delay=0.1))
+    model = OpenAIChatModel("test", max_concurrency=2)
+
+    results = [None] * 6
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, model.generate(f"p{i}"))) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [f"p{i}" for i in range(6)]
+    assert server.max_in_flight == 2
+
+
+def test_async_concurrency_limit(stub_server):
+    server = stub_server(lambda number, body: completion(body["messages"][0]["content"], delay=0.1))
+    model = OpenAIChatModel("test", max_concurrency=3)
+
+    async def generate_all():
+        return await asyncio.gather(*[model.agenerate(f"p{i}") for i in range(9)])
+
+    assert asyncio.run(generate_all()) == [f"p{i}" for i in range(9)]
+    assert server.max_in_flight == 3
+
+
+def test_backoff_releases_the_concurrency_limit(stub_server):
+    def handle(number, body):
+        if body["messages"][0]["content"] == "slow" and number == 1:
+            return 429, {"Retry-After": "0.5"}, b"", 0.0
+        return completion(body["messages"][0]["content"])
+
+    server = stub_server(handle)
+    model = OpenAIChatModel("test", max_concurrency=1, max_retries=1)
+
+    finished = []
+    slow = threading.Thread(target=lambda: finished.append(model.generate("slow")))
+    slow.start()
+    while not server.requests:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    # Gets sent while the other request waits to be retried rather than after it
+    finished.append(model.generate("fast"))
+    slow.join()
+
+    assert finished == ["fast", "slow"]
+
+
+def test_stream(stub_server):
+    events = [
+        {"choices": [{"delta": {"role": "assistant"}}]},
+        {"choices": [{"delta": {"content": "Hello"}}]},
+        {"choices": [{"delta": {"content": ", world"}}]},
+        {"choices": [], "usage": {"prompt_tokens": 4, "completion_tokens": 2, "total_tokens": 6}}
+    ]
+    content = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + ": keep alive\n\ndata: [DONE]\n\n"
+    server = stub_server(lambda number, body: (503, {}, b"", 0.0) if number == 1 else (200, {"Content-Type": "text/event-stream"}, content.encode(), 0.0))
+    model = OpenAIChatModel("test", max_retries=1, backoff=0.01, max_concurrency=1)
+
+    assert list(model.stream("hello")) == ["Hello", ", world"]
+    assert server.requests[-1][1]["stream"] is True
+
+    metrics = model.backend.to_json()
+    assert (metrics["requests"], metrics["retries"], metrics["failures"], metrics["total_tokens"]) == (1, 1, 0, 6)
+    # The semaphore is given back once the stream has been read
+    assert model.backend.semaphore.acquire(blocking=False)
+    model.backend.semaphore.release()
+
+
+def test_stream_error(stub_server):
+    stub_server(lambda number, body: (400, {"Content-Type": "application/json"}, b'{"error": "bad request"}', 0.0))
+    model = OpenAIChatModel("test", max_retries=1, max_concurrency=1)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        list(model.stream("hello"))
+    assert model.backend.to_json()["failures"] == 1
+    assert model.backend.semaphore.acquire(blocking=False)
+    model.backend.semaphore.release()
@@ -0,0 +1,73 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import sqlite3
+
+import pytest
+from sqlalchemy import select
+
+from core.RingCompiler import compile_ring
+from conftest import make_wildfire_ring_config
+
+
+@pytest.fixture
+def ring(wildfire_db):
+    ring = compile_ring(make_wildfire_ring_config(wildfire_db))
+    ring.materializer.refresh(full=True)
+    yield ring, wildfire_db
+    ring.db.eng.dispose()
+
+
+def get_summary_rows(ring) -> list:
+    summary = list(ring.materializer.summaries.values())[0]
+    with ring.db.eng.connect() as connection:
+        return sorted(tuple(row) for row in connection.execute(select(summary.table)))
+
+
+def refresh_and_compare(ring) -> list:
+    ring.materializer.refresh()
+    incremental_rows = get_summary_rows(ring)
+    ring.materializer.refresh(full=True)
+    assert incremental_rows == get_summary_rows(ring)
+    return incremental_rows
+
+
+def test_incremental_refresh_recomputes_groups_of_new_rows(ring):
+    ring, db_path = ring
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("INSERT INTO wildfire VALUES (5, 'Maine', 2.0)")
+        connection.execute("INSERT INTO wildfire VALUES (6, 'Oregon', 20.0)")
+    rows = refresh_and_compare(ring)
+    assert len(rows) == 3
+
+
+def test_incremental_refresh_adds_new_keys_without_related_rows(ring):
+    ring, db_path = ring
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("INSERT INTO wildfire VALUES (5, 'Texas', 2.0)")
+        connection.execute("INSERT INTO state VALUES ('Iowa')")
+    rows = refresh_and_compare(ring)
+    assert "Iowa" in [row[0] for row in rows]
+
+    # Only the entity being grouped changes, so the high water mark stays put
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("INSERT INTO state VALUES ('Ohio')")
+    rows = refresh_and_compare(ring)
+    assert "Ohio" in [row[0] for row in rows]
+
+
+def test_incremental_refresh_removes_keys_no_longer_grouped(ring):
+    ring, db_path = ring
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("DELETE FROM state WHERE name = 'Maine'")
+    rows = refresh_and_compare(ring)
+    assert "Maine" not in [row[0] for row in rows]
@@ -0,0 +1,91 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import itertools
+import types
+
+import pytest
+from sqlalchemy import inspect
+
+from core.RingCompiler import compile_ring
+from core.Analysis.AnalysisEngine import AnalysisEngine
+from conftest import make_wildfire_ring_config
+
+PLAN = {
+    "|1|": "(retrieve_entity Wildfire)",
+    "|2|": "(retrieve_attribute |1| fire_size)",
+    "|3|": "(sum |2|)",
+    "|4|": "(collect |3|)",
+    "|5|": "(return |4|)"
+}
+
+
+@pytest.fixture
+def workers(wildfire_db, monkeypatch):
+    # Every time the statistics are collected is a second after the one before
+    clock = itertools.count(1000000)
+    monkeypatch.setattr("core.RingStatistics.time", types.SimpleNamespace(time=lambda: next(clock)))
+    # Two processes (e.g. server workers) sharing the database and the statistics directory
+    rings = [compile_ring(make_wildfire_ring_config(wildfire_db)) for _ in range(2)]
+    yield rings
+    for ring in rings:
+        ring.db.eng.dispose()
+
+
+def run_approximate(ring) -> dict:
+    analysis_engine = AnalysisEngine.for_ring(ring)
+    analysis_plan = analysis_engine.plan_parser.parse(PLAN)
+    with ring.db.session() as session:
+        return analysis_engine.sqr_single_ring_analysis(analysis_plan, ring, session, approximate=True, sample_fraction=0.5)
+
+
+def get_sample_table_names(ring) -> list:
+    return sorted(name for name in inspect(ring.db.eng).get_table_names() if name.startswith(ring.sampler.table_prefix))
+
+
+def get_sample_table_name(ring) -> str:
+    return f"{ring.sampler.table_prefix}{ring.sampler.get_generation()}__wildfire__500"
+
+
+def test_sample_tables_are_shared_and_follow_the_statistics(workers):
+    collector, reader = workers
+    collector.statistics.collect()
+    reader.statistics.load()
+    run_approximate(collector)
+    run_approximate(reader)
+    first_sample = get_sample_table_name(reader)
+    assert get_sample_table_names(collector) == [first_sample]
+
+    # Picking up newly collected statistics moves on to new samples
+    collector.statistics.collect()
+    reader.statistics.load()
+    run_approximate(reader)
+    second_sample = get_sample_table_name(reader)
+    assert get_sample_table_names(reader) == sorted([first_sample, second_sample])
+
+    # Only the samples taken before the previous collection are dropped
+    collector.statistics.collect()
+    assert get_sample_table_names(reader) == [second_sample]
+
+
+def test_queries_rebuild_samples_dropped_by_another_process(workers):
+    collector, reader = workers
+    collector.statistics.collect()
+    reader.statistics.load()
+    run_approximate(reader)
+
+    # The reader hasn't picked up the statistics since, so its sample is gone
+    collector.statistics.collect()
+    collector.statistics.collect()
+    assert get_sample_table_names(reader) == []
+    assert run_approximate(reader)["length"] == 1
+    assert get_sample_table_names(reader) == [get_sample_table_name(reader)]
@@ -0,0 +1,104 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import math
+import sqlite3
+
+import pytest
+
+from core.Dialects.SQLiteAggregates import register_aggregates
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    register_aggregates(connection)
+    connection.execute("CREATE TABLE t (grp TEXT, x, y)")
+    rows = {
+        # The expected results below are the ones Postgres gives for the same values
+        "odd": [(1, 2), (10, 20), (3, 6), (2, 4), (4, 8), (None, 5), (7, None)],
+        "even": [(4, 1), (1, 4), (3, 2), (2, 3)],
+        "ties": [(3, 1), (2, 1), (3, 1), (1, 1), (2, 1)],
+        "single": [(5, 5)],
+        "dates": [("2020-01-03", None), ("2020-01-01", None), ("2020-01-04", None), ("2020-01-02", None)],
+        "nulls": [(None, None), (None, None)]
+    }
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?)", [(group, x, y) for group, group_rows in rows.items() for x, y in group_rows])
+    yield connection
+    connection.close()
+
+
+def aggregate(connection, expression, group):
+    return connection.execute(f"SELECT {expression} FROM t WHERE grp = ?", (group,)).fetchone()[0]
+
+
+@pytest.mark.parametrize("expression, group, expected", [
+    # percentile_disc(f) WITHIN GROUP (ORDER BY x): the first value whose position is at or above the fraction
+    ("median(x)", "odd", 3),
+    ("median(x)", "even", 2),
+    ("percentile_disc(x, 0.5)", "even", 2),
+    ("percentile_disc(x, 0)", "odd", 1),
+    ("percentile_disc(x, 0.25)", "odd", 2),
+    ("percentile_disc(x, 0.9)", "odd", 10),
+    ("percentile_disc(x, 1)", "odd", 10),
+    ("median(x)", "dates", "2020-01-02"),
+    ("percentile_disc(x, 0.75)", "dates", "2020-01-03"),
+    # percentile_cont(f) WITHIN GROUP (ORDER BY x): interpolated between the values either side of the fraction
+    ("percentile_cont(x, 0.5)", "odd", 3.5),
+    ("percentile_cont(x, 0.5)", "even", 2.5),
+    ("percentile_cont(x, 0.25)", "even", 1.75),
+    ("percentile_cont(x, 0.9)", "odd", 8.5),
+    ("percentile_cont(x, 0)", "odd", 1),
+    ("percentile_cont(x, 1)", "odd", 10),
+    ("percentile_cont(x, 0.5)", "single", 5),
+    # mode() WITHIN GROUP (ORDER BY x): the first of the most common values
+    ("mode(x)", "ties", 2),
+    ("mode(x)", "odd", 1),
+    # var_samp, stddev_samp and corr skip nulls (corr skips the pairs where either value is null)
+    ("variance(x)", "odd", 11.5),
+    ("var_samp(x)", "even", 5 / 3),
+    ("stddev(x)", "odd", math.sqrt(11.5)),
+    ("stddev_samp(x)", "even", math.sqrt(5 / 3)),
+    ("corr(x, y)", "odd", 1.0),
+    ("corr(x, y)", "even", -1.0),
+])
+def test_matches_postgres(connection, expression, group, expected):
+    assert aggregate(connection, expression, group) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("expression, group", [
+    ("median(x)", "nulls"),
+    ("percentile_disc(x, 0.5)", "nulls"),
+    ("percentile_cont(x, 0.5)", "nulls"),
+    ("mode(x)", "nulls"),
+    ("variance(x)", "nulls"),
+    ("stddev(x)", "nulls"),
+    ("corr(x, y)", "nulls"),
+    # The sample variance of a single value and the correlation with a constant are null
+    ("variance(x)", "single"),
+    ("stddev(x)", "single"),
+    ("corr(x, y)", "single"),
+    ("corr(x, y)", "ties"),
+])
+def test_null_like_postgres(connection, expression, group):
+    assert aggregate(connection, expression, group) is None
+
+
+def test_percentile_cont_of_values_that_cant_be_interpolated(connection):
+    # Postgres would interpolate between the dates, SQLite (which stores them as strings) gives the percentile_disc
+    assert aggregate(connection, "percentile_cont(x, 0.5)", "dates") == "2020-01-02"
+    assert aggregate(connection, "percentile_cont(x, 0.75)", "dates") == "2020-01-03"
+
+
+def test_percentile_fraction_out_of_range(connection):
+    with pytest.raises(sqlite3.OperationalError):
+        aggregate(connection, "percentile_disc(x, 1.5)", "odd")
@@ -0,0 +1,84 @@
+'''
+This file is part of Satyrn.
+Satyrn is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+Satyrn is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+You should have received a copy of the GNU General Public License along with Satyrn.
+If not, see <https://www.gnu.org/licenses/>.
+'''
+
+import os
+import re
+import json
+
+import pytest
+
+from core.Analysis.OperationOntology import OperationOntology
+from core.Planning.StatementGeneratorTemplateBased import StatementGeneratorTemplateBased
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden", "statement_templates.json")
+
+# Exercises the quirks of the renderer: with one row the <repeat> tags are kept and with several rows the result slots
+# outside of the <repeat> tags are left unfilled
+QUIRK_TEMPLATES = {
+    "QuirkRepeat": {"statement_template": "{Metric:0} and {Metric:0} <repeat>[{Result:0}|{Unit:0}|{Quantity:0}]</repeat> done {Result:1} {Unit:1}."},
+    "QuirkTwoRepeats": {"statement_template": "<repeat>{Result:0}</repeat> then <repeat>{Result:2} {Unit:2}</repeat>"}
+}
+
+
+class Plan:
+    subplans = {}
+
+
+@pytest.fixture(scope="module")
+def generator():
+    generator = StatementGeneratorTemplateBased(None, OperationOntology.get_instance())
+    generator.base_plan_templates = {**generator.base_plan_templates, **QUIRK_TEMPLATES}
+    generator.step_expressor.express_step = lambda step_ref, analysis_plan: f"<step {step_ref}>"
+    return generator
+
+
+def render(generator, template_name, row_count):
+    template = generator.base_plan_templates[template_name]['statement_template']
+    slot_fillers = {slot: f"<{slot}>" for slot in re.findall(r'\{([a-zA-Z]+:\d+)\}', template)}
+    result = {
+        "length": row_count,
+        "results": [[f"value {row}.{column}" for column in range(3)] for row in range(row_count)],
+        "fieldNames": ["a(x)", "b(y)", "c(z)"],
+        "units": {"results": [["unit", "units"], ["", ""], ["metre", "metres"]]}
+    }
+    return generator.generate_statement(template_name, result, slot_fillers, {}, "the metric", Plan(), None)
+
+
+def get_cases(generator):
+    cases = []
+    for template_name, template in generator.base_plan_templates.items():
+        cases.append((template_name, 1))
+        if "<repeat>" in template['statement_template']:
+            cases.extend([(template_name, 2), (template_name, 5)])
+    return cases
+
+
+def test_statement_templates_match_golden(generator):
+    with open(GOLDEN_PATH) as file:
+        golden = json.load(file)
+
+    rendered = {f"{template_name} ({row_count} rows)": render(generator, template_name, row_count) for template_name, row_count in get_cases(generator)}
+    assert rendered == golden
+
+
+def test_every_base_plan_template_is_covered(generator):
+    with open(GOLDEN_PATH) as file:
+        golden = json.load(file)
+
+    for template_name in StatementGeneratorTemplateBased.load_base_plan_templates():
+        assert f"{template_name} (1 rows)" in golden
+
+
+def test_several_rows_need_repeat_tags(generator):
+    template_name = next(name for name, template in generator.base_plan_templates.items() if "<repeat>" not in template['statement_template'])
+    with pytest.raises(ValueError, match=template_name):
+        render(generator, template_name, 2)